@@ -0,0 +1,103 @@
+<?php
+/**
+ * Long-lived PHPUnit worker driven by phpunit_session.py at the project root.
+ *
+ * Started once with `docker compose exec -T backend php test_worker.php`, it loads the autoloader and the
+ * PHPUnit/Laravel testing classes once, then serves one JSON request per stdin line:
+ *
+ *   {"id": 1, "filter": "OrderControllerTest::test_order_status_transitions", "args": ["--stop-on-failure"], "junit": true}
+ *
+ * Each request runs in a forked child (so no test state leaks into the next request) whose PHPUnit output
+ * streams straight to stdout. When the child exits the worker writes one result line, prefixed with the
+ * ASCII record separator (0x1E) so it can never be confused with test output:
+ *
+ *   \x1e{"id": 1, "exit_code": 0, "duration": 0.412, "junit": "<?xml ...>"}
+ *
+ * With "junit" set, the run also logs JUnit XML and the report is returned inline, so failures, assertion
+ * counts and stack traces come from this one run instead of a verbose re-run. An "env" object is exported
+ * in the child before PHPUnit starts; parallel_tests.py uses it to give each worker its own TEST_TOKEN,
+ * so Laravel's parallel-testing support gives each worker its own database.
+ *
+ * The worker leads its own process group and reports it in the ready line ("pgid"), so a client that gives
+ * up on a hung run can kill the worker and its forked child inside the container, not just its exec client.
+ */
+
+chdir(__DIR__);
+require __DIR__.'/vendor/autoload.php';
+
+// Warm the classes every test run needs so forked children start with them already compiled
+foreach ([
+    PHPUnit\TextUI\Application::class,
+    PHPUnit\Framework\TestCase::class,
+    Illuminate\Foundation\Application::class,
+    Illuminate\Foundation\Testing\TestCase::class,
+    Illuminate\Foundation\Testing\RefreshDatabase::class,
+    Tests\TestCase::class,
+] as $class) {
+    class_exists($class) || interface_exists($class) || trait_exists($class);
+}
+
+const RESULT_PREFIX = "\x1e";
+
+function respond(array $payload): void
+{
+    fwrite(STDOUT, RESULT_PREFIX.json_encode($payload)."\n");
+    fflush(STDOUT);
+}
+
+// Forked children inherit the group; if we already lead a session, setpgid fails and the pgid is our pid
+@posix_setpgid(0, 0);
+respond(['ready' => true, 'pid' => getmypid(), 'pgid' => posix_getpgid(0), 'php' => PHP_VERSION]);
+
+while (($line = fgets(STDIN)) !== false) {
+    $request = json_decode($line, true);
+    if (!is_array($request) || !isset($request['id'])) {
+        respond(['id' => null, 'error' => 'Malformed request']);
+        continue;
+    }
+
+    $argv = ['phpunit', '--colors=never'];
+    if (!empty($request['filter'])) {
+        $argv[] = '--filter';
+        $argv[] = $request['filter'];
+    }
+    foreach ($request['args'] ?? [] as $arg) {
+        $argv[] = (string) $arg;
+    }
+    $junit = null;
+    if (!empty($request['junit'])) {
+        $junit = tempnam(sys_get_temp_dir(), 'junit');
+        $argv[] = '--log-junit';
+        $argv[] = $junit;
+    }
+
+    $start = hrtime(true);
+    $pid = pcntl_fork();
+    if ($pid === -1) {
+        respond(['id' => $request['id'], 'error' => 'fork failed']);
+        continue;
+    }
+    if ($pid === 0) {
+        foreach ($request['env'] ?? [] as $name => $value) {
+            putenv("{$name}={$value}");
+            $_ENV[$name] = $_SERVER[$name] = (string) $value;
+        }
+        $_SERVER['argv'] = $argv;
+        $code = (new PHPUnit\TextUI\Application())->run($argv);
+        fflush(STDOUT);
+        exit($code);
+    }
+
+    pcntl_waitpid($pid, $status);
+    $report = null;
+    if ($junit !== null) {
+        $report = @file_get_contents($junit) ?: null;
+        @unlink($junit);
+    }
+    respond([
+        'id' => $request['id'],
+        'exit_code' => pcntl_wifexited($status) ? pcntl_wexitstatus($status) : 255,
+        'duration' => round((hrtime(true) - $start) / 1e9, 3),
+        'junit' => $report,
+    ]);
+}
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+Content-addressed backup store for files touched by the patch tooling.
+Backups are compressed objects keyed by SHA-256, so identical content is stored once and backing up
+an unchanged file is a no-op. Replaces the timestamped sibling copies (.bak_*, .structure_safe_*).
+"""
+
+import os
+import re
+import sys
+import json
+import zlib
+import hashlib
+import argparse
+from dataclasses import dataclass
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:  # zstd is optional; zlib is always available
+    zstandard = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+BACKUP_ROOT = PROJECT_ROOT / ".backups"
+
+CODECS = (".zst", ".z")
+# Sibling copies written before the store: with_suffix(".bak_<stamp>") / with_suffix(".structure_safe_<stamp>")
+LEGACY_RE = re.compile(r"^(?P<stem>.+?)\.(?:bak|structure_safe)_\d{8}_\d{6}$")
+
+
+class BackupError(Exception):
+    """Raised when a backup object cannot be stored or restored"""
+
+
+class BackupStore:
+    """Compressed, deduplicated object store with a per-path record of the latest backup"""
+
+    def __init__(self, root: Path = BACKUP_ROOT):
+        self.root = Path(root)
+        self.objects = self.root / "objects"
+        self.refs_path = self.root / "refs.json"
+        self.log_path = self.root / "log.jsonl"
+        self._refs = None
+
+    def object_path(self, digest: str, suffix: str) -> Path:
+        return self.objects / digest[:2] / f"{digest[2:]}{suffix}"
+
+    def find_object(self, digest: str) -> Path:
+        """Locate the stored object for a digest, whichever codec wrote it"""
+        for suffix in CODECS:
+            candidate = self.object_path(digest, suffix)
+            if candidate.exists():
+                return candidate
+        return None
+
+    def put(self, data: bytes) -> str:
+        """Store content and return its digest; existing objects are never rewritten"""
+        digest = hashlib.sha256(data).hexdigest()
+        if self.find_object(digest) is not None:
+            return digest
+        if zstandard is not None:
+            suffix, payload = ".zst", zstandard.ZstdCompressor(level=10).compress(data)
+        else:
+            suffix, payload = ".z", zlib.compress(data, 6)
+        target = self.object_path(digest, suffix)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        temp_file = target.with_name(target.name + ".tmp")
+        temp_file.write_bytes(payload)
+        temp_file.replace(target)
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        """Load and verify the content of an object"""
+        source = self.find_object(digest)
+        if source is None:
+            raise BackupError(f"Backup object not found: {digest}")
+        payload = source.read_bytes()
+        if source.suffix == ".zst":
+            if zstandard is None:
+                raise BackupError(f"Object {digest[:12]} is zstd-compressed - pip install zstandard to restore it")
+            data = zstandard.ZstdDecompressor().decompress(payload)
+        else:
+            data = zlib.decompress(payload)
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise BackupError(f"Backup object {digest[:12]} is corrupted")
+        return data
+
+    def backup(self, path: Path, data: bytes = None) -> str:
+        """Back up a file; a file whose stat signature and content are unchanged costs no writes"""
+        path = Path(path).resolve()
+        stat = path.stat()
+        ref = self.refs().get(str(path))
+        if data is None and ref and ref["mtime_ns"] == stat.st_mtime_ns and ref["size"] == stat.st_size:
+            if self.find_object(ref["digest"]) is not None:
+                return ref["digest"]
+
+        data = path.read_bytes() if data is None else data
+        digest = self.put(data)
+        if not ref or ref["digest"] != digest or ref["mtime_ns"] != stat.st_mtime_ns:
+            self.record(path, digest, stat)
+        return digest
+
+    def restore(self, digest: str, path: Path):
+        """Atomically write an object's content back to a path"""
+        data = self.get(digest)
+        path = Path(path)
+        temp_file = path.with_name(path.name + ".restore.tmp")
+        temp_file.write_bytes(data)
+        if path.exists():
+            os.chmod(temp_file, path.stat().st_mode & 0o7777)
+        temp_file.replace(path)
+
+    def refs(self) -> dict:
+        if self._refs is None:
+            try:
+                self._refs = json.loads(self.refs_path.read_text())
+            except (OSError, ValueError):
+                self._refs = {}
+        return self._refs
+
+    def record(self, path: Path, digest: str, stat: os.stat_result):
+        """Point the path at its latest backup and append the event to the log"""
+        refs = self.refs()
+        previous = refs.get(str(path), {}).get("digest")
+        refs[str(path)] = {"digest": digest, "mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+        self.root.mkdir(parents=True, exist_ok=True)
+        temp_file = self.refs_path.with_suffix(".tmp")
+        temp_file.write_text(json.dumps(refs, indent=2))
+        temp_file.replace(self.refs_path)
+        if previous != digest:
+            with self.log_path.open("a") as log:
+                log.write(json.dumps({
+                    "time": datetime.now().isoformat(timespec="seconds"),
+                    "path": str(path),
+                    "digest": digest,
+                    "size": stat.st_size,
+                }) + "\n")
+
+    def history(self, path: Path = None) -> list:
+        """Every recorded backup, oldest first, optionally for a single path"""
+        entries = []
+        try:
+            with self.log_path.open() as log:
+                for line in log:
+                    entry = json.loads(line)
+                    if path is None or entry["path"] == str(Path(path).resolve()):
+                        entries.append(entry)
+        except FileNotFoundError:
+            pass
+        return entries
+
+
+@dataclass
+class FileBackup:
+    """One file's backup in the store; restores the file it was taken from"""
+    store: BackupStore
+    path: Path
+    digest: str
+
+    def restore(self):
+        self.store.restore(self.digest, self.path)
+
+    @property
+    def restore_command(self) -> str:
+        return f"python3 backup_store.py restore {self.digest[:12]} {self.path}"
+
+    def __str__(self):
+        return f"backup object {self.digest[:12]}"
+
+
+def backup_file(path: Path, store: BackupStore = None) -> FileBackup:
+    """Back up a file into the store (the default one unless given)"""
+    store = store or BackupStore()
+    path = Path(path).resolve()
+    return FileBackup(store, path, store.backup(path))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Content-addressed backups for patched files")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("backup", help="Back up files").add_argument("paths", nargs="+")
+    restore = sub.add_parser("restore", help="Restore a file from a backup object")
+    restore.add_argument("digest", help="Object digest (a unique prefix is enough)")
+    restore.add_argument("path")
+    history = sub.add_parser("list", help="List recorded backups")
+    history.add_argument("path", nargs="?")
+    legacy = sub.add_parser("import", help="Move legacy sibling backups into the store")
+    legacy.add_argument("paths", nargs="+")
+    legacy.add_argument("--to", help="The file the backups were taken from, when it cannot be inferred")
+    args = parser.parse_args()
+
+    store = BackupStore()
+    try:
+        if args.command == "backup":
+            for path in args.paths:
+                print(f"✅ {path}: {store.backup(Path(path))[:12]}")
+        elif args.command == "restore":
+            digest = resolve_digest(store, args.digest)
+            store.restore(digest, Path(args.path))
+            print(f"✅ Restored {args.path} from backup object {digest[:12]}")
+        elif args.command == "list":
+            for entry in store.history(args.path):
+                print(f"{entry['time']}  {entry['digest'][:12]}  {entry['size']:>8}  {entry['path']}")
+        elif args.command == "import":
+            for path in map(Path, args.paths):
+                original = Path(args.to).resolve() if args.to else legacy_original(path)
+                digest = store.put(path.read_bytes())
+                store.record(original, digest, path.stat())
+                path.unlink()
+                print(f"✅ Imported {path.name} as {digest[:12]} (backup of {original})")
+    except (BackupError, OSError) as e:
+        print(f"❌ ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+def legacy_original(path: Path) -> Path:
+    """The file a legacy sibling backup was taken from: the one sibling sharing its stem"""
+    match = LEGACY_RE.match(path.name)
+    if match is None:
+        raise BackupError(f"{path.name} is not a legacy backup name - pass --to")
+    candidates = [p for p in path.parent.iterdir()
+                  if p.is_file() and p.stem == match.group("stem") and not LEGACY_RE.match(p.name)]
+    if len(candidates) != 1:
+        raise BackupError(f"Cannot tell which file {path.name} backs up ({len(candidates)} candidates) - pass --to")
+    return candidates[0].resolve()
+
+
+def resolve_digest(store: BackupStore, prefix: str) -> str:
+    """Expand a digest prefix to the single object it identifies"""
+    if len(prefix) == 64:
+        return prefix
+    if len(prefix) < 4:
+        raise BackupError("Digest prefix must be at least 4 characters")
+    bucket = store.objects / prefix[:2]
+    matches = sorted({
+        prefix[:2] + p.name.split(".", 1)[0]
+        for p in (bucket.iterdir() if bucket.exists() else [])
+        if p.name.startswith(prefix[2:]) and not p.name.endswith(".tmp")
+    })
+    if len(matches) != 1:
+        raise BackupError(f"Digest prefix '{prefix}' matches {len(matches)} objects")
+    return matches[0]
+
+
+if __name__ == "__main__":
+    main()
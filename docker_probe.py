@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Docker environment probe for the test-fix tooling.
+Asks the Docker Engine API (over its unix socket, no `docker` CLI process) which compose services of this
+project are running and healthy. Answers are cached on disk for a short TTL, so every tool run in a batch
+shares one query. Backends are pluggable: DOCKER_PROBE_FAKE=<file.json> serves containers from a file in
+the Engine API's /containers/json shape, so the tools can be exercised without a daemon.
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import http.client
+from dataclasses import dataclass, asdict
+from pathlib import Path
+from urllib.parse import quote
+
+from patch_spec import CACHE_ROOT, PROJECT_ROOT
+
+DOCKER_SOCKET = "/var/run/docker.sock"
+PROBE_CACHE_PATH = CACHE_ROOT / "docker_probe.json"
+PROBE_TTL = float(os.environ.get("DOCKER_PROBE_TTL", 15))
+REQUEST_TIMEOUT = 5
+
+SERVICE_LABEL = "com.docker.compose.service"
+PROJECT_LABEL = "com.docker.compose.project"
+WORKING_DIR_LABEL = "com.docker.compose.project.working_dir"
+
+
+class ProbeError(Exception):
+    """The Docker daemon could not be queried"""
+
+
+@dataclass
+class ServiceState:
+    """State of one compose service as the Engine API reports it"""
+    name: str
+    state: str = "missing"  # created, running, restarting, exited, ... or missing
+    health: str = ""  # healthy, unhealthy, starting, or empty without a healthcheck
+
+    @property
+    def running(self) -> bool:
+        return self.state == "running"
+
+    @property
+    def ready(self) -> bool:
+        """Running, and healthy if the service defines a healthcheck"""
+        return self.running and self.health in ("", "healthy")
+
+
+class UnixHTTPConnection(http.client.HTTPConnection):
+    """HTTP over the daemon's unix socket"""
+
+    def __init__(self, socket_path: str, timeout: float = REQUEST_TIMEOUT):
+        super().__init__("localhost", timeout=timeout)
+        self.socket_path = socket_path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socket_path)
+
+
+class EngineBackend:
+    """Docker Engine API client: lists the containers carrying a compose label"""
+
+    def __init__(self, socket_path: str = None):
+        host = os.environ.get("DOCKER_HOST", "")
+        self.socket_path = socket_path or (host[len("unix://"):] if host.startswith("unix://") else DOCKER_SOCKET)
+        self.name = f"engine:{self.socket_path}"
+
+    def containers(self, label: str) -> list:
+        filters = quote(json.dumps({"label": [label]}))
+        connection = UnixHTTPConnection(self.socket_path)
+        try:
+            connection.request("GET", f"/containers/json?all=1&filters={filters}")
+            response = connection.getresponse()
+            body = response.read()
+        except OSError as e:
+            raise ProbeError(f"Docker daemon not reachable at {self.socket_path}: {e}")
+        finally:
+            connection.close()
+        if response.status != 200:
+            raise ProbeError(f"Docker API returned {response.status}: {body[:200].decode(errors='replace')}")
+        try:
+            return json.loads(body)
+        except ValueError as e:
+            raise ProbeError(f"Docker API returned malformed JSON: {e}")
+
+
+class FakeBackend:
+    """Serves a fixed container list (Engine API shape), from memory or a JSON file"""
+
+    def __init__(self, containers=None, path: Path = None):
+        self.path = path
+        self.fixed = containers or []
+        self.name = f"fake:{path}" if path else "fake"
+
+    def containers(self, label: str) -> list:
+        try:
+            containers = json.loads(Path(self.path).read_text()) if self.path else self.fixed
+        except (OSError, ValueError) as e:
+            raise ProbeError(f"Fake container list {self.path} unreadable: {e}")
+        if not isinstance(containers, list):
+            raise ProbeError(f"Fake container list {self.path} is not a JSON list")
+        key, _, value = label.partition("=")
+        # Fixtures may omit the compose project labels; they only need the service label
+        return [c for c in containers if c.get("Labels", {}).get(key, value) == value]
+
+
+def default_backend():
+    fake = os.environ.get("DOCKER_PROBE_FAKE")
+    return FakeBackend(path=Path(fake)) if fake else EngineBackend()
+
+
+def project_label(root: Path = PROJECT_ROOT) -> str:
+    """Label selecting this project's containers: its compose project name, or its compose directory"""
+    name = os.environ.get("COMPOSE_PROJECT_NAME")
+    return f"{PROJECT_LABEL}={name}" if name else f"{WORKING_DIR_LABEL}={root}"
+
+
+def parse_health(status: str) -> str:
+    """Health from the Engine's status text, e.g. 'Up 3 minutes (healthy)'"""
+    for health in ("unhealthy", "healthy", "health: starting"):
+        if f"({health})" in status:
+            return health.replace("health: ", "")
+    return ""
+
+
+class EnvironmentProbe:
+    """Compose service states, fetched once per TTL and shared through the on-disk cache"""
+
+    def __init__(self, backend=None, ttl: float = PROBE_TTL, cache_path: Path = PROBE_CACHE_PATH,
+                 root: Path = PROJECT_ROOT):
+        self.backend = backend or default_backend()
+        self.ttl = ttl
+        self.cache_path = cache_path
+        self.label = project_label(root)
+        self.states = None
+        self.from_cache = False
+
+    def services(self, refresh: bool = False) -> dict:
+        """Service name -> ServiceState for every container of the project"""
+        if self.states is not None and not refresh:
+            return self.states
+        if not refresh:
+            self.states = self._cached()
+            self.from_cache = self.states is not None
+            if self.from_cache:
+                return self.states
+        states = {}
+        for container in self.backend.containers(self.label):
+            name = container.get("Labels", {}).get(SERVICE_LABEL)
+            if not name:
+                continue
+            state = ServiceState(name, container.get("State", ""), parse_health(container.get("Status", "")))
+            # Scaled services: report the best replica
+            if name not in states or (state.ready and not states[name].ready):
+                states[name] = state
+        self.states = states
+        self.from_cache = False
+        self._store(states)
+        return states
+
+    def service(self, name: str) -> ServiceState:
+        return self.services().get(name) or ServiceState(name)
+
+    def _cached(self):
+        try:
+            entry = json.loads(self.cache_path.read_text())
+        except (OSError, ValueError):
+            return None
+        if entry.get("key") != self._key() or time.time() - entry.get("at", 0) > self.ttl:
+            return None
+        return {name: ServiceState(**state) for name, state in entry["services"].items()}
+
+    def _store(self, states: dict):
+        try:
+            self.cache_path.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self.cache_path.with_suffix(f".{os.getpid()}.tmp")
+            temp_file.write_text(json.dumps({"key": self._key(), "at": time.time(),
+                                             "services": {name: asdict(state) for name, state in states.items()}}))
+            temp_file.replace(self.cache_path)
+        except OSError:
+            pass  # Caching is an optimization only
+
+    def _key(self) -> str:
+        return f"{self.backend.name}|{self.label}"
+
+
+def require_service(name: str, probe: EnvironmentProbe = None):
+    """Exit with the usual diagnostics unless the compose service is running"""
+    probe = probe or EnvironmentProbe()
+    try:
+        state = probe.service(name)
+        if not state.running and probe.from_cache:
+            # Only trust a cached "up"; the service may have been started since
+            state = probe.services(refresh=True).get(name) or ServiceState(name)
+    except (ProbeError, ValueError) as e:
+        print(f"❌ CRITICAL: Docker status check failed - {str(e)}", file=sys.stderr)
+        sys.exit(1)
+    if not state.running:
+        print(f"❌ CRITICAL: Docker service '{name}' not running", file=sys.stderr)
+        print("💡 Start services with: docker compose up -d", file=sys.stderr)
+        sys.exit(1)
+    if state.health == "unhealthy":
+        print(f"⚠️  Docker service '{name}' is running but reports unhealthy", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the state of this project's compose services")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cached answer")
+    parser.add_argument("--json", action="store_true", help="Print the states as JSON")
+    args = parser.parse_args()
+
+    try:
+        states = EnvironmentProbe().services(refresh=args.refresh)
+    except (ProbeError, ValueError) as e:
+        print(f"❌ ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    if args.json:
+        print(json.dumps({name: asdict(state) for name, state in sorted(states.items())}, indent=2))
+        return
+    if not states:
+        print("💡 No containers found for this project (start services with: docker compose up -d)")
+    for name, state in sorted(states.items()):
+        print(f"{'✅' if state.ready else '❌'} {name}: {state.state}{f' ({state.health})' if state.health else ''}")
+
+
+if __name__ == "__main__":
+    main()
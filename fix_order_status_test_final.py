@@ -5,27 +5,33 @@ Fixes missing customer_email/invoice_number in order factory for status transiti
 """
 
 import sys
-import subprocess
-import re
-import shutil
 import json
 from pathlib import Path
-from datetime import datetime
 import os
 import textwrap
+import xml.etree.ElementTree as ET
+
+from backup_store import FileBackup, backup_file
+from docker_probe import require_service
+from phpunit_results import OutputParser, format_failures, parse_junit
+from phpunit_session import WorkerSession, WorkerSessionError, worker_command
+from test_history import record_results
+from transaction import write_verified
+from php_index import method_text_span
+from text_match import MultiPatternMatcher, NormalizedText, replace_spans
 
 def main():
     # Configuration
     test_file = Path("/home/project/authentic-kopitiam/backend/tests/Api/OrderControllerTest.php")
-    backup_path = test_file.with_suffix(f".bak_{datetime.now().strftime('%Y%m%d_%H%M%S')}")
     docker_service = "backend"
     test_filter = "OrderControllerTest::test_order_status_transitions"
+    paranoid = "--paranoid" in sys.argv[1:]  # Re-read written files instead of trusting the write digests
 
     # Pre-flight validation
     validate_environment(test_file, docker_service)
 
     # Create atomic backup
-    create_backup(test_file, backup_path)
+    backup = create_backup(test_file)
 
     # Read current content
     content = read_file(test_file)
@@ -105,8 +111,8 @@ def main():
     # Verify target block exists (with flexibility for current broken state)
     if BROKEN_BLOCK not in content:
         print("⚠️  Target block not found in expected broken state. Checking for variants...")
-        if not verify_target_variant(content, backup_path):
-            handle_failure("Could not identify target test block", test_file, backup_path, backup_path)
+        if not verify_target_variant(content, backup):
+            handle_failure("Could not identify target test block", test_file, backup, backup)
 
     # Perform replacement
     updated_content, replacements = replace_block(content, BROKEN_BLOCK, FIXED_BLOCK)
@@ -116,23 +122,29 @@ def main():
         print("⚠️  Exact block match failed. Attempting whitespace-normalized replacement...")
         updated_content, replacements = replace_with_normalized(content, BROKEN_BLOCK, FIXED_BLOCK)
     
+    # Last resort: replace the whole method, located by the PHP lexer
+    if replacements == 0 and verify_target_variant(content, backup):
+        print("⚠️  Normalized match failed. Replacing the method structurally...")
+        updated_content, replacements = replace_method(content, "test_order_status_transitions", FIXED_BLOCK)
+    
     if replacements == 0:
-        handle_failure("Replacement failed: No substitutions made", test_file, backup_path, backup_path)
+        handle_failure("Replacement failed: No substitutions made", test_file, backup, backup)
     
     if replacements > 1:
-        handle_failure(f"Too many replacements ({replacements}) - structural damage possible", test_file, backup_path, backup_path)
+        handle_failure(f"Too many replacements ({replacements}) - structural damage possible", test_file, backup, backup)
 
     # Verify replacement integrity
-    verify_replacement(updated_content, FIXED_BLOCK, backup_path)
+    verify_replacement(updated_content, FIXED_BLOCK, backup)
 
     # Write changes atomically
-    write_file_atomically(test_file, updated_content, backup_path)
+    write_file_atomically(test_file, updated_content, backup, paranoid)
 
     # Execute test with comprehensive diagnostics
-    test_result = execute_docker_test_with_diagnostics(docker_service, test_filter, backup_path)
+    test_result = execute_docker_test_with_diagnostics(docker_service, test_filter, backup)
 
-    # Final reporting
-    report_results(test_result, test_file, backup_path)
+    # Keep the per-test results in the local history, then report
+    record_results(test_result["tests"], Path(__file__).stem)
+    report_results(test_result, test_file, backup)
 
 def validate_environment(test_file: Path, docker_service: str):
     """Validate pre-conditions for safe execution"""
@@ -144,31 +156,19 @@ def validate_environment(test_file: Path, docker_service: str):
         print(f"❌ CRITICAL: No write permission for: {test_file}", file=sys.stderr)
         sys.exit(1)
     
-    # Check Docker service status
-    try:
-        result = subprocess.run(
-            ["docker", "compose", "ps", "--services", "--filter", "status=running"],
-            capture_output=True,
-            text=True,
-            timeout=10
-        )
-        if docker_service not in result.stdout.splitlines():
-            print(f"❌ CRITICAL: Docker service '{docker_service}' not running", file=sys.stderr)
-            print("💡 Start services with: docker compose up -d", file=sys.stderr)
-            sys.exit(1)
-    except Exception as e:
-        print(f"❌ CRITICAL: Docker status check failed - {str(e)}", file=sys.stderr)
-        sys.exit(1)
+    # Check Docker service status (Engine API, cached briefly and shared across the batch)
+    require_service(docker_service)
 
-def create_backup(test_file: Path, backup_path: Path):
-    """Create atomic backup with verification"""
+def create_backup(test_file: Path) -> FileBackup:
+    """Create atomic backup (content-addressed store, no sibling copy) with verification"""
     try:
-        shutil.copy2(test_file, backup_path)
-        print(f"✅ Created atomic backup: {backup_path.name}")
+        backup = backup_file(test_file)
+        print(f"✅ Created atomic backup: {backup}")
         
         # Verify backup integrity
-        if not backup_path.exists() or backup_path.stat().st_size == 0:
-            raise ValueError("Backup file is empty or missing")
+        if len(backup.store.get(backup.digest)) != test_file.stat().st_size:
+            raise ValueError("Backup object does not match the file")
+        return backup
     except Exception as e:
         print(f"❌ CRITICAL: Backup creation failed - {str(e)}", file=sys.stderr)
         sys.exit(1)
@@ -181,16 +181,18 @@ def read_file(file_path: Path) -> str:
         print(f"❌ CRITICAL: Failed to read {file_path} - {str(e)}", file=sys.stderr)
         sys.exit(1)
 
-def verify_target_variant(content: str, backup_path: Path) -> bool:
+def verify_target_variant(content: str, backup: FileBackup) -> bool:
     """Try to find variant of the target block with different formatting"""
-    # Check for presence of method signature and key elements
-    if "test_order_status_transitions" not in content:
+    # Check the key elements inside the method itself, located by the PHP lexer rather than a [^}]* regex
+    span = method_text_span(content, "test_order_status_transitions")
+    if span is None:
         return False
     
-    if "'status' => 'pending'" not in content:
+    method = content[span[0]:span[1]]
+    if "'status' => 'pending'" not in method:
         return False
     
-    if "customer_email" not in content or "invoice_number" not in content:
+    if "customer_email" not in method or "invoice_number" not in method:
         return False
     
     print("✅ Found variant of target block - proceeding with structural replacement")
@@ -198,34 +200,27 @@ def verify_target_variant(content: str, backup_path: Path) -> bool:
 
 def replace_block(content: str, old_block: str, new_block: str) -> (str, int):
     """Perform exact block replacement with count verification"""
-    updated_content = content.replace(old_block, new_block, 1)
-    replacements = 1 if updated_content != content else 0
-    return updated_content, replacements
+    updated_content, counts = MultiPatternMatcher([(old_block, False, 0)]).replace_all(content, [new_block])
+    return updated_content, counts[0]
 
 def replace_with_normalized(content: str, old_block: str, new_block: str) -> (str, int):
-    """Replace with normalized whitespace matching"""
-    # Create normalized versions (remove extra spaces and normalize line endings)
-    normalized_content = re.sub(r'\s+', ' ', content.replace('\n', ' '))
-    normalized_old = re.sub(r'\s+', ' ', old_block.replace('\n', ' '))
-    
-    # Find the start index of the normalized old block
-    start_idx = normalized_content.find(normalized_old)
-    if start_idx == -1:
-        return content, 0
-    
-    # Calculate the actual start and end positions in the original content
-    # This is complex, so we'll use a simpler approach: replace based on context
-    pattern = r'public\s+function\s+test_order_status_transitions\s*\(\s*\)\s*\{[^}]*status[^}]*customer_email[^}]*invoice_number[^}]*\}'
+    """Replace with normalized whitespace matching, mapped back to exact offsets in the original"""
+    spans = NormalizedText(content).find_all(old_block)
+    if len(spans) != 1:
+        return content, len(spans)
     
-    match = re.search(pattern, content, re.DOTALL)
-    if not match:
+    return replace_spans(content, spans, new_block), 1
+
+def replace_method(content: str, name: str, new_block: str) -> (str, int):
+    """Replace a whole method through its closing brace; its docblock and attributes are kept unless new_block
+    starts with its own"""
+    span = method_text_span(content, name, replacement=new_block)
+    if span is None:
         return content, 0
     
-    # Replace the matched block with the fixed version
-    updated_content = content[:match.start()] + new_block + content[match.end():]
-    return updated_content, 1
+    return replace_spans(content, [span], new_block), 1
 
-def verify_replacement(content: str, new_block: str, backup_path: Path):
+def verify_replacement(content: str, new_block: str, backup: FileBackup):
     """Verify replacement integrity with multiple checks"""
     # Basic verification: check for key elements of the fixed block
     required_strings = [
@@ -237,80 +232,66 @@ def verify_replacement(content: str, new_block: str, backup_path: Path):
     
     for required in required_strings:
         if required not in content:
-            handle_failure(f"Verification failed: Missing required string '{required}'", Path(""), backup_path, backup_path)
+            handle_failure(f"Verification failed: Missing required string '{required}'", Path(""), backup, backup)
     
     print("✅ Replacement integrity verified")
 
-def write_file_atomically(file_path: Path, content: str, backup_path: Path):
-    """Write changes atomically with verification"""
+def write_file_atomically(file_path: Path, content: str, backup: FileBackup, paranoid: bool = False):
+    """Write changes atomically, checked for short writes (re-read and digest-compared only when paranoid)"""
     try:
-        temp_file = file_path.with_suffix('.tmp')
-        temp_file.write_text(content)
+        # Check the marker on the in-memory buffer; the write itself is checked for short writes
+        if "test_order_status_transitions" not in content:
+            raise ValueError("Updated content missing critical test function")
         
-        # Basic verification: file exists and has content
-        if not temp_file.exists() or temp_file.stat().st_size == 0:
-            raise ValueError("Temporary file is empty or missing")
-        
-        # Additional verification: check for a key string that must exist
-        temp_content = temp_file.read_text()
-        if "test_order_status_transitions" not in temp_content:
-            raise ValueError("Temporary file missing critical test function")
+        temp_file = file_path.with_suffix('.tmp')
+        write_verified(temp_file, content.encode(), paranoid)
         
         # Atomic rename
         temp_file.rename(file_path)
         print("✅ Atomic write completed successfully")
     except Exception as e:
-        handle_failure(f"Write failed: {str(e)}", file_path, backup_path, backup_path)
+        handle_failure(f"Write failed: {str(e)}", file_path, backup, backup)
 
-def execute_docker_test_with_diagnostics(service: str, test_filter: str, backup_path: Path) -> dict:
-    """Execute Docker test command with comprehensive diagnostics capture"""
-    print("\n🚀 Executing test with full diagnostics: docker compose exec backend php artisan test --filter='OrderControllerTest::test_order_status_transitions'")
+def execute_docker_test_with_diagnostics(service: str, test_filter: str, backup: FileBackup) -> dict:
+    """Execute the test in a persistent backend worker with comprehensive diagnostics capture"""
+    print("\n🚀 Executing test with full diagnostics: docker compose exec backend php test_worker.php --filter='OrderControllerTest::test_order_status_transitions'")
     
     try:
-        # First, run the test and capture full output
-        result = subprocess.run(
-            [
-                "docker", "compose", "exec", "-T", service,
-                "php", "artisan", "test", f"--filter={test_filter}", "--stop-on-failure"
-            ],
-            capture_output=True,
-            text=True,
-            timeout=120  # 2-minute timeout for tests
-        )
+        # Live progress from the console output; the JUnit report is the authoritative result
+        parser = OutputParser(on_record=print_test_progress)
+        with WorkerSession(worker_command(service)) as session:
+            # One run: the JUnit report carries the failures, assertions and stack traces
+            result = session.run(test_filter, ["--stop-on-failure"], timeout=120, on_line=parser.feed, junit=True)  # 2-minute timeout for tests
+        if result["timed_out"]:
+            handle_failure("Test execution timed out after 120 seconds", Path(""), backup, backup)
         
-        # Try to get more detailed failure information if the test failed
-        failure_details = ""
-        if result.returncode != 0 or "FAILURES!" in result.stdout:
-            print("\n🔍 Capturing detailed failure diagnostics...")
-            
-            # Run the test in verbose mode to get stack traces
-            verbose_result = subprocess.run(
-                [
-                    "docker", "compose", "exec", "-T", service,
-                    "php", "artisan", "test", f"--filter={test_filter}", "-v"
-                ],
-                capture_output=True,
-                text=True,
-                timeout=60
-            )
-            failure_details = verbose_result.stdout + verbose_result.stderr
+        tests = parse_junit(result["junit"]) if result["junit"] else parser.results()
+        failure_details = format_failures(tests)
+        if not tests and result["exit_code"] != 0:
+            # No report (e.g. PHP fatal before PHPUnit started): the output is the diagnostic
+            failure_details = result["stdout"]
         
         # Parse test result
-        success = "Tests:  1, Assertions: " in result.stdout and "FAILURES!" not in result.stdout
+        success = result["exit_code"] == 0 and bool(tests) and not any(test.failed for test in tests)
         return {
             "success": success,
-            "exit_code": result.returncode,
-            "stdout": result.stdout,
-            "stderr": result.stderr,
-            "failure_details": failure_details
+            "exit_code": result["exit_code"],
+            "stdout": result["stdout"],
+            "stderr": result["stderr"],
+            "failure_details": failure_details,
+            "tests": tests
         }
     
-    except subprocess.TimeoutExpired:
-        handle_failure("Test execution timed out after 120 seconds", Path(""), backup_path, backup_path)
-    except Exception as e:
-        handle_failure(f"Test execution failed: {str(e)}", Path(""), backup_path, backup_path)
+    except (WorkerSessionError, ET.ParseError) as e:
+        handle_failure(f"Test execution failed: {str(e)}", Path(""), backup, backup)
 
-def report_results(test_result: dict, test_file: Path, backup_path: Path):
+def print_test_progress(record):
+    """Live progress line for each test as the parser sees it finish"""
+    icon = {"passed": "✅", "skipped": "⏭️ "}.get(record.status, "❌")
+    duration = f" ({record.duration:.2f}s)" if record.duration else ""
+    print(f"  {icon} {record.name}{duration}")
+
+def report_results(test_result: dict, test_file: Path, backup: FileBackup):
     """Generate comprehensive test results report with failure diagnostics"""
     print("\n" + "="*80)
     print("TEST EXECUTION RESULTS")
@@ -322,7 +303,7 @@ def report_results(test_result: dict, test_file: Path, backup_path: Path):
         print("  - Order status transitions test now includes ownership verification")
         print("  - Factory now properly populates customer_email and invoice_number")
         print("  - All status changes (pending → confirmed → preparing → ready → completed) validated")
-        print(f"  - Backup preserved at: {backup_path}")
+        print(f"  - Backup preserved as {backup} (restore: {backup.restore_command})")
         sys.exit(0)
     else:
         print("❌❌ TEST FAILED - DETAILED DIAGNOSTICS ❌❌")
@@ -339,10 +320,8 @@ def report_results(test_result: dict, test_file: Path, backup_path: Path):
             print("\n🔍 DETAILED FAILURE DIAGNOSTICS:")
             # Extract the most relevant part of the failure
             failure_section = test_result["failure_details"]
-            if "There was 1 failure:" in failure_section:
-                start_idx = failure_section.find("There was 1 failure:")
-                failure_section = failure_section[start_idx:start_idx+800]
-            elif "FAILURES!" in failure_section:
+            # (failures taken from the JUnit report are already exactly that)
+            if not test_result.get("tests") and "FAILURES!" in failure_section:
                 start_idx = failure_section.find("FAILURES!")
                 failure_section = failure_section[start_idx:start_idx+800]
             
@@ -361,33 +340,33 @@ def report_results(test_result: dict, test_file: Path, backup_path: Path):
             print("  ✅ FIX APPLIED: Added required fields to order factory")
             print("  🔄 NEXT STEPS: Check order.ownership middleware implementation details")
         
-        print(f"\n💾 MANUAL RECOVERY COMMAND:\n  cp {backup_path} {test_file}")
+        print(f"\n💾 MANUAL RECOVERY COMMAND:\n  {backup.restore_command}")
         
         # Offer to restore backup automatically
         restore = input("\n❓ Restore backup automatically? (y/n): ").strip().lower()
         if restore == 'y':
             try:
-                shutil.copy2(backup_path, test_file)
-                print(f"✅ Automatically restored from backup: {backup_path.name}")
+                backup.restore()
+                print(f"✅ Automatically restored from {backup}")
             except Exception as e:
                 print(f"❌ Restoration failed: {str(e)}")
         else:
-            print(f"💡 Manual restoration command: cp {backup_path} {test_file}")
+            print(f"💡 Manual restoration command: {backup.restore_command}")
         
         sys.exit(1)
 
-def handle_failure(message: str, file_path: Path, backup_path: Path, original_backup: Path):
+def handle_failure(message: str, file_path: Path, backup: FileBackup, original_backup: FileBackup):
     """Handle failures with automatic backup restoration"""
     print(f"\n❌ CRITICAL FAILURE: {message}", file=sys.stderr)
     
-    if backup_path.exists():
+    if backup is not None:
         try:
-            if file_path.exists():
-                shutil.copy2(backup_path, file_path)
-            print(f"✅ Automatically restored from backup: {backup_path.name}", file=sys.stderr)
+            # Restores the file the backup was taken from, whichever step failed
+            backup.restore()
+            print(f"✅ Automatically restored from {backup}", file=sys.stderr)
         except Exception as e:
             print(f"⚠️  RESTORE FAILED: {str(e)}", file=sys.stderr)
-            print(f"💡 MANUAL RESTORE COMMAND: cp {original_backup} {file_path}", file=sys.stderr)
+            print(f"💡 MANUAL RESTORE COMMAND: {original_backup.restore_command}", file=sys.stderr)
     
     sys.exit(1)
 
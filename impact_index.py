@@ -0,0 +1,367 @@
+#!/usr/bin/env python3
+"""
+Test impact analysis for the backend.
+A static scan maps every PHP class, route and middleware alias to the tests under backend/tests that
+exercise it, so after an edit only the affected tests run. Per-file scan results are cached by content
+hash; routes/api.php changes are diffed route by route, and test file changes method by method.
+"""
+
+import re
+import sys
+import json
+import pickle
+import hashlib
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from patch_spec import CACHE_ROOT, PROJECT_ROOT
+from php_index import php_index_for_content
+from route_cache import load_route_index, route_index_for_content
+
+BACKEND_ROOT = PROJECT_ROOT / "backend"
+IMPACT_CACHE_DIR = CACHE_ROOT / "impact"
+
+# Bump when the scanner or FileFacts change so stale entries are ignored
+IMPACT_CACHE_VERSION = 3
+
+SCAN_DIRS = ("app", "database", "tests")
+ROUTES_FILE = "routes/api.php"
+BOOTSTRAP_FILE = "bootstrap/app.php"
+ROUTE_URI_PREFIX = "api/"  # Laravel mounts routes/api.php under /api
+MODEL_NAMESPACE = "App\\Models\\"
+FACTORY_NAMESPACE = "Database\\Factories\\"
+# Backend files outside the PHP sources that change what every test does
+SUITE_WIDE_FILES = ("composer.lock", "phpunit.xml", "phpunit.xml.dist", ".env.testing")
+
+NAMESPACE_RE = re.compile(r"^\s*namespace\s+([\w\\]+)\s*;", re.M)
+USE_RE = re.compile(r"^\s*use\s+([\w\\]+)(?:\s+as\s+(\w+))?\s*;", re.M)
+IDENT_RE = re.compile(r"\\?\b[A-Z]\w*(?:\\\w+)*")
+REQUEST_RE = re.compile(
+    r"->(?P<verb>get|post|put|patch|delete|options)(?:Json)?\(\s*(?P<q>['\"])(?P<uri>.*?)(?P=q)"
+    r"|->json\(\s*['\"](?P<method>\w+)['\"]\s*,\s*(?P<q2>['\"])(?P<uri2>.*?)(?P=q2)", re.S)
+ALIAS_RE = re.compile(r"['\"]([\w.\-]+)['\"]\s*=>\s*\\?([\w\\]+)::class")
+RESOURCE_ACTIONS = {"GET": ("", "/{id}"), "POST": ("",), "PUT": ("/{id}",), "PATCH": ("/{id}",), "DELETE": ("/{id}",)}
+
+
+@dataclass
+class FileFacts:
+    """What one PHP file declares and references; cached by the file's content hash"""
+    namespace: str = ""
+    classes: list = field(default_factory=list)
+    refs: set = field(default_factory=set)
+    methods: dict = field(default_factory=dict)  # test method -> {"hash": str, "requests": [(verb, uri)]}
+    shared_requests: list = field(default_factory=list)  # requests made outside test methods (setUp, helpers)
+    shared_hash: str = ""  # hash of everything outside test methods
+    aliases: dict = field(default_factory=dict)
+
+
+@dataclass
+class ImpactIndex:
+    """Reverse dependency maps from files and routes to test keys (ShortClass::method)"""
+    tests: dict = field(default_factory=dict)  # test key -> test file (relative)
+    by_file: dict = field(default_factory=dict)  # relative path -> set of test keys
+    by_route: dict = field(default_factory=dict)  # (METHOD, uri) -> set of test keys
+    closures: dict = field(default_factory=dict)  # test key -> frozenset of files it depends on
+    facts: dict = field(default_factory=dict)  # relative path -> FileFacts
+    digests: dict = field(default_factory=dict)  # relative path -> content sha256
+
+
+def scan_file(source: str) -> FileFacts:
+    """Static facts for one PHP file"""
+    data = source.encode()
+    index = php_index_for_content(data)
+    code_bytes = index.strip_comments(data)
+    code = code_bytes.decode("utf-8", errors="replace")
+    facts = FileFacts()
+    match = NAMESPACE_RE.search(code)
+    facts.namespace = match.group(1) if match else ""
+    uses = {}
+    for match in USE_RE.finditer(code):
+        uses[match.group(2) or match.group(1).rsplit("\\", 1)[-1]] = match.group(1)
+    facts.classes = [qualify(facts.namespace, name) for name in index.classes]
+    for ident in set(IDENT_RE.findall(code)):
+        facts.refs.update(resolve(ident, uses, facts.namespace))
+    facts.aliases = {alias: cls.lstrip("\\") for alias, cls in ALIAS_RE.findall(code)}
+
+    # Test methods hash on their own; everything else in the file (setUp, helpers, properties) is shared
+    shared = []
+    cursor = 0
+    methods = sorted((m for ms in index.methods.values() for m in ms), key=lambda m: m.start)
+    for method in methods:
+        body = code_bytes[method.start:method.end].decode("utf-8", errors="replace")
+        if method.name.startswith("test"):
+            facts.methods[method.name] = {
+                "hash": hashlib.sha256(body.encode()).hexdigest(),
+                "requests": requests_in(body),
+            }
+            shared.append(code_bytes[cursor:method.start])
+            cursor = method.end
+        else:
+            facts.shared_requests.extend(requests_in(body))
+    shared.append(code_bytes[cursor:])
+    facts.shared_hash = hashlib.sha256(b"".join(shared)).hexdigest()
+    return facts
+
+
+def qualify(namespace: str, name: str) -> str:
+    return f"{namespace}\\{name}" if namespace else name
+
+
+def resolve(ident: str, uses: dict, namespace: str) -> set:
+    """Fully qualified candidates for a class name as written in a file"""
+    if ident.startswith("\\"):
+        return {ident[1:]}
+    head, _, rest = ident.partition("\\")
+    if head in uses:
+        return {uses[head] + ("\\" + rest if rest else "")}
+    return {qualify(namespace, ident), ident}
+
+
+def requests_in(code: str) -> list:
+    """(METHOD, literal URI prefix) for each HTTP call a test makes"""
+    found = []
+    for match in REQUEST_RE.finditer(code):
+        method = (match.group("verb") or match.group("method")).upper()
+        uri = match.group("uri") if match.group("verb") else match.group("uri2")
+        # Keep the literal part only: stop at interpolation or concatenation
+        uri = re.split(r"\{\$|\$", uri, 1)[0]
+        found.append((method, uri.lstrip("/")))
+    return found
+
+
+def route_matches(route_uri: str, literal: str) -> bool:
+    """Whether a test URI (possibly truncated at a variable) can address the route"""
+    path = literal.split("?", 1)[0]
+    complete = literal == path and not literal.endswith("/")
+    route_parts = route_uri.split("/")
+    test_parts = path.rstrip("/").split("/") if path.strip("/") else []
+    if len(test_parts) > len(route_parts) or (complete and len(test_parts) != len(route_parts)):
+        return False
+    for i, part in enumerate(test_parts):
+        expected = route_parts[i]
+        last = i == len(test_parts) - 1 and not complete and not path.endswith("/")
+        if expected.startswith("{"):
+            continue
+        if part != expected and not (last and expected.startswith(part)):
+            return False
+    return True
+
+
+def route_keys(index, uses: dict) -> dict:
+    """(METHOD, full uri) -> (controller class, aliases) for every route, resource routes expanded"""
+    routes = {}
+    for route in index.routes:
+        uri = ROUTE_URI_PREFIX + index.full_uri(route)
+        controller = uses.get(route.controller, route.controller) if route.controller else None
+        middleware = tuple(name.split(":", 1)[0] for name in index.effective_middleware(route))
+        if route.method == "RESOURCE":
+            for method, suffixes in RESOURCE_ACTIONS.items():
+                for suffix in suffixes:
+                    routes[(method, uri + suffix)] = (controller, middleware)
+        else:
+            routes[(route.method, uri)] = (controller, middleware)
+    return routes
+
+
+def build_impact_index(root: Path = BACKEND_ROOT, cache_dir: Path = IMPACT_CACHE_DIR) -> ImpactIndex:
+    """Scan (or load from cache) every PHP file and assemble the reverse dependency maps"""
+    files = sorted(p for d in SCAN_DIRS if (root / d).exists() for p in (root / d).rglob("*.php")
+                   if "backups" not in p.parts)
+    cache = _read_cache(cache_dir)
+    facts = {}
+    digests = {}
+    for path in files + [root / BOOTSTRAP_FILE, root / ROUTES_FILE]:
+        if not path.exists():
+            continue
+        rel = path.relative_to(root).as_posix()
+        facts[rel] = file_facts(path, cache)
+        digests[rel] = cache[str(path)]["digest"]
+    _write_cache(cache_dir, cache)
+
+    class_files = {cls: rel for rel, f in facts.items() for cls in f.classes}
+    deps = {rel: {class_files[ref] for ref in f.refs if ref in class_files and class_files[ref] != rel}
+            for rel, f in facts.items()}
+    # Model::factory() resolves Database\Factories\{Model}Factory by naming convention, never by reference
+    for cls, rel in class_files.items():
+        if cls.startswith(MODEL_NAMESPACE):
+            factory = class_files.get(FACTORY_NAMESPACE + cls[len(MODEL_NAMESPACE):] + "Factory")
+            if factory and factory != rel:
+                deps[rel].add(factory)
+    aliases = facts.get(BOOTSTRAP_FILE, FileFacts()).aliases
+    routes_facts = facts.get(ROUTES_FILE, FileFacts())
+    route_uses = {cls.rsplit("\\", 1)[-1]: cls for cls in routes_facts.refs if "\\" in cls}
+    index, _ = load_route_index(root / ROUTES_FILE)
+    routes = route_keys(index, route_uses)
+
+    impact = ImpactIndex(facts=facts, digests=digests)
+    for rel, f in facts.items():
+        if not rel.startswith("tests/") or not f.methods:
+            continue
+        short = Path(rel).stem
+        for method, info in f.methods.items():
+            key = f"{short}::{method}"
+            impact.tests[key] = rel
+            roots = {rel}
+            for request in info["requests"] + f.shared_requests:
+                for route_key, (controller, middleware) in routes.items():
+                    if route_key[0] != request[0] or not route_matches(route_key[1], request[1]):
+                        continue
+                    impact.by_route.setdefault(route_key, set()).add(key)
+                    if controller in class_files:
+                        roots.add(class_files[controller])
+                    for name in middleware:
+                        if aliases.get(name) in class_files:
+                            roots.update((class_files[aliases[name]], BOOTSTRAP_FILE))
+            impact.closures[key] = frozenset(closure(roots, deps))
+            for dep in impact.closures[key]:
+                impact.by_file.setdefault(dep, set()).add(key)
+    return impact
+
+
+def closure(roots: set, deps: dict) -> set:
+    """Every file reachable from the roots through class references"""
+    seen = set()
+    stack = list(roots)
+    while stack:
+        rel = stack.pop()
+        if rel in seen:
+            continue
+        seen.add(rel)
+        stack.extend(deps.get(rel, ()))
+    return seen
+
+
+def file_facts(path: Path, cache: dict) -> FileFacts:
+    """Facts for a file, re-scanned only when its stat signature and content hash both changed"""
+    stat = path.stat()
+    entry = cache.get(str(path))
+    if entry and entry["mtime_ns"] == stat.st_mtime_ns and entry["size"] == stat.st_size:
+        return entry["facts"]
+    data = path.read_bytes()
+    digest = hashlib.sha256(data).hexdigest()
+    if not entry or entry["digest"] != digest:
+        entry = {"digest": digest, "facts": scan_file(data.decode("utf-8", errors="replace"))}
+    entry.update(mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    cache[str(path)] = entry
+    return entry["facts"]
+
+
+def affected_tests(changes: list, impact: ImpactIndex, root: Path = BACKEND_ROOT) -> set:
+    """Test keys affected by a list of (path, old_text, new_text) changes"""
+    selected = set()
+    for path, old, new in changes:
+        try:
+            rel = Path(path).resolve().relative_to(root.resolve()).as_posix()
+        except ValueError:
+            continue  # Outside the backend: no PHP test depends on it
+        if rel == ROUTES_FILE:
+            for route_key in changed_routes(old, new):
+                selected.update(impact.by_route.get(route_key, ()))
+                # A new route can be hit by tests whose URIs used to 404
+                selected.update(key for known, keys in impact.by_route.items() for key in keys
+                                if known[1] == route_key[1])
+        elif rel.startswith("tests/") and _has_tests(old, new):
+            before, after = scan_file(old), scan_file(new)
+            short = Path(rel).stem
+            if before.shared_hash != after.shared_hash:
+                selected.update(f"{short}::{method}" for method in after.methods)
+            else:
+                selected.update(f"{short}::{method}" for method, info in after.methods.items()
+                                if before.methods.get(method, {}).get("hash") != info["hash"])
+        elif rel in impact.by_file:
+            selected.update(impact.by_file[rel])
+        elif rel.endswith(".php") or rel in SUITE_WIDE_FILES:
+            # Nothing links the file to a test (migrations, seeders, config, base test classes, new files):
+            # it may still change every test, so every indexed test is selected
+            selected.update(impact.tests)
+    return selected
+
+
+def _has_tests(old: str, new: str) -> bool:
+    """Whether a file under tests/ holds test methods (TestCase and helpers do not)"""
+    return bool(scan_file(old).methods or scan_file(new).methods)
+
+
+def changed_routes(old: str, new: str) -> set:
+    """Route keys whose registration (controller, action or effective middleware) differs"""
+    def describe(text):
+        index, _ = route_index_for_content(text.encode())
+        return {(route.method, ROUTE_URI_PREFIX + index.full_uri(route)):
+                (route.controller, route.action, index.effective_middleware(route)) for route in index.routes}
+    before, after = describe(old), describe(new)
+    changed = {key for key in before.keys() | after.keys() if before.get(key) != after.get(key)}
+    expanded = set()
+    for method, uri in changed:
+        if method == "RESOURCE":
+            expanded.update((m, uri + suffix) for m, suffixes in RESOURCE_ACTIONS.items() for suffix in suffixes)
+        else:
+            expanded.add((method, uri))
+    return expanded
+
+
+def test_filters(tests: set, impact: ImpactIndex) -> list:
+    """PHPUnit --filter expressions: whole classes where every test is selected, method lists otherwise"""
+    by_class = {}
+    for key in tests:
+        cls, _, method = key.partition("::")
+        by_class.setdefault(cls, []).append(method)
+    filters = []
+    for cls, methods in sorted(by_class.items()):
+        total = sum(1 for key in impact.tests if key.startswith(cls + "::"))
+        if len(methods) == total:
+            filters.append(cls)
+        else:
+            # Anchored so test_a does not select test_ab, but PHPUnit's "<method> with data set #N" still matches
+            filters.append(f"{cls}::(?:{'|'.join(sorted(methods))})(?:$| with data set )")
+    return filters
+
+
+def _read_cache(cache_dir: Path) -> dict:
+    try:
+        with (cache_dir / f"facts-v{IMPACT_CACHE_VERSION}.pickle").open("rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return {}  # Missing or incompatible cache - everything is re-scanned
+
+
+def _write_cache(cache_dir: Path, cache: dict):
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        target = cache_dir / f"facts-v{IMPACT_CACHE_VERSION}.pickle"
+        temp_file = target.with_suffix(".tmp")
+        temp_file.write_bytes(pickle.dumps(cache, protocol=pickle.HIGHEST_PROTOCOL))
+        temp_file.replace(target)
+    except OSError as e:
+        print(f"⚠️  Impact cache write failed: {e}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show which backend tests exercise a file or route")
+    parser.add_argument("paths", nargs="*", help="Backend files (tests that depend on each are listed)")
+    parser.add_argument("--route", action="append", default=[], metavar="'METHOD uri'", help="e.g. 'PUT api/v1/orders/{id}/status'")
+    parser.add_argument("--json", action="store_true", help="Print the selection as JSON")
+    args = parser.parse_args()
+
+    impact = build_impact_index()
+    selected = set()
+    for path in args.paths:
+        try:
+            rel = Path(path).resolve().relative_to(BACKEND_ROOT).as_posix()
+        except ValueError:
+            rel = path
+        selected.update(impact.by_file.get(rel, ()))
+    for route in args.route:
+        method, _, uri = route.partition(" ")
+        selected.update(impact.by_route.get((method.upper(), uri.strip().lstrip("/")), ()))
+
+    if args.json:
+        print(json.dumps({"tests": sorted(selected), "filters": test_filters(selected, impact)}, indent=2))
+        return
+    print(f"🧪 {len(selected)} of {len(impact.tests)} tests affected")
+    for test_filter in test_filters(selected, impact):
+        print(f"  - {test_filter}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""
+Heading-tree index for markdown documents.
+One pass over the text records every ATX heading (level, title, numbering, character/byte/line offsets)
+and the extent of the section it opens; fenced code blocks are skipped. Lookups by title or numbering are
+dictionary hits, and offset-to-line and offset-to-section lookups are binary searches, so a document is
+scanned once however many sections are looked up in it.
+"""
+
+import re
+from bisect import bisect_right
+from dataclasses import dataclass, field
+
+HEADING_RE = re.compile(r"^ {0,3}(#{1,6})(?:[ \t]+(.*?))?(?:[ \t]+#+)?[ \t]*$")
+FENCE_RE = re.compile(r"^ {0,3}(`{3,}|~{3,})")
+NUMBERING_RE = re.compile(r"^(\d+(?:\.\d+)*\.?)\s+")
+LINE_RE = re.compile(r"[^\n]*\n|[^\n]+$")  # Lines split on \n only, matching content.count("\n")
+
+
+@dataclass
+class Heading:
+    """One heading and the section it opens (up to the next heading of the same or a higher level)"""
+    level: int
+    text: str  # Full heading text, e.g. "5. Current Project Status"
+    title: str  # Without the numbering, e.g. "Current Project Status"
+    numbering: str  # e.g. "5." or "5.1", empty when unnumbered
+    start: int  # Offset of the heading line
+    body: int  # Offset just past the heading line
+    end: int = 0  # End of the section
+    line: int = 0  # 1-based line number of the heading
+    byte_start: int = 0
+    byte_end: int = 0
+
+
+@dataclass
+class HeadingIndex:
+    """Headings in document order, with the line table needed for offset lookups"""
+    headings: list = field(default_factory=list)
+    starts: list = field(default_factory=list)  # Heading offsets, for bisection
+    line_starts: list = field(default_factory=list)
+    length: int = 0
+    by_text: dict = field(default_factory=dict)
+    by_numbering: dict = field(default_factory=dict)
+
+    def line_of(self, offset: int) -> int:
+        """1-based line number containing offset"""
+        return bisect_right(self.line_starts, offset)
+
+    def section_at(self, offset: int) -> Heading:
+        """Innermost section containing offset, or None before the first heading"""
+        i = bisect_right(self.starts, offset) - 1
+        while i >= 0:
+            if self.headings[i].end > offset:
+                return self.headings[i]
+            i -= 1
+        return None
+
+    def find(self, text: str, level: int = None) -> Heading:
+        """First heading with exactly this text (and level, if given)"""
+        for heading in self.by_text.get(text.strip(), ()):
+            if level is None or heading.level == level:
+                return heading
+        return None
+
+    def search(self, pattern, level: int = None, min_level: int = 1) -> Heading:
+        """First heading whose text matches a regex; scans headings only, never the document"""
+        pattern = re.compile(pattern) if isinstance(pattern, str) else pattern
+        for heading in self.headings:
+            if heading.level >= min_level and (level is None or heading.level == level) and pattern.search(heading.text):
+                return heading
+        return None
+
+    def numbered(self, numbering: str) -> Heading:
+        return self.by_numbering.get(numbering.rstrip("."))
+
+    def children(self, heading: Heading) -> list:
+        return [h for h in self.headings if heading.start < h.start < heading.end and h.level > heading.level]
+
+
+def build_heading_index(content: str) -> HeadingIndex:
+    """Index every heading of a markdown document in one pass"""
+    index = HeadingIndex(length=len(content))
+    offset = byte_offset = 0
+    fence = None
+    open_sections = []
+    for number, line in enumerate(LINE_RE.findall(content), 1):
+        index.line_starts.append(offset)
+        stripped = line.rstrip("\r\n")
+        match = FENCE_RE.match(stripped)
+        if match:
+            marker = match.group(1)
+            if fence is None:
+                fence = marker
+            elif marker[0] == fence[0] and len(marker) >= len(fence) and not stripped.strip()[len(marker):].strip():
+                fence = None
+        elif fence is None:
+            match = HEADING_RE.match(stripped)
+            if match:
+                level = len(match.group(1))
+                text = (match.group(2) or "").strip()
+                numbering = NUMBERING_RE.match(text)
+                heading = Heading(
+                    level=level,
+                    text=text,
+                    title=text[numbering.end():].strip() if numbering else text,
+                    numbering=numbering.group(1) if numbering else "",
+                    start=offset,
+                    body=offset + len(line),
+                    line=number,
+                    byte_start=byte_offset,
+                )
+                while open_sections and open_sections[-1].level >= level:
+                    _close(open_sections.pop(), offset, byte_offset)
+                open_sections.append(heading)
+                index.headings.append(heading)
+                index.starts.append(offset)
+                index.by_text.setdefault(text, []).append(heading)
+                if heading.numbering:
+                    index.by_numbering.setdefault(heading.numbering.rstrip("."), heading)
+        offset += len(line)
+        byte_offset += len(line.encode())
+    for heading in open_sections:
+        _close(heading, offset, byte_offset)
+    return index
+
+
+def _close(heading: Heading, offset: int, byte_offset: int):
+    heading.end = offset
+    heading.byte_end = byte_offset
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+Parallel, sharded test execution for verifying a batch of edits.
+Each target (a filter, or a test file such as Unit/PaymentServiceTest) is a shard; N persistent workers
+(backend/test_worker.php, one exec each) pull shards from a queue under asyncio, each with its own
+TEST_TOKEN so Laravel gives it its own database. Shards have their own timeouts, --fail-fast cancels the
+rest on the first failure, and the merged result has the shape report_results() in the fix scripts renders.
+Tests whose source, dependencies and environment are unchanged since they last passed are served from the
+result cache (result_cache.py) instead of being run; --no-cache runs everything. Every test that ran is
+appended to the local history (test_history.py). Unless --no-schedule is given, the selected tests are
+repacked into one duration-balanced shard per worker, recently failed tests first (test_scheduler.py).
+"""
+
+import sys
+import json
+import time
+import asyncio
+import argparse
+from collections import deque
+from dataclasses import dataclass, field
+
+from impact_index import build_impact_index
+from phpunit_results import format_failures, parse_junit
+from result_cache import ResultCache, environment_fingerprint, split_cached
+from test_history import record_results
+from test_scheduler import ORDER_ARGS, plan_shards
+from phpunit_session import (KILL_TIMEOUT, OUTPUT_TAIL_LINES, PROJECT_ROOT, RESULT_PREFIX, STAND_IN_COMMAND, WORKER_COMMAND,
+                             WorkerSessionError, group_kill_command)
+
+DEFAULT_TARGETS = [
+    "OrderControllerTest",
+    "PdpaConsentControllerTest",
+    "ProductControllerTest",
+    "LocationControllerTest",
+    "Unit/PaymentServiceTest",
+]
+
+STARTUP_TIMEOUT = 60
+REPLY_LIMIT = 256 * 1024 * 1024  # A reply is one line carrying the shard's whole JUnit report
+
+
+@dataclass
+class Shard:
+    """One unit of work for a worker: a --filter expression or a test file path"""
+    label: str
+    filter: str = ""
+    args: tuple = ()
+
+
+@dataclass
+class ShardResult:
+    shard: Shard
+    exit_code: int = None
+    stdout: str = ""
+    duration: float = 0.0
+    timed_out: bool = False
+    cancelled: bool = False
+    tests: list = field(default_factory=list)
+
+    @property
+    def success(self) -> bool:
+        return self.exit_code == 0 and not any(test.failed for test in self.tests)
+
+
+def make_shards(targets: list) -> list:
+    """Targets naming a path (Unit/PaymentServiceTest, tests/Api/X.php) run as files, the rest as filters"""
+    shards = []
+    for target in targets:
+        if "/" in target or target.endswith(".php"):
+            path = target if target.endswith(".php") else f"{target}.php"
+            path = path if path.startswith("tests/") else f"tests/{path}"
+            shards.append(Shard(label=target, args=(path,)))
+        else:
+            shards.append(Shard(label=target, filter=target))
+    return shards
+
+
+class AsyncWorker:
+    """Async client for the test worker protocol (see phpunit_session.WorkerSession)"""
+
+    def __init__(self, command: list, token: int):
+        self.command = command
+        self.token = token
+        self.process = None
+        self.next_id = 0
+        self.info = {}
+
+    async def start(self):
+        if self.process is not None:
+            return
+        try:
+            self.process = await asyncio.create_subprocess_exec(
+                *self.command,
+                cwd=PROJECT_ROOT,
+                stdin=asyncio.subprocess.PIPE,
+                stdout=asyncio.subprocess.PIPE,
+                stderr=asyncio.subprocess.STDOUT,
+                limit=REPLY_LIMIT,
+            )
+        except OSError as e:
+            raise WorkerSessionError(f"Cannot start test worker: {e}")
+        while True:
+            line = await asyncio.wait_for(self.process.stdout.readline(), STARTUP_TIMEOUT)
+            if not line:
+                raise WorkerSessionError(f"Test worker {self.token} exited during startup")
+            if line.startswith(RESULT_PREFIX.encode()):
+                self.info = json.loads(line[1:])
+                return
+
+    async def run(self, shard: Shard, timeout: float) -> ShardResult:
+        await self.start()
+        self.next_id += 1
+        request = {
+            "id": self.next_id,
+            "filter": shard.filter,
+            "args": list(shard.args),
+            "junit": True,
+            "env": {"LARAVEL_PARALLEL_TESTING": "1", "TEST_TOKEN": str(self.token)},
+        }
+        self.process.stdin.write((json.dumps(request) + "\n").encode())
+        await self.process.stdin.drain()
+
+        result = ShardResult(shard=shard)
+        output = deque(maxlen=OUTPUT_TAIL_LINES)
+        started = time.monotonic()
+        try:
+            reply = await asyncio.wait_for(self._read_reply(request["id"], output), timeout)
+        except asyncio.TimeoutError:
+            await self.kill()  # The hung run still owns the worker; the next shard gets a fresh one
+            result.timed_out = True
+            result.duration = time.monotonic() - started
+        else:
+            if "error" in reply:
+                raise WorkerSessionError(f"Test worker error: {reply['error']}")
+            result.exit_code = reply["exit_code"]
+            result.duration = reply["duration"]
+            if reply.get("junit"):
+                result.tests = parse_junit(reply["junit"])
+        result.stdout = "".join(output)
+        return result
+
+    async def _read_reply(self, request_id: int, output: deque) -> dict:
+        while True:
+            try:
+                line = await self.process.stdout.readline()
+            except ValueError as e:  # Line over REPLY_LIMIT
+                raise WorkerSessionError(f"Test worker {self.token} reply too large: {e}")
+            if not line:
+                raise WorkerSessionError(f"Test worker {self.token} exited (code {await self.process.wait()})")
+            text = line.decode(errors="replace")
+            if text.startswith(RESULT_PREFIX):
+                reply = json.loads(text[1:])
+                if reply.get("id") == request_id:
+                    return reply
+                continue
+            output.append(text)
+
+    async def kill(self):
+        """Kill the worker's process group in the container, then its exec client"""
+        if self.process is not None and self.process.returncode is None:
+            command = group_kill_command(self.command, self.info)
+            if command is not None:
+                try:
+                    killer = await asyncio.create_subprocess_exec(*command, cwd=PROJECT_ROOT, stdout=asyncio.subprocess.DEVNULL,
+                                                                  stderr=asyncio.subprocess.DEVNULL)
+                    await asyncio.wait_for(killer.wait(), KILL_TIMEOUT)
+                except (OSError, asyncio.TimeoutError) as e:
+                    print(f"⚠️  Could not kill test worker group {self.info['pgid']}: {e}", file=sys.stderr)
+            self.process.kill()
+        self.process = None
+
+    async def close(self):
+        if self.process is None:
+            return
+        try:
+            self.process.stdin.close()
+            await asyncio.wait_for(self.process.wait(), 5)
+        except (OSError, asyncio.TimeoutError):
+            await self.kill()
+        self.process = None
+
+
+async def run_shards(shards: list, workers: int = 4, timeout: float = 300, fail_fast: bool = False,
+                     command: list = WORKER_COMMAND, on_result=None) -> list:
+    """Run shards on up to `workers` concurrent workers; results come back in shard order"""
+    pending = asyncio.Queue()
+    for shard in shards:
+        pending.put_nowait(shard)
+    results = {}
+    stop = asyncio.Event()
+
+    async def work(token: int):
+        worker = AsyncWorker(command, token)
+        try:
+            while not stop.is_set():
+                try:
+                    shard = pending.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                results[shard.label] = ShardResult(shard=shard, cancelled=True)
+                result = await worker.run(shard, timeout)
+                results[shard.label] = result
+                if on_result is not None:
+                    on_result(result)
+                if fail_fast and not result.success:
+                    stop.set()
+        finally:
+            # Cancellation (fail-fast) lands here too: never leave a worker running
+            if stop.is_set():
+                await worker.kill()
+            else:
+                await worker.close()
+
+    tasks = [asyncio.ensure_future(work(token)) for token in range(1, min(workers, len(shards)) + 1)]
+    waiter = asyncio.ensure_future(stop.wait())
+    while not all(task.done() for task in tasks):
+        await asyncio.wait(tasks + [waiter], return_when=asyncio.FIRST_COMPLETED)
+        if stop.is_set():
+            for task in tasks:
+                task.cancel()
+            break
+    waiter.cancel()
+    outcomes = await asyncio.gather(*tasks, return_exceptions=True)
+    for outcome in outcomes:
+        if isinstance(outcome, Exception) and not isinstance(outcome, asyncio.CancelledError):
+            raise outcome
+    return [results.get(shard.label, ShardResult(shard=shard, cancelled=True)) for shard in shards]
+
+
+def run_targets(targets: list, command: list = WORKER_COMMAND, workers: int = 4, timeout: float = 300,
+                fail_fast: bool = False, on_result=None, use_cache: bool = True, schedule: bool = True) -> dict:
+    """Run targets through the result cache, the scheduler and the shard runner; returns the merged result"""
+    cached, digests, cache, impact = [], {}, None, None
+    if use_cache or schedule:
+        try:
+            impact = build_impact_index()
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Impact index unavailable ({e}) - running targets as given", file=sys.stderr)
+    if use_cache and impact is not None:
+        try:
+            cache = ResultCache()
+            targets, cached, digests = split_cached(targets, impact, cache, environment_fingerprint(command))
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Test result cache unavailable ({e}) - running everything", file=sys.stderr)
+    if cached:
+        print(f"♻️  {len(cached)} test(s) unchanged since they passed - served from cache", file=sys.stderr)
+    shards = schedule_shards(targets, impact, workers) if schedule and impact is not None else make_shards(targets)
+    results = asyncio.run(run_shards(shards, workers, timeout, fail_fast, command, on_result)) if shards else []
+    if cache is not None:
+        cache.store_run([test for result in results for test in result.tests], digests)
+        cache.save()
+    # Only tests that actually ran go into the history; cached passes were not re-measured
+    record_results([test for result in results for test in result.tests], "parallel_tests")
+    return merge_results(results, cached)
+
+
+def schedule_shards(targets: list, impact, workers: int) -> list:
+    """One balanced shard per worker, failing shards first; targets the index cannot resolve run as given first"""
+    try:
+        plans, unresolved = plan_shards(targets, impact, workers)
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Test scheduling unavailable ({e}) - one shard per target", file=sys.stderr)
+        return make_shards(targets)
+    return make_shards(unresolved) + [Shard(label=plan.label, filter=plan.filter, args=ORDER_ARGS) for plan in plans]
+
+
+def merge_results(results: list, cached: list = ()) -> dict:
+    """One test_result dict (the shape report_results() renders) for all shards and cached records"""
+    tests = list(cached) + [test for result in results for test in result.tests]
+    notes = []
+    for result in results:
+        if result.timed_out:
+            notes.append(f"{result.shard.label}: timed out after {result.duration:.0f}s")
+        elif result.cancelled:
+            notes.append(f"{result.shard.label}: cancelled (fail-fast)")
+        elif result.exit_code != 0 and not any(test.failed for test in result.tests):
+            notes.append(f"{result.shard.label}: exit code {result.exit_code}\n{result.stdout.strip()[-800:]}")
+    failure_details = "\n".join(filter(None, [format_failures(tests)] + notes))
+    return {
+        "success": bool(results or cached) and all(result.success for result in results),
+        "exit_code": max((shard_exit_code(result) for result in results), default=0),
+        "stdout": "".join(f"==> {result.shard.label}\n{result.stdout}" for result in results),
+        "stderr": "",
+        "failure_details": failure_details,
+        "tests": tests,
+        "shards": [{
+            "shard": result.shard.label,
+            "success": result.success,
+            "exit_code": result.exit_code,
+            "duration": result.duration,
+            "timed_out": result.timed_out,
+            "cancelled": result.cancelled,
+            "tests": len(result.tests),
+        } for result in results],
+        "cached": len(cached),
+    }
+
+
+def shard_exit_code(result: ShardResult) -> int:
+    """Exit code of a shard, with timeouts reported like timeout(1) does"""
+    if result.timed_out:
+        return 124
+    return result.exit_code or 0
+
+
+def print_shard(result: ShardResult):
+    if result.timed_out:
+        status = "⏱️ "
+    else:
+        status = "✅" if result.success else "❌"
+    failed = sum(1 for test in result.tests if test.failed)
+    print(f"{status} {result.shard.label}: {len(result.tests)} tests, {failed} failed ({result.duration:.2f}s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run test shards in parallel persistent workers")
+    parser.add_argument("targets", nargs="*", default=DEFAULT_TARGETS, help="Filters or test files (default: the API and payment suites)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent workers")
+    parser.add_argument("--timeout", type=float, default=300, help="Per-shard timeout in seconds")
+    parser.add_argument("--fail-fast", action="store_true", help="Cancel remaining shards after the first failure")
+    parser.add_argument("--local", action="store_true", help="Use the local stand-in worker instead of Docker")
+    parser.add_argument("--results", help="Canned results for the stand-in worker (JSON)")
+    parser.add_argument("--json", action="store_true", help="Print the merged result as JSON")
+    parser.add_argument("--no-cache", action="store_true", help="Run every test, ignoring cached passes")
+    parser.add_argument("--no-schedule", action="store_true", help="One shard per target, in the order given")
+    args = parser.parse_args()
+
+    command = (STAND_IN_COMMAND + (["--results", args.results] if args.results else [])) if args.local else WORKER_COMMAND
+    started = time.monotonic()
+    try:
+        merged = run_targets(args.targets, command, args.workers, args.timeout, args.fail_fast,
+                             on_result=None if args.json else print_shard, use_cache=not args.no_cache,
+                             schedule=not args.no_schedule)
+    except (WorkerSessionError, OSError, asyncio.TimeoutError) as e:
+        print(f"❌ ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    if args.json:
+        merged["tests"] = [test.as_dict() for test in merged["tests"]]
+        print(json.dumps(merged, indent=2))
+    else:
+        print(f"\n{'✅' if merged['success'] else '❌'} {len(merged['shards'])} shard(s), {merged['cached']} cached test(s) in {time.monotonic() - started:.2f}s")
+        if merged["failure_details"]:
+            print(merged["failure_details"])
+    sys.exit(0 if merged["success"] else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,465 @@
+#!/usr/bin/env python3
+"""
+Batch patch engine for the backend tree.
+Applies many edits across routes, tests and docs in one process, reading, backing up and writing each file once.
+"""
+
+import sys
+import json
+import asyncio
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from backup_store import BackupStore, BackupError
+from impact_index import affected_tests, build_impact_index, test_filters
+from parallel_tests import DEFAULT_TARGETS, print_shard, run_targets
+from phpunit_session import STAND_IN_COMMAND, WORKER_COMMAND, WorkerSessionError
+from patch_spec import Edit, EditError, SpecError, PROJECT_ROOT, resolve_spec_paths, load_specs
+from php_index import PhpIndexError, php_index_for_content
+from route_cache import RouteStructureChecker
+from transaction import FileTransaction, TransactionError, recover_or_exit
+from text_diff import summarize
+from text_match import MultiPatternMatcher, NormalizedText, RegexBudgetError, bounded_finditer, bounded_search, can_combine, substitute
+from undo_journal import UndoJournal, new_txn_id, text_digest
+
+
+@dataclass
+class FilePlan:
+    """All edits queued against one file, plus the state carried through the batch"""
+    path: Path
+    edits: list = field(default_factory=list)
+    raw: bytes = b""
+    original: str = ""
+    content: str = ""
+    backup: str = None
+    written: bool = False
+    checkers: list = field(default_factory=list)
+    normalized: NormalizedText = None
+    undo: list = field(default_factory=list)
+
+
+# Structural checkers run on the whole file before and after every edit, keyed by path suffix.
+# Each factory receives the file path and returns an object with check(content) -> errors and save().
+STRUCTURE_CHECKS = {
+    "routes/api.php": RouteStructureChecker,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Apply a batch of edits across the backend tree in one pass")
+    parser.add_argument("specs", nargs="+", help="Patch spec files, directories, or spec names under patches/")
+    parser.add_argument("--dry-run", action="store_true", help="Verify every edit in memory without writing")
+    parser.add_argument("--paranoid", action="store_true", help="Also re-read every written file to verify it")
+    parser.add_argument("--summary", metavar="FILE", help="Write a JSON change summary (hunks, +/- lines per file)")
+    parser.add_argument("--run-tests", action="store_true", help="Run the tests affected by the batch after writing it")
+    parser.add_argument("--local", action="store_true", help="Run tests on the local stand-in worker instead of Docker")
+    parser.add_argument("--no-cache", action="store_true", help="Run the affected tests even if cached passes are still valid")
+    args = parser.parse_args()
+
+    recover_or_exit()
+    try:
+        edits = load_specs(resolve_spec_paths(args.specs))
+    except (SpecError, OSError) as e:
+        print(f"❌ ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+    impact = load_impact_index()
+    results = apply_batch(edits, dry_run=args.dry_run, paranoid=args.paranoid, impact=impact)
+    report_batch(results)
+    targets = test_targets(results, impact)
+    if targets:
+        print(f"🧪 Affected tests: {', '.join(targets)}")
+    if args.summary:
+        write_summary(results, Path(args.summary))
+    success = all(r["success"] for r in results)
+    if success and args.run_tests and not args.dry_run and targets:
+        success = run_affected_tests(targets, STAND_IN_COMMAND if args.local else WORKER_COMMAND, not args.no_cache)
+    sys.exit(0 if success else 1)
+
+
+def plan_batch(edits: list, root: Path = PROJECT_ROOT) -> list:
+    """Group edits by file, preserving the order they were given in"""
+    plans = {}
+    for edit in edits:
+        path = (root / edit.path).resolve()
+        plans.setdefault(path, FilePlan(path=path)).edits.append(edit)
+    return list(plans.values())
+
+
+def apply_batch(edits: list, dry_run: bool = False, root: Path = PROJECT_ROOT, store: BackupStore = None,
+                journal: UndoJournal = None, paranoid: bool = False, impact=None) -> list:
+    """Apply every edit in memory, then commit all touched files only if every edit verified.
+
+    With an impact index, each result also lists the tests its change can affect ("tests").
+    """
+    plans = plan_batch(edits, root)
+    store = store or BackupStore()
+    journal = journal or UndoJournal()
+
+    # Phase 1: read each file once and apply all of its edits in memory
+    results = []
+    for plan in plans:
+        result = {"path": plan.path, "edits": [], "success": False, "error": None}
+        results.append(result)
+        try:
+            validate_target(plan.path)
+            plan.raw = plan.path.read_bytes()
+            plan.original = decode_text(plan.raw)
+            plan.content = plan.original
+            plan.checkers = structure_checkers(plan.path)
+            check_structure(plan, "before")
+            for group in independent_groups(plan.edits):
+                before = plan.content
+                if group[0].method:
+                    plan.content, counts, reverse = apply_method_edits(plan.content, group)
+                elif len(group) == 1:
+                    plan.content, count, reverse = apply_edit(plan.content, group[0], plan)
+                    counts = [count]
+                else:
+                    plan.content, counts, reverse = apply_edit_group(plan.content, group)
+                plan.undo.append({
+                    "names": [edit.name for edit in group],
+                    "deltas": reverse,
+                    "before": text_digest(before),
+                    "after": text_digest(plan.content),
+                })
+                check_structure(plan, "after " + ", ".join(f"'{edit.name}'" for edit in group))
+                for edit, count in zip(group, counts):
+                    result["edits"].append({"name": edit.name, "replacements": count})
+                    print(f"✅ {edit.name}: verified in memory ({plan.path.name})")
+            result["diff"] = summarize(plan.original, plan.content, plan.path).as_dict()
+            if impact is not None:
+                result["tests"] = sorted(affected_tests([(plan.path, plan.original, plan.content)], impact))
+            result["success"] = True
+        except (EditError, RegexBudgetError, OSError) as e:
+            result["error"] = str(e)
+            print(f"❌ {plan.path.name}: {e}", file=sys.stderr)
+
+    if not all(r["success"] for r in results):
+        print("❌ BATCH ABORTED: No files were modified", file=sys.stderr)
+        return results
+
+    if dry_run:
+        print("💡 Dry run: all edits verified, nothing written")
+        return results
+
+    # Phase 2: back up (from the bytes already in memory), stage every changed file, then commit them together
+    changed = [plan for plan in plans if plan.content != plan.original]
+    txn = new_txn_id()
+    transaction = FileTransaction(txn, paranoid=paranoid)
+    try:
+        for plan in changed:
+            plan.backup = store.backup(plan.path, plan.raw)
+        for plan in changed:
+            transaction.stage(plan.path, plan.content.encode())
+        transaction.commit()
+        for plan in changed:
+            plan.written = True
+            for checker in plan.checkers:
+                checker.save()
+            print(f"✅ Atomic write completed: {plan.path}")
+    except (EditError, BackupError, TransactionError, OSError) as e:
+        print(f"❌ WRITE FAILURE: {e}", file=sys.stderr)
+        for plan in changed:
+            plan.written = plan.path in transaction.renamed
+        rollback_batch(changed, store)
+        transaction.abort()
+        for result in results:
+            result["success"] = False
+            result["error"] = result["error"] or f"Batch rolled back: {e}"
+        return results
+
+    # Phase 3: journal the reverse deltas so the batch can be undone without whole-file restores
+    try:
+        if changed:
+            journal.commit(txn, [(plan.path, plan.undo) for plan in changed])
+    except OSError as e:
+        txn = None
+        print(f"⚠️  Undo journal write failed ({e}) - use the backup objects to revert", file=sys.stderr)
+
+    for plan, result in zip(plans, results):
+        result["backup"] = plan.backup
+        result["txn"] = txn if plan in changed else None
+    return results
+
+
+def load_impact_index():
+    """The test impact index, or None (run the default suites) when the backend cannot be scanned"""
+    try:
+        return build_impact_index()
+    except (OSError, ValueError) as e:
+        print(f"⚠️  Test impact index unavailable ({e}) - falling back to the default suites", file=sys.stderr)
+        return None
+
+
+def test_targets(results: list, impact) -> list:
+    """The minimal filters covering every changed file, or the default suites without an index"""
+    if not any(result.get("diff", {}).get("hunks") for result in results):
+        return []
+    if impact is None or any("tests" not in result for result in results if result["success"]):
+        return list(DEFAULT_TARGETS)
+    return test_filters({test for result in results for test in result["tests"]}, impact)
+
+
+def run_affected_tests(targets: list, command: list, use_cache: bool = True) -> bool:
+    """Run the selected tests in parallel workers and print the outcome"""
+    print(f"\n🧪 Running {len(targets)} test target(s)...")
+    try:
+        merged = run_targets(targets, command, on_result=print_shard, use_cache=use_cache)
+    except (WorkerSessionError, OSError, asyncio.TimeoutError) as e:
+        print(f"❌ Test run failed: {e}", file=sys.stderr)
+        return False
+    if merged["failure_details"]:
+        print(merged["failure_details"])
+    print(f"{'✅' if merged['success'] else '❌'} Affected tests {'passed' if merged['success'] else 'failed'}")
+    return merged["success"]
+
+
+def decode_text(raw: bytes) -> str:
+    """Decode file bytes the way Path.read_text() does, with universal newlines"""
+    return raw.decode("utf-8").replace("\r\n", "\n").replace("\r", "\n")
+
+
+def validate_target(path: Path):
+    """Validate that the target is an existing regular file"""
+    if not path.exists():
+        raise EditError(f"File not found: {path}")
+    if not path.is_file():
+        raise EditError(f"Path is not a file: {path}")
+
+
+def structure_checkers(path: Path) -> list:
+    """Instantiate the structural checkers registered for this file, if any"""
+    return [factory(path) for suffix, factory in STRUCTURE_CHECKS.items() if path.as_posix().endswith(suffix)]
+
+
+def check_structure(plan: FilePlan, stage: str):
+    """Run the file's structural checkers against its current in-memory content"""
+    for checker in plan.checkers:
+        errors = checker.check(plan.content)
+        if errors:
+            raise EditError(f"Structural integrity violation {stage}: " + "; ".join(errors))
+
+
+def apply_edit(content: str, edit: Edit, plan: FilePlan = None) -> (str, int, list):
+    """Apply one edit with exact match count and post-condition verification; also returns its reverse deltas"""
+    check_preconditions(content, edit)
+
+    if edit.regex:
+        changes = [(m.start(), m.end(), edit.replacement) for m in bounded_finditer(edit.pattern, content)]
+    else:
+        changes, _ = MultiPatternMatcher([(edit.target, False, 0)]).substitutions(content, [edit.replacement])
+        if not changes and edit.whitespace == "normalized":
+            spans = normalized_view(plan, content).find_all(edit.target)
+            changes = [(start, end, edit.replacement) for start, end in spans]
+            if changes:
+                print(f"⚠️  {edit.name}: matched with whitespace variations - proceeding with caution")
+    updated, reverse = substitute(content, changes)
+    count = len(changes)
+
+    check_count(edit, count)
+    if edit.replacement not in updated:
+        raise EditError(f"{edit.name}: replacement not found in updated content")
+    if not target_matches(edit, edit.replacement) and target_matches(edit, updated):
+        raise EditError(f"{edit.name}: original target still present after replacement")
+    check_postconditions(updated, edit)
+
+    return updated, count, reverse
+
+
+def apply_edit_group(content: str, edits: list) -> (str, list, list):
+    """Apply independent edits with one scan for all targets and one join for the output"""
+    for edit in edits:
+        check_preconditions(content, edit)
+
+    matcher = MultiPatternMatcher([(edit.target, edit.regex, edit.flags) for edit in edits])
+    changes, counts = matcher.substitutions(content, [edit.replacement for edit in edits])
+    updated, reverse = substitute(content, changes)
+
+    for edit, count in zip(edits, counts):
+        check_count(edit, count)
+    # Every replacement was inserted by construction; one more scan catches any surviving target. Edits whose
+    # replacement contains their own target are left out of it, as apply_edit does
+    checked = [edit for edit in edits if not target_matches(edit, edit.replacement)]
+    if checked:
+        scan = matcher if len(checked) == len(edits) else MultiPatternMatcher(
+            [(edit.target, edit.regex, edit.flags) for edit in checked])
+        leftover = bounded_search(scan.pattern, updated)
+        if leftover:
+            edit = checked[int(leftover.lastgroup[1:])]
+            raise EditError(f"{edit.name}: original target still present after replacement")
+    for edit in edits:
+        check_postconditions(updated, edit)
+
+    return updated, counts, reverse
+
+
+def apply_method_edits(content: str, edits: list) -> (str, list, list):
+    """Replace whole PHP methods by name, all located with one lex of the file"""
+    for edit in edits:
+        check_preconditions(content, edit)
+
+    data = content.encode()
+    index = php_index_for_content(data)
+    ascii_only = len(data) == len(content)
+    changes = []
+    counts = []
+    for edit in edits:
+        try:
+            method = index.method(edit.target, edit.cls)
+        except PhpIndexError as e:
+            raise EditError(f"{edit.name}: {e}")
+        counts.append(0 if method is None else 1)
+        check_count(edit, counts[-1])
+        start, end = method.replaced_span(edit.replacement)
+        if not ascii_only:
+            start, end = len(data[:start].decode()), len(data[:end].decode())
+        changes.append((start, end, edit.replacement))
+    updated, reverse = substitute(content, sorted(changes))
+
+    for edit in edits:
+        check_postconditions(updated, edit)
+    return updated, counts, reverse
+
+
+def independent_groups(edits: list) -> list:
+    """Split a file's edits into runs that can be applied in a single scan without changing the result"""
+    groups = []
+    current = []
+    for edit in edits:
+        if edit.method:
+            # Method edits share one lex: group them while each names a different method
+            if current and current[0].method and all(independent_methods(edit, other) for other in current):
+                current.append(edit)
+            else:
+                if current:
+                    groups.append(current)
+                current = [edit]
+            continue
+        if current and current[0].method:
+            groups.append(current)
+            current = []
+        combinable = edit.whitespace == "exact" and (not edit.regex or can_combine(edit.pattern))
+        if combinable and current and all(independent(edit, other) for other in current):
+            current.append(edit)
+            continue
+        if current:
+            groups.append(current)
+        current = [edit]
+        if not combinable:
+            groups.append(current)
+            current = []
+    if current:
+        groups.append(current)
+    return groups
+
+
+def independent(later: Edit, earlier: Edit) -> bool:
+    """Whether applying both edits in one scan gives the same result as applying them in order"""
+    if target_matches(later, earlier.replacement) or target_matches(earlier, later.replacement):
+        return False
+    return not any(r in earlier.target or r in earlier.replacement for r in later.require_before)
+
+
+def independent_methods(later: Edit, earlier: Edit) -> bool:
+    """Whether two method edits touch different methods and neither depends on the other's output"""
+    if later.target == earlier.target and (later.cls is None or earlier.cls is None or later.cls == earlier.cls):
+        return False
+    return not any(r in earlier.replacement for r in later.require_before)
+
+
+def check_preconditions(content: str, edit: Edit):
+    """Verify the edit's expected-before text is present"""
+    for required in edit.require_before:
+        if required not in content:
+            raise EditError(f"{edit.name}: pre-condition failed, missing '{required}'")
+
+
+def check_count(edit: Edit, count: int):
+    """Verify the target matched exactly as many times as expected"""
+    if count == 0:
+        raise EditError(f"{edit.name}: target not found")
+    if count != edit.expected_count:
+        raise EditError(f"{edit.name}: {count} matches, expected {edit.expected_count} - structural damage possible")
+
+
+def check_postconditions(updated: str, edit: Edit):
+    """Verify the edit's post-conditions against the updated content"""
+    for required in edit.require_after:
+        if required not in updated:
+            raise EditError(f"{edit.name}: post-condition failed, missing '{required}'")
+    for forbidden in edit.forbid_after:
+        if forbidden in updated:
+            raise EditError(f"{edit.name}: post-condition failed, '{forbidden}' still present")
+
+
+def normalized_view(plan: FilePlan, content: str) -> NormalizedText:
+    """Whitespace-normalized view of the content, built once per file version and shared by its edits"""
+    if plan is None:
+        return NormalizedText(content)
+    if plan.normalized is None or plan.normalized.text is not content:
+        plan.normalized = NormalizedText(content)
+    return plan.normalized
+
+
+def target_matches(edit: Edit, content: str) -> bool:
+    """Check whether the edit target occurs in content"""
+    if edit.method:
+        return php_index_for_content(content.encode()).method(edit.target, edit.cls) is not None
+    if edit.regex:
+        return bounded_search(edit.pattern, content) is not None
+    return edit.target in content
+
+
+def rollback_batch(plans: list, store: BackupStore):
+    """Restore every already-written file from its backup object"""
+    for plan in plans:
+        if not plan.written:
+            continue
+        try:
+            store.restore(plan.backup, plan.path)
+            print(f"✅ Automatically restored from backup object: {plan.backup[:12]}", file=sys.stderr)
+        except Exception as e:
+            print(f"❌⚠️ CRITICAL RESTORE FAILURE: {str(e)}", file=sys.stderr)
+            print(f"⚠️ MANUAL RECOVERY REQUIRED: python3 backup_store.py restore {plan.backup} {plan.path}", file=sys.stderr)
+
+
+def write_summary(results: list, path: Path):
+    """Machine-readable batch summary: per file, its edits, outcome and diff size"""
+    summary = [{
+        "path": str(result["path"]),
+        "success": result["success"],
+        "error": result["error"],
+        "edits": result["edits"],
+        "diff": result.get("diff"),
+        "txn": result.get("txn"),
+        "tests": result.get("tests"),
+    } for result in results]
+    path.write_text(json.dumps(summary, indent=2) + "\n")
+
+
+def report_batch(results: list):
+    """Print a per-file summary of the batch"""
+    print("\n" + "="*80)
+    print("BATCH PATCH RESULTS")
+    print("="*80)
+    for result in results:
+        status = "✅" if result["success"] else "❌"
+        print(f"{status} {result['path']}")
+        for edit in result["edits"]:
+            print(f"    - {edit['name']} ({edit['replacements']} replacement)")
+        if result.get("diff"):
+            diff = result["diff"]
+            print(f"    📋 {diff['hunks']} hunk(s), +{diff['added']} -{diff['removed']} lines")
+        if result["error"]:
+            print(f"    💡 {result['error']}")
+        if result.get("backup"):
+            print(f"    💾 Backup object: {result['backup'][:12]} (restore: python3 backup_store.py restore {result['backup'][:12]} {result['path']})")
+    txns = {result["txn"] for result in results if result.get("txn")}
+    for txn in sorted(txns):
+        print(f"↩️  Journaled as transaction {txn} (undo: python3 undo_journal.py rollback --last 1)")
+
+
+if __name__ == "__main__":
+    main()
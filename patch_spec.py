@@ -0,0 +1,236 @@
+"""
+Declarative patch-spec loader for the batch patch engine.
+Parses JSON/YAML patch specs, validates them and compiles them once into matchers, cached on disk by spec hash.
+
+Spec format (JSON shown; YAML uses the same keys):
+
+    {
+      "name": "order-status-factory",
+      "patches": [
+        {
+          "name": "status transitions factory populates ownership fields",
+          "file": "backend/tests/Api/OrderControllerTest.php",
+          "anchor": {"literal": "...", "whitespace": "normalized"} | {"regex": "...", "flags": ["MULTILINE"]}
+                    | {"method": "test_order_status_transitions", "class": "OrderControllerTest"},
+          "expected_before": ["text that must exist before the edit"],
+          "replacement": "..." | ["line 1", "line 2"],
+          "count": 1,
+          "post": {"contains": ["..."], "absent": ["..."]}
+        }
+      ]
+    }
+
+Multi-line strings may be given as a list of lines, which are joined with newlines.
+A literal anchor with "whitespace": "normalized" falls back to a whitespace-insensitive match when the
+exact text is not found. A method anchor replaces a whole PHP method through its closing brace, located by
+name with php_index; "class" is only needed when several classes define it. A replacement that starts at the
+signature keeps the method's docblock, comments and attributes; one that starts with its own replaces them.
+"""
+
+import re
+import sys
+import json
+import pickle
+import hashlib
+from dataclasses import dataclass, field
+from pathlib import Path
+
+try:
+    import yaml
+except ImportError:  # YAML specs are optional; JSON always works
+    yaml = None
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+CACHE_ROOT = PROJECT_ROOT / ".patch_cache"
+SPEC_DIR = PROJECT_ROOT / "patches"
+
+# Bump when the compiled representation changes so stale cache entries are ignored
+SPEC_FORMAT_VERSION = 3
+
+SPEC_SUFFIXES = (".json", ".yaml", ".yml")
+
+
+@dataclass
+class Edit:
+    """A single search/replace edit with its own pre/post conditions"""
+    name: str
+    path: str
+    target: str
+    replacement: str
+    regex: bool = False
+    flags: int = 0
+    expected_count: int = 1
+    require_before: tuple = ()
+    require_after: tuple = ()
+    forbid_after: tuple = ()
+    whitespace: str = "exact"
+    method: bool = False  # target is a PHP method name; cls optionally names its class
+    cls: str = None
+    pattern: re.Pattern = field(default=None, repr=False, compare=False)
+
+    def __post_init__(self):
+        if self.regex and self.pattern is None:
+            self.pattern = compile_pattern(self.target, self.flags)
+
+
+class EditError(Exception):
+    """Raised when an edit fails its pre- or post-conditions"""
+
+
+class SpecError(Exception):
+    """Raised when a patch spec is malformed"""
+
+
+_PATTERNS = {}
+
+
+def compile_pattern(target: str, flags: int) -> re.Pattern:
+    """Compile a regex once per process, shared by every spec that uses it"""
+    key = (target, flags)
+    if key not in _PATTERNS:
+        try:
+            _PATTERNS[key] = re.compile(target, flags)
+        except re.error as e:
+            raise SpecError(f"Invalid regex {target[:60]!r}: {e}")
+    return _PATTERNS[key]
+
+
+def resolve_spec_paths(names: list, spec_dir: Path = SPEC_DIR) -> list:
+    """Resolve CLI arguments to spec files: paths, directories, or names under patches/"""
+    paths = []
+    for name in names:
+        candidate = Path(name)
+        if candidate.is_dir():
+            paths.extend(sorted(p for p in candidate.iterdir() if p.suffix in SPEC_SUFFIXES))
+            continue
+        if candidate.is_file():
+            paths.append(candidate)
+            continue
+        for suffix in SPEC_SUFFIXES:
+            named = spec_dir / f"{name}{suffix}"
+            if named.is_file():
+                paths.append(named)
+                break
+        else:
+            raise SpecError(f"Patch spec not found: {name}")
+    return paths
+
+
+def load_specs(paths: list, cache_dir: Path = CACHE_ROOT / "specs") -> list:
+    """Load and compile every spec, in order, reusing cached compilations by spec hash"""
+    edits = []
+    for path in paths:
+        edits.extend(load_spec(Path(path), cache_dir))
+    return edits
+
+
+def load_spec(path: Path, cache_dir: Path = CACHE_ROOT / "specs") -> list:
+    """Load one spec file, hitting the on-disk cache when its content is unchanged"""
+    raw = path.read_bytes()
+    digest = hashlib.sha256(raw + f"|v{SPEC_FORMAT_VERSION}".encode()).hexdigest()
+    cache_file = cache_dir / f"{digest}.pickle"
+
+    if cache_file.exists():
+        try:
+            with cache_file.open("rb") as f:
+                return pickle.load(f)
+        except Exception:
+            pass  # Corrupt or incompatible entry - recompile below
+
+    edits = compile_spec(parse_spec(raw, path), path)
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_suffix(".tmp")
+        with temp_file.open("wb") as f:
+            pickle.dump(edits, f, protocol=pickle.HIGHEST_PROTOCOL)
+        temp_file.replace(cache_file)
+    except OSError as e:
+        print(f"⚠️  Spec cache write failed for {path.name}: {e}", file=sys.stderr)
+
+    return edits
+
+
+def parse_spec(raw: bytes, path: Path) -> dict:
+    """Parse raw spec bytes as JSON or YAML depending on the file suffix"""
+    try:
+        text = raw.decode("utf-8")
+    except UnicodeDecodeError as e:
+        raise SpecError(f"{path.name}: not UTF-8 - {e}")
+    if path.suffix in (".yaml", ".yml"):
+        if yaml is None:
+            raise SpecError(f"{path.name}: PyYAML is not installed - use a JSON spec or pip install pyyaml")
+        try:
+            data = yaml.safe_load(text)
+        except yaml.YAMLError as e:
+            raise SpecError(f"{path.name}: invalid YAML - {e}")
+    else:
+        try:
+            data = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise SpecError(f"{path.name}: invalid JSON - {e}")
+
+    if not isinstance(data, dict) or not isinstance(data.get("patches"), list):
+        raise SpecError(f"{path.name}: spec must be a mapping with a 'patches' list")
+    return data
+
+
+def compile_spec(data: dict, path: Path) -> list:
+    """Validate a parsed spec and turn each patch into an Edit with its matcher compiled"""
+    spec_name = data.get("name", path.stem)
+    edits = []
+    for i, patch in enumerate(data["patches"], 1):
+        where = f"{path.name} patch #{i}"
+        if not isinstance(patch, dict):
+            raise SpecError(f"{where}: patch must be a mapping")
+        for key in ("file", "anchor", "replacement"):
+            if key not in patch:
+                raise SpecError(f"{where}: missing required key '{key}'")
+
+        anchor = patch["anchor"]
+        if isinstance(anchor, (str, list)):
+            anchor = {"literal": anchor}
+        if not isinstance(anchor, dict) or len({"literal", "regex", "method"} & anchor.keys()) != 1:
+            raise SpecError(f"{where}: anchor must have exactly one of 'literal', 'regex' or 'method'")
+
+        regex = "regex" in anchor
+        method = "method" in anchor
+        kind = "regex" if regex else "method" if method else "literal"
+        whitespace = anchor.get("whitespace", "exact")
+        if whitespace not in ("exact", "normalized") or (kind != "literal" and whitespace != "exact"):
+            raise SpecError(f"{where}: whitespace must be 'exact' or 'normalized' (literal anchors only)")
+        flags = 0
+        for flag in anchor.get("flags", []):
+            if not isinstance(flag, str) or flag not in re.RegexFlag.__members__:
+                raise SpecError(f"{where}: unknown regex flag '{flag}'")
+            flags |= re.RegexFlag[flag]
+
+        try:
+            expected_count = int(patch.get("count", 1))
+        except (TypeError, ValueError):
+            raise SpecError(f"{where}: count must be an integer, got {patch['count']!r}")
+
+        post = patch.get("post", {})
+        edits.append(Edit(
+            name=patch.get("name", f"{spec_name}#{i}"),
+            path=patch["file"],
+            target=join_lines(anchor[kind]),
+            replacement=join_lines(patch["replacement"]),
+            regex=regex,
+            flags=flags,
+            expected_count=expected_count,
+            require_before=tuple(join_lines(s) for s in patch.get("expected_before", [])),
+            require_after=tuple(join_lines(s) for s in post.get("contains", [])),
+            forbid_after=tuple(join_lines(s) for s in post.get("absent", [])),
+            whitespace=whitespace,
+            method=method,
+            cls=anchor.get("class"),
+        ))
+    return edits
+
+
+def join_lines(value) -> str:
+    """Accept a string or a list of lines for multi-line values"""
+    if isinstance(value, list):
+        return "\n".join(value)
+    return value
@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+"""
+Lightweight PHP lexer that indexes the classes and methods of a file.
+One linear scan skips strings, comments, heredocs/nowdocs and inline HTML, tracks braces, and records the
+exact byte range of every class and method (a method's range includes the docblock, comments and #[...]
+attributes directly above it; a replacement that starts at the signature keeps them), so a method can be looked up and replaced by name without
+another pass. Indexes are cached by content hash (in memory and on disk), so every edit against the same
+version of a file shares one lex.
+"""
+
+import re
+import sys
+import pickle
+import hashlib
+import argparse
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from patch_spec import CACHE_ROOT
+
+PHP_INDEX_CACHE_DIR = CACHE_ROOT / "php_index"
+
+# Bump when the lexer or the index classes change so stale entries are ignored
+PHP_INDEX_CACHE_VERSION = 3
+
+TOKEN_RE = re.compile(rb"""
+    (?P<comment>//[^\n]*|\#(?!\[)[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*"|`(?:[^`\\]|\\.)*`)
+  | (?P<heredoc><<<[ \t]*(?P<quote>['"]?)(?P<label>[A-Za-z_]\w*)(?P=quote)\r?\n)
+  | (?P<close_tag>\?>)
+  | (?P<brace>[{}])
+  | (?P<semicolon>;)
+  | (?<![\w$>:\\])(?P<decl>class|interface|trait|enum|function)(?!\w)
+""", re.DOTALL | re.VERBOSE)
+FUNCTION_NAME_RE = re.compile(rb"\s*&?\s*(\w+)?\s*\(")
+CLASS_NAME_RE = re.compile(rb"\s+(\w+)")
+OPEN_TAG_RE = re.compile(rb"<\?(?:php\b|=)?")
+ANONYMOUS = (b"extends", b"implements")
+
+
+class PhpIndexError(Exception):
+    """A method lookup failed or was ambiguous"""
+
+
+@dataclass
+class PhpMethod:
+    """A method: start is the start of its docblock/attribute lines (else its declaration line), end is just past its
+    closing brace (or ';'); decl_start and line are the start and number of the declaration line itself"""
+    name: str
+    cls: str
+    start: int
+    end: int
+    body_start: int = None  # Offset of the opening '{'; None for abstract and interface methods
+    line: int = 0
+    decl_start: int = None
+
+    def replaced_span(self, replacement) -> (int, int):
+        """Byte span a replacement overwrites: the docblock and attributes stay unless it brings its own"""
+        return (self.start if has_leading_block(replacement) else self.decl_start), self.end
+
+
+@dataclass
+class PhpClass:
+    name: str
+    kind: str  # class, interface, trait or enum
+    start: int
+    end: int = 0
+    line: int = 0
+    methods: dict = field(default_factory=dict)
+
+
+@dataclass
+class PhpIndex:
+    """Classes, methods and comment ranges of one version of a PHP file (byte offsets)"""
+    classes: dict = field(default_factory=dict)
+    methods: dict = field(default_factory=dict)  # method name -> [PhpMethod], in file order
+    comments: list = field(default_factory=list)
+
+    def method(self, name: str, cls: str = None) -> PhpMethod:
+        """The method with this name (in class cls, if given); None if absent"""
+        candidates = [m for m in self.methods.get(name, ()) if cls is None or m.cls == cls]
+        if len(candidates) > 1:
+            raise PhpIndexError(f"Method {name} is defined in {len(candidates)} classes - name the class")
+        return candidates[0] if candidates else None
+
+    def replace_method(self, data: bytes, name: str, replacement: bytes, cls: str = None) -> bytes:
+        """data with the method replaced: from its docblock and attributes if the replacement brings its own,
+        otherwise from the declaration line (keeping them), through the closing brace"""
+        method = self.method(name, cls)
+        if method is None:
+            raise PhpIndexError(f"Method {name} not found")
+        start, end = method.replaced_span(replacement)
+        return data[:start] + replacement + data[end:]
+
+    def strip_comments(self, data: bytes) -> bytes:
+        """data with every comment blanked out; offsets and line numbers are unchanged"""
+        parts = []
+        cursor = 0
+        for start, end in self.comments:
+            parts.append(data[cursor:start])
+            parts.append(re.sub(rb"[^\n]", b" ", data[start:end]))
+            cursor = end
+        parts.append(data[cursor:])
+        return b"".join(parts)
+
+
+def build_php_index(data: bytes) -> PhpIndex:
+    """Lex a PHP file once and index its classes and methods"""
+    index = PhpIndex()
+    scopes = []  # (kind, record) per open brace: kind is "class", "function" or "block"
+    pending = None  # Declaration waiting for its '{' (or ';' for a body-less method)
+    line, line_pos = 1, 0
+
+    def line_at(offset):
+        nonlocal line, line_pos
+        line += data.count(b"\n", line_pos, offset)
+        line_pos = offset
+        return line
+
+    position = OPEN_TAG_RE.search(data).end() if data.lstrip().startswith(b"<?") else 0
+    while True:
+        match = TOKEN_RE.search(data, position)
+        if match is None:
+            break
+        kind = match.lastgroup
+        position = match.end()
+        if kind == "comment":
+            index.comments.append((match.start(), match.end()))
+        elif kind in ("label", "heredoc"):
+            closing = re.compile(rb"^[ \t]*" + re.escape(match.group("label")) + rb"(?!\w)", re.MULTILINE)
+            end = closing.search(data, position)
+            position = end.end() if end else len(data)
+        elif kind == "close_tag":
+            reopen = OPEN_TAG_RE.search(data, position)
+            position = reopen.end() if reopen else len(data)
+        elif kind == "decl":
+            keyword = match.group("decl")
+            start = data.rfind(b"\n", 0, match.start()) + 1
+            if keyword == b"function":
+                name = FUNCTION_NAME_RE.match(data, position)
+                if name:
+                    position = name.end()
+                pending = ("function", name.group(1).decode() if name and name.group(1) else None, start,
+                           _leading_start(data, start, index.comments))
+            else:
+                name = CLASS_NAME_RE.match(data, position)
+                if name and name.group(1) not in ANONYMOUS:
+                    position = name.end()
+                    pending = (keyword.decode(), name.group(1).decode(), start)
+                else:
+                    pending = ("anonymous", None, start)
+        elif kind == "brace" and match.group() == b"{":
+            if pending is None:
+                scopes.append(("block", None))
+            elif pending[0] == "function":
+                enclosing = scopes[-1] if scopes else (None, None)
+                if pending[1] and enclosing[0] == "class":
+                    record = PhpMethod(pending[1], enclosing[1].name, pending[3], 0, match.start(), line_at(pending[2]),
+                                       pending[2])
+                    scopes.append(("function", record))
+                else:
+                    scopes.append(("block", None))  # Closure or top-level function
+            elif pending[0] == "anonymous":
+                scopes.append(("class", PhpClass("class@anonymous", "class", pending[2])))
+            else:
+                scopes.append(("class", PhpClass(pending[1], pending[0], pending[2], line=line_at(pending[2]))))
+            pending = None
+        elif kind == "brace":
+            if not scopes:
+                continue  # Unbalanced closing brace - keep going
+            scope, record = scopes.pop()
+            if record is None:
+                continue
+            record.end = match.end()
+            if scope == "class" and record.name != "class@anonymous":
+                index.classes[record.name] = record
+            elif scope == "function":
+                _add_method(index, scopes, record)
+        elif kind == "semicolon" and pending is not None:
+            enclosing = scopes[-1] if scopes else (None, None)
+            if pending[0] == "function" and pending[1] and enclosing[0] == "class":
+                _add_method(index, scopes, PhpMethod(pending[1], enclosing[1].name, pending[3], match.end(),
+                                                     line=line_at(pending[2]), decl_start=pending[2]))
+            pending = None
+    return index
+
+
+def has_leading_block(text) -> bool:
+    """Whether method text (str or bytes) opens with a docblock, comment or #[...] attribute"""
+    head = text.lstrip()[:2]
+    if isinstance(head, bytes):
+        head = head.decode(errors="replace")
+    return head in ("/*", "//") or head.startswith("#")
+
+
+def _leading_start(data: bytes, start: int, comments: list) -> int:
+    """Start of the comments and #[...] attributes on the lines directly above a declaration line (no blank line
+    in between); start itself if there are none"""
+    i = len(comments) - 1
+    while start > 0:
+        above = data.rfind(b"\n", 0, start - 1) + 1
+        text = data[above:start].strip()
+        if not text:
+            break
+        while i >= 0 and comments[i][0] >= start:
+            i -= 1
+        if i >= 0 and comments[i][1] > above and not data[comments[i][1]:start].strip():
+            # A comment ending on the line above; it counts only if nothing but indentation precedes it
+            line_start = data.rfind(b"\n", 0, comments[i][0]) + 1
+            if data[line_start:comments[i][0]].strip():
+                break
+            start = line_start
+            i -= 1
+        elif text.endswith(b"]"):
+            opening = _attribute_start(data, above, start)
+            if opening is None:
+                break
+            start = opening
+        else:
+            break
+    return start
+
+
+def _attribute_start(data: bytes, above: int, end: int) -> int:
+    """Start of the line opening the #[...] attribute that closes on the line data[above:end], or None"""
+    opening = data.rfind(b"#[", 0, end)
+    while opening >= 0:
+        line_start = data.rfind(b"\n", 0, opening) + 1
+        chunk = data[opening:end]
+        if not data[line_start:opening].strip() and chunk.count(b"[") == chunk.count(b"]"):
+            return line_start if not re.search(rb"[;{}]", chunk) else None
+        if line_start < above and re.search(rb"[;{}]", data[line_start:above]):
+            return None  # Ran past the previous statement
+        opening = data.rfind(b"#[", 0, opening)
+    return None
+
+
+def _add_method(index: PhpIndex, scopes: list, method: PhpMethod):
+    if scopes and scopes[-1][0] == "class":
+        scopes[-1][1].methods[method.name] = method
+    if method.cls != "class@anonymous":
+        index.methods.setdefault(method.name, []).append(method)
+
+
+_INDEXES = {}
+
+
+def content_digest(data: bytes) -> str:
+    return hashlib.sha256(data + f"|php-v{PHP_INDEX_CACHE_VERSION}".encode()).hexdigest()
+
+
+def php_index_for_content(data: bytes, cache_dir: Path = PHP_INDEX_CACHE_DIR) -> PhpIndex:
+    """Index for one version of a file: from memory, then the disk cache, lexing only on a miss"""
+    digest = content_digest(data)
+    index = _INDEXES.get(digest)
+    if index is not None:
+        return index
+    cache_file = cache_dir / f"{digest}.pickle"
+    try:
+        with cache_file.open("rb") as f:
+            index = pickle.load(f)
+    except Exception:
+        index = build_php_index(data)
+        try:
+            cache_dir.mkdir(parents=True, exist_ok=True)
+            temp_file = cache_file.with_suffix(".tmp")
+            temp_file.write_bytes(pickle.dumps(index, protocol=pickle.HIGHEST_PROTOCOL))
+            temp_file.replace(cache_file)
+        except OSError as e:
+            print(f"⚠️  PHP index cache write failed: {e}", file=sys.stderr)
+    _INDEXES[digest] = index
+    return index
+
+
+def load_php_index(path: Path) -> PhpIndex:
+    return php_index_for_content(Path(path).read_bytes())
+
+
+def method_text_span(text: str, name: str, cls: str = None, replacement: str = None) -> (int, int):
+    """Character span of a method in decoded text, or None; given a replacement, the span it overwrites"""
+    data = text.encode()
+    method = php_index_for_content(data).method(name, cls)
+    if method is None:
+        return None
+    start, end = (method.start, method.end) if replacement is None else method.replaced_span(replacement)
+    # Byte offsets back to character offsets
+    return len(data[:start].decode()), len(data[:end].decode())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List the classes and methods of PHP files with their byte ranges")
+    parser.add_argument("files", nargs="+", type=Path)
+    args = parser.parse_args()
+
+    for path in args.files:
+        try:
+            index = load_php_index(path)
+        except OSError as e:
+            print(f"❌ {path}: {e}", file=sys.stderr)
+            continue
+        print(f"📄 {path}")
+        for cls in index.classes.values():
+            print(f"  {cls.kind} {cls.name} (line {cls.line}, bytes {cls.start}-{cls.end})")
+            for method in cls.methods.values():
+                print(f"    - {method.name} (line {method.line}, bytes {method.start}-{method.end})")
+
+
+if __name__ == "__main__":
+    main()
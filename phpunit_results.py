@@ -0,0 +1,223 @@
+"""
+Structured PHPUnit results.
+TestRecord is the per-test result shared by the runners and reports. parse_junit() builds records from a
+PHPUnit JUnit XML log in one streaming pass; OutputParser builds them from artisan/PHPUnit console output
+line by line as it arrives, so neither needs the whole log in memory.
+"""
+
+import io
+import re
+import xml.etree.ElementTree as ET
+from dataclasses import dataclass, asdict
+
+PASSED, FAILED, ERROR, SKIPPED = "passed", "failed", "error", "skipped"
+
+
+@dataclass
+class TestRecord:
+    """Outcome of one test method"""
+    __test__ = False  # Not a pytest test class
+
+    name: str
+    status: str = PASSED
+    duration: float = 0.0
+    assertions: int = 0
+    message: str = ""
+    failure_type: str = ""
+    file: str = ""
+    line: int = 0
+
+    @property
+    def failed(self) -> bool:
+        return self.status in (FAILED, ERROR)
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def parse_junit(source) -> list:
+    """Records for every <testcase> in a JUnit report (XML text, bytes, path or file object)"""
+    if isinstance(source, str) and source.lstrip().startswith("<"):
+        source = io.BytesIO(source.encode())
+    elif isinstance(source, bytes):
+        source = io.BytesIO(source)
+
+    records = []
+    for _, element in ET.iterparse(source, events=("end",)):
+        if element.tag != "testcase":
+            continue
+        classname = element.get("class") or element.get("classname", "").replace(".", "\\")
+        record = TestRecord(
+            name=f"{classname}::{element.get('name')}" if classname else element.get("name", ""),
+            duration=float(element.get("time") or 0),
+            assertions=int(element.get("assertions") or 0),
+            file=element.get("file", ""),
+            line=int(element.get("line") or 0),
+        )
+        for child in element:
+            if child.tag in ("failure", "error"):
+                record.status = FAILED if child.tag == "failure" else ERROR
+                record.failure_type = child.get("type", "")
+                message = (child.text or child.get("message", "")).strip()
+                # PHPUnit repeats the test name as the first line of the failure text
+                record.message = message[len(record.name):].lstrip("\n") if message.startswith(record.name + "\n") else message
+                break
+            if child.tag == "skipped":
+                record.status = SKIPPED
+        records.append(record)
+        element.clear()  # Keep memory flat on large reports
+    return records
+
+
+def format_failures(records: list) -> str:
+    """PHPUnit-style failure listing, built from the records instead of a verbose re-run"""
+    failed = [record for record in records if record.failed]
+    if not failed:
+        return ""
+    lines = [f"There {'was' if len(failed) == 1 else 'were'} {len(failed)} failure{'' if len(failed) == 1 else 's'}:", ""]
+    for i, record in enumerate(failed, 1):
+        lines.append(f"{i}) {record.name}")
+        if record.failure_type:
+            lines.append(record.failure_type)
+        lines.append(record.message)
+        lines.append("")
+    return "\n".join(lines)
+
+
+# Line formats of the streaming parser: PHPUnit's testdox (phpunit.xml.dist enables it), Collision
+# (`php artisan test`), PHPUnit's failure listing, and the summary lines of both
+TESTDOX_CLASS_RE = re.compile(r"^(?P<title>\S.*) \((?P<cls>[\w\\]+)\)\s*$")
+TESTDOX_RESULT_RE = re.compile(r"^ (?P<mark>[✔✘↩∅☢⚠]) (?P<name>.+?)\s*$")
+TESTDOX_DETAIL_RE = re.compile(r"^\s+[┐├│┴]\s?(?P<text>.*)$")
+COLLISION_CLASS_RE = re.compile(r"^\s*(?:PASS|FAIL|WARN|SKIP|RISKY|INCOMPLETE)\s+(?P<cls>[\w\\]+)\s*$")
+COLLISION_RESULT_RE = re.compile(r"^\s+(?P<mark>[✓✔⨯✘x\-!…→])\s+(?P<name>.+?)(?:\s+(?P<seconds>\d+(?:\.\d+)?)s)?\s*$")
+COLLISION_FAILED_RE = re.compile(r"^\s*(?:FAILED|ERROR)\s+(?P<cls>[\w\\]+)\s+>\s+(?P<name>.+?)\s*$")
+LISTING_ITEM_RE = re.compile(r"^\d+\) (?P<name>[\w\\]+::\w+)")
+LISTING_END_RE = re.compile(r"^(?:FAILURES!|ERRORS!|OK, but|There w(?:as|ere) \d+ )")
+OK_SUMMARY_RE = re.compile(r"^OK \((?P<tests>\d+) tests?, (?P<assertions>\d+) assertions?\)")
+PHPUNIT_SUMMARY_RE = re.compile(r"^Tests: (?P<tests>\d+), Assertions: (?P<assertions>\d+)(?P<rest>.*?)\.?\s*$")
+COLLISION_SUMMARY_RE = re.compile(r"^\s*Tests:\s+(?P<counts>.+?)\s+\((?P<assertions>\d+) assertions?\)")
+COUNT_RE = re.compile(r"(?P<label>[A-Za-z]+): (?P<count>\d+)|(?P<count2>\d+) (?P<label2>[a-z]+)")
+
+MARKS = {
+    "✔": PASSED, "✓": PASSED,
+    "✘": FAILED, "⨯": FAILED, "x": FAILED,
+    "↩": SKIPPED, "-": SKIPPED, "∅": SKIPPED, "…": SKIPPED, "→": SKIPPED,
+    "☢": PASSED, "⚠": PASSED, "!": PASSED,
+}
+
+
+def method_name(pretty: str) -> str:
+    """Undo testdox/Collision prettifying for snake_case tests: 'Order status transitions' -> test_order_status_transitions"""
+    if pretty.startswith("test"):
+        return pretty
+    return "test_" + pretty.strip().lower().replace(" ", "_")
+
+
+class OutputParser:
+    """Incremental parser for artisan/PHPUnit output: feed() lines as they arrive, records come out live.
+
+    Only the per-test records and a bounded failure message per test are kept; the log itself is not.
+    """
+
+    def __init__(self, on_record=None, max_message_lines: int = 40):
+        self.on_record = on_record
+        self.max_message_lines = max_message_lines
+        self.records = {}
+        self.current_class = ""
+        self.collecting = None
+        self.summary = None
+
+    def feed(self, line: str):
+        line = line.rstrip("\n")
+        if self._summary(line):
+            self.collecting = None
+            return
+        match = TESTDOX_RESULT_RE.match(line) or COLLISION_RESULT_RE.match(line)
+        if match and self.current_class and match.group("mark") in MARKS:
+            seconds = match.groupdict().get("seconds")
+            record = self._record(method_name(match.group("name")))
+            record.status = MARKS[match.group("mark")]
+            record.duration = float(seconds) if seconds else record.duration
+            self.collecting = record if record.failed else None
+            if self.on_record is not None:
+                self.on_record(record)
+            return
+        match = COLLISION_FAILED_RE.match(line)
+        if match:
+            self.current_class = match.group("cls")
+            self.collecting = self._record(method_name(match.group("name")), failed=True)
+            return
+        match = LISTING_ITEM_RE.match(line)
+        if match:
+            self.current_class, _, name = match.group("name").rpartition("::")
+            self.collecting = self._record(name, failed=True)
+            return
+        match = TESTDOX_CLASS_RE.match(line)
+        if match:
+            # Testdox drops the Test suffix from the class name
+            cls = match.group("cls")
+            self.current_class = cls if cls.endswith("Test") else cls + "Test"
+            self.collecting = None
+            return
+        match = COLLISION_CLASS_RE.match(line)
+        if match:
+            self.current_class = match.group("cls")
+            self.collecting = None
+            return
+        if LISTING_END_RE.match(line):
+            self.collecting = None
+            return
+        if self.collecting is not None:
+            detail = TESTDOX_DETAIL_RE.match(line)
+            text = detail.group("text") if detail else line.strip()
+            if text.startswith("───"):
+                return
+            lines = self.collecting.message.split("\n") if self.collecting.message else []
+            if len(lines) < self.max_message_lines and (text or lines):
+                self.collecting.message = "\n".join(lines + [text])
+
+    def _record(self, name: str, failed: bool = False) -> TestRecord:
+        key = f"{self.current_class}::{name}"
+        record = self.records.get(key)
+        if record is None:
+            record = self.records[key] = TestRecord(name=key)
+        if failed and not record.failed:
+            record.status = FAILED
+        if failed:
+            record.message = ""  # The detailed failure block supersedes the inline one
+        return record
+
+    def _summary(self, line: str) -> bool:
+        match = OK_SUMMARY_RE.match(line)
+        if match:
+            self.summary = {"tests": int(match["tests"]), "assertions": int(match["assertions"]), "failures": 0,
+                            "errors": 0, "skipped": 0}
+            return True
+        match = PHPUNIT_SUMMARY_RE.match(line) or COLLISION_SUMMARY_RE.match(line)
+        if not match:
+            return False
+        counts = {"failures": 0, "errors": 0, "skipped": 0, "passed": 0}
+        for item in COUNT_RE.finditer(match.groupdict().get("rest") or match.groupdict().get("counts") or ""):
+            label = (item["label"] or item["label2"]).lower()
+            count = int(item["count"] or item["count2"])
+            label = {"failed": "failures", "failure": "failures", "error": "errors", "errored": "errors"}.get(label, label)
+            counts[label] = counts.get(label, 0) + count
+        tests = int(match["tests"]) if "tests" in match.groupdict() else sum(
+            counts.get(key, 0) for key in ("passed", "failures", "errors", "skipped", "risky", "incomplete", "warnings"))
+        self.summary = {"tests": tests, "assertions": int(match["assertions"]), "failures": counts["failures"],
+                        "errors": counts["errors"], "skipped": counts["skipped"]}
+        return True
+
+    def results(self) -> list:
+        for record in self.records.values():
+            record.message = record.message.rstrip()
+        return list(self.records.values())
+
+    @property
+    def success(self) -> bool:
+        """Passed only if a summary was seen, it ran tests, and nothing failed"""
+        if self.summary is None:
+            return False
+        return (self.summary["tests"] > 0 and not self.summary["failures"] and not self.summary["errors"]
+                and not any(record.failed for record in self.records.values()))
@@ -0,0 +1,284 @@
+#!/usr/bin/env python3
+"""
+Persistent test-runner session for the backend container.
+One `docker compose exec` starts backend/test_worker.php, which boots PHP and the autoloader once and then
+runs each requested filter in a forked child, so a test costs its own runtime instead of a full
+CLI/exec/PHP/Laravel startup. `--stand-in` serves the same protocol locally, without Docker or PHP.
+"""
+
+import sys
+import json
+import time
+import queue
+import argparse
+import threading
+from collections import deque
+import subprocess
+from pathlib import Path
+from xml.sax.saxutils import escape, quoteattr
+
+PROJECT_ROOT = Path(__file__).resolve().parent
+
+
+def worker_command(service: str = "backend") -> list:
+    """Command that starts the worker inside a compose service"""
+    return ["docker", "compose", "exec", "-T", service, "php", "test_worker.php"]
+
+
+def group_kill_command(command: list, info: dict) -> list:
+    """Command that kills a worker's process group inside its container (None for a local worker).
+
+    Killing the `docker compose exec` client alone leaves test_worker.php and its forked PHPUnit child running.
+    """
+    pgid = info.get("pgid")
+    if not pgid or command[:3] != ["docker", "compose", "exec"] or "php" not in command:
+        return None
+    return command[:command.index("php")] + ["php", "-r", f"posix_kill(-{int(pgid)}, 9);"]
+
+
+WORKER_COMMAND = worker_command()
+STAND_IN_COMMAND = [sys.executable, str(Path(__file__).resolve()), "--stand-in"]
+
+# The worker prefixes its own protocol lines with the ASCII record separator
+RESULT_PREFIX = "\x1e"
+
+STARTUP_TIMEOUT = 60
+KILL_TIMEOUT = 10
+
+# Only the tail of a run's output is kept; on_line callbacks (e.g. OutputParser.feed) see all of it
+OUTPUT_TAIL_LINES = 200
+
+
+class WorkerSessionError(Exception):
+    """Raised when the worker cannot be started or stops answering"""
+
+
+class WorkerSession:
+    """A long-lived worker that runs test filters on request and returns structured results"""
+
+    def __init__(self, command: list = WORKER_COMMAND, cwd: Path = PROJECT_ROOT):
+        self.command = list(command)
+        self.cwd = cwd
+        self.process = None
+        self.lines = None
+        self.next_id = 0
+        self.info = {}
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start(self):
+        """Launch the worker and wait for its ready line"""
+        if self.process is not None:
+            return
+        try:
+            self.process = subprocess.Popen(
+                self.command,
+                cwd=self.cwd,
+                stdin=subprocess.PIPE,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+            )
+        except OSError as e:
+            raise WorkerSessionError(f"Cannot start test worker: {e}")
+        self.lines = queue.Queue()
+        threading.Thread(target=self._pump, args=(self.process.stdout, self.lines), daemon=True).start()
+        startup = []
+        while True:
+            line = self._next_line(time.monotonic() + STARTUP_TIMEOUT)
+            if line.startswith(RESULT_PREFIX):
+                self.info = json.loads(line[1:])
+                return
+            startup.append(line)
+            if len(startup) > 200:
+                raise WorkerSessionError("Test worker did not report ready:\n" + "".join(startup[-20:]))
+
+    def run(self, test_filter: str, args: list = (), timeout: float = 120, on_line=None, junit: bool = False,
+            env: dict = None) -> dict:
+        """Run one filter in the worker; on_line(line) sees the output as it streams.
+
+        With junit=True the result also carries the run's JUnit XML report under "junit"; env is exported
+        to the test process.
+        """
+        self.start()
+        self.next_id += 1
+        request = {"id": self.next_id, "filter": test_filter, "args": list(args), "junit": junit, "env": env or {}}
+        try:
+            self.process.stdin.write(json.dumps(request) + "\n")
+            self.process.stdin.flush()
+        except OSError as e:
+            self.close()
+            raise WorkerSessionError(f"Test worker is gone: {e}")
+
+        deadline = time.monotonic() + timeout
+        output = deque(maxlen=OUTPUT_TAIL_LINES)
+        while True:
+            try:
+                line = self._next_line(deadline)
+            except WorkerSessionError:
+                # A hung test poisons the worker: drop it, the next run starts a fresh one
+                self.close(kill=True)
+                return {"filter": test_filter, "exit_code": None, "stdout": "".join(output), "stderr": "",
+                        "duration": timeout, "timed_out": True, "junit": None}
+            if line.startswith(RESULT_PREFIX):
+                result = json.loads(line[1:])
+                if result.get("id") != request["id"]:
+                    continue
+                if "error" in result:
+                    raise WorkerSessionError(f"Test worker error: {result['error']}")
+                return {"filter": test_filter, "exit_code": result["exit_code"], "stdout": "".join(output),
+                        "stderr": "", "duration": result["duration"], "timed_out": False,
+                        "junit": result.get("junit")}
+            output.append(line)
+            if on_line is not None:
+                on_line(line)
+
+    def close(self, kill: bool = False):
+        """Stop the worker"""
+        if self.process is None:
+            return
+        if kill:
+            self._kill_group()
+            self.process.kill()
+            self.process = None
+            return
+        try:
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except (OSError, subprocess.TimeoutExpired):
+            self.process.kill()
+        self.process = None
+
+    def _kill_group(self):
+        """Kill the worker and its forked child where they run, before dropping the exec client"""
+        command = group_kill_command(self.command, self.info)
+        if command is None:
+            return
+        try:
+            subprocess.run(command, cwd=self.cwd, capture_output=True, timeout=KILL_TIMEOUT)
+        except (OSError, subprocess.TimeoutExpired) as e:
+            print(f"⚠️  Could not kill test worker group {self.info['pgid']}: {e}", file=sys.stderr)
+
+    def _next_line(self, deadline: float) -> str:
+        remaining = deadline - time.monotonic()
+        try:
+            line = self.lines.get(timeout=max(remaining, 0))
+        except queue.Empty:
+            raise WorkerSessionError("Timed out waiting for the test worker")
+        if line is None:
+            code = self.process.wait() if self.process else None
+            self.process = None
+            raise WorkerSessionError(f"Test worker exited (code {code})")
+        return line
+
+    @staticmethod
+    def _pump(stream, lines: queue.Queue):
+        for line in stream:
+            lines.put(line)
+        lines.put(None)
+
+
+def run_streaming(command: list, timeout: float = 120, on_line=None, cwd: Path = PROJECT_ROOT) -> dict:
+    """Run a one-off command, handing each output line to on_line as it arrives and keeping only a tail"""
+    process = subprocess.Popen(command, cwd=cwd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True, bufsize=1)
+    stderr = deque(maxlen=OUTPUT_TAIL_LINES)
+    drain = threading.Thread(target=stderr.extend, args=(process.stderr,), daemon=True)
+    drain.start()
+    timer = threading.Timer(timeout, process.kill)
+    timer.start()
+    output = deque(maxlen=OUTPUT_TAIL_LINES)
+    started = time.monotonic()
+    try:
+        for line in process.stdout:
+            output.append(line)
+            if on_line is not None:
+                on_line(line)
+        exit_code = process.wait()
+    finally:
+        timed_out = not timer.is_alive()
+        timer.cancel()
+        drain.join(timeout=5)
+    return {"exit_code": None if timed_out else exit_code, "stdout": "".join(output), "stderr": "".join(stderr),
+            "duration": time.monotonic() - started, "timed_out": timed_out}
+
+
+def stand_in_worker(results_path: Path = None):
+    """Serve the worker protocol locally: canned PHPUnit output keyed by filter substring.
+
+    The results file maps a filter substring to {"exit_code": int, "output": str, "duration": float,
+    "junit": str}; filters with no entry pass. Without canned JUnit, a one-test report is synthesized.
+    """
+    canned = json.loads(results_path.read_text()) if results_path else {}
+
+    def respond(payload):
+        sys.stdout.write(RESULT_PREFIX + json.dumps(payload) + "\n")
+        sys.stdout.flush()
+
+    respond({"ready": True, "pid": None, "php": "stand-in"})
+    for line in sys.stdin:
+        try:
+            request = json.loads(line)
+        except ValueError:
+            respond({"id": None, "error": "Malformed request"})
+            continue
+        test_filter = request.get("filter") or ""
+        entry = next((value for key, value in canned.items() if key in test_filter), None)
+        if entry is None:
+            entry = {"exit_code": 0, "output": "PHPUnit stand-in\n\n.  1 / 1 (100%)\n\nOK (1 test, 1 assertion)\n"}
+        time.sleep(entry.get("duration", 0))
+        sys.stdout.write(entry["output"])
+        junit = entry.get("junit") or stand_in_junit(test_filter, entry) if request.get("junit") else None
+        respond({"id": request["id"], "exit_code": entry["exit_code"], "duration": entry.get("duration", 0),
+                 "junit": junit})
+
+
+def stand_in_junit(test_filter: str, entry: dict) -> str:
+    """Minimal JUnit report for a canned stand-in result"""
+    failure = ""
+    if entry["exit_code"] != 0:
+        failure = f'<failure type="PHPUnit\\Framework\\AssertionFailedError">{escape(entry["output"])}</failure>'
+    classname, _, name = test_filter.rpartition("::")
+    return (f'<?xml version="1.0" encoding="UTF-8"?>\n<testsuites><testsuite name="stand-in">'
+            f'<testcase name={quoteattr(name)} class={quoteattr(classname)} assertions="1" '
+            f'time="{entry.get("duration", 0)}">{failure}</testcase></testsuite></testsuites>\n')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run test filters through one persistent backend worker")
+    parser.add_argument("filters", nargs="*", help="PHPUnit --filter expressions, run in order")
+    parser.add_argument("--local", action="store_true", help="Use the local stand-in worker instead of Docker")
+    parser.add_argument("--stand-in", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--results", type=Path, help="Canned results for the stand-in worker (JSON)")
+    parser.add_argument("--timeout", type=float, default=120, help="Per-filter timeout in seconds")
+    args = parser.parse_args()
+
+    if args.stand_in:
+        stand_in_worker(args.results)
+        return
+
+    command = STAND_IN_COMMAND + (["--results", str(args.results)] if args.results else []) if args.local else WORKER_COMMAND
+    failed = False
+    try:
+        with WorkerSession(command) as session:
+            for test_filter in args.filters:
+                result = session.run(test_filter, timeout=args.timeout, on_line=lambda line: print(f"  {line}", end=""))
+                if result["timed_out"]:
+                    status = f"⏱️  timed out after {args.timeout:.0f}s"
+                else:
+                    status = "✅ passed" if result["exit_code"] == 0 else f"❌ failed (exit {result['exit_code']})"
+                failed = failed or result["exit_code"] != 0
+                print(f"{status}: {test_filter} ({result['duration']:.2f}s)")
+    except WorkerSessionError as e:
+        print(f"❌ ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
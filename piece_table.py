@@ -0,0 +1,143 @@
+"""
+Piece-table text document for section edits.
+The original text is never copied: the document is a list of pieces, each a (source, start, end) view of
+either the original or an inserted string, so a splice only touches the piece list. Integrity checks compare
+piece offsets and digests instead of searching the text, and text() materializes the result once.
+"""
+
+import hashlib
+from bisect import bisect_right
+from dataclasses import dataclass
+
+
+class PieceTableError(Exception):
+    """A splice is out of range or the document no longer matches what was spliced"""
+
+
+@dataclass(frozen=True)
+class Piece:
+    source: str
+    start: int
+    end: int
+    original: bool = False  # A view of the original text (identity checks would break on interned strings)
+
+    def __len__(self):
+        return self.end - self.start
+
+    def text(self) -> str:
+        return self.source[self.start:self.end]
+
+
+@dataclass(frozen=True)
+class Splice:
+    """Record of one splice, in document coordinates after it was applied"""
+    start: int
+    removed: int
+    length: int
+    digest: str
+
+
+class PieceTable:
+    """Original text plus splices, materialized on demand"""
+
+    def __init__(self, original: str):
+        self.original = original
+        self.pieces = [Piece(original, 0, len(original), True)] if original else []
+        self.offsets = [0] if original else []  # Document offset of each piece
+        self.length = len(original)
+        self.splices = []
+        self._text = original
+
+    def __len__(self):
+        return self.length
+
+    def splice(self, start: int, end: int, text: str) -> Splice:
+        """Replace document[start:end] with text"""
+        if not 0 <= start <= end <= self.length:
+            raise PieceTableError(f"Splice {start}:{end} outside document of length {self.length}")
+        first = self._split(start)
+        last = self._split(end)
+        self.pieces[first:last] = [Piece(text, 0, len(text))] if text else []
+        self._reindex(first)
+        record = Splice(start, end - start, len(text), hashlib.sha256(text.encode()).hexdigest())
+        self.splices.append(record)
+        self._text = None
+        return record
+
+    def _split(self, offset: int) -> int:
+        """Make offset a piece boundary; returns the index of the piece starting there"""
+        if offset >= self.length:
+            return len(self.pieces)
+        i = bisect_right(self.offsets, offset) - 1
+        if self.offsets[i] == offset:
+            return i
+        piece = self.pieces[i]
+        cut = piece.start + offset - self.offsets[i]
+        self.pieces[i:i + 1] = [Piece(piece.source, piece.start, cut, piece.original),
+                                Piece(piece.source, cut, piece.end, piece.original)]
+        self.offsets.insert(i + 1, offset)
+        return i + 1
+
+    def _reindex(self, first: int):
+        del self.offsets[first:]
+        offset = 0 if first == 0 else self.offsets[first - 1] + len(self.pieces[first - 1])
+        for piece in self.pieces[first:]:
+            self.offsets.append(offset)
+            offset += len(piece)
+        self.length = offset
+
+    def span(self, start: int, end: int) -> list:
+        """Pieces covering document[start:end], trimmed to it"""
+        pieces = []
+        i = max(bisect_right(self.offsets, start) - 1, 0)
+        while i < len(self.pieces) and self.offsets[i] < end:
+            piece, offset = self.pieces[i], self.offsets[i]
+            lo = piece.start + max(start - offset, 0)
+            hi = piece.start + min(end - offset, len(piece))
+            if hi > lo:
+                pieces.append(Piece(piece.source, lo, hi, piece.original))
+            i += 1
+        return pieces
+
+    def maps_to_original(self, start: int, end: int, original_start: int) -> bool:
+        """Whether document[start:end] is original[original_start:...] unchanged, by offsets alone"""
+        expected = original_start
+        for piece in self.span(start, end):
+            if not piece.original or piece.start != expected:
+                return False
+            expected = piece.end
+        return expected - original_start == end - start
+
+    def verify_splice(self, record: Splice, original_start: int, original_end: int):
+        """Check one splice against the original: prefix and suffix intact, inserted text as recorded.
+
+        Valid for a document holding this single splice of original[original_start:original_end].
+        """
+        inserted_end = record.start + record.length
+        if not self.maps_to_original(0, record.start, 0):
+            raise PieceTableError("Document prefix corrupted")
+        if self.length - inserted_end != len(self.original) - original_end or \
+                not self.maps_to_original(inserted_end, self.length, original_end):
+            raise PieceTableError("Document suffix corrupted")
+        digest = hashlib.sha256()
+        for piece in self.span(record.start, inserted_end):
+            digest.update(piece.text().encode())
+        if digest.hexdigest() != record.digest:
+            raise PieceTableError("New content not found in updated document")
+
+    def startswith(self, text: str, offset: int) -> bool:
+        """Compare text at offset without materializing the document"""
+        if offset + len(text) > self.length:
+            return False
+        position = 0
+        for piece in self.span(offset, offset + len(text)):
+            if piece.text() != text[position:position + len(piece)]:
+                return False
+            position += len(piece)
+        return True
+
+    def text(self) -> str:
+        """The document as one string, built once per set of splices"""
+        if self._text is None:
+            self._text = "".join(piece.text() for piece in self.pieces)
+        return self._text
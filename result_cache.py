@@ -0,0 +1,150 @@
+"""
+Content-addressed cache of test results.
+A test's key hashes its own source (method body plus the rest of its class), the content of every file in
+its dependency closure from impact_index, and a fingerprint of the environment it ran in (composer.lock,
+PHPUnit and Laravel configuration, migrations, the worker command). A cached pass is reused until one of
+those changes; failures are never cached, so a failing test always re-runs.
+"""
+
+import re
+import sys
+import json
+import time
+import hashlib
+from pathlib import Path
+
+from impact_index import BACKEND_ROOT, test_filters
+from patch_spec import CACHE_ROOT
+from phpunit_results import PASSED, SKIPPED, TestRecord
+
+RESULT_CACHE_PATH = CACHE_ROOT / "results" / "results.json"
+
+# Files and directories (relative to backend/) whose content changes what every test does
+ENV_FILES = ("composer.lock", "phpunit.xml", "phpunit.xml.dist", ".env.testing", "bootstrap/app.php", "test_worker.php")
+ENV_DIRS = ("config", "database/migrations", "database/factories", "database/seeders")
+
+CACHEABLE = (PASSED, SKIPPED)
+DATA_SET_RE = re.compile(r" with data set .*$")
+
+
+def environment_fingerprint(command: list, root: Path = BACKEND_ROOT) -> str:
+    """Hash of the configuration every test depends on, plus the command the tests run under"""
+    digest = hashlib.sha256(json.dumps(list(command)).encode())
+    paths = [root / name for name in ENV_FILES]
+    for name in ENV_DIRS:
+        if (root / name).is_dir():
+            paths.extend(sorted((root / name).rglob("*.php")))
+    for path in paths:
+        if path.is_file():
+            digest.update(path.relative_to(root).as_posix().encode() + b"\0")
+            digest.update(hashlib.sha256(path.read_bytes()).digest())
+    return digest.hexdigest()
+
+
+def result_digest(key: str, impact, fingerprint: str) -> str:
+    """Cache key of one test (ShortClass::method), or None when the index does not know it"""
+    rel = impact.tests.get(key)
+    if rel is None:
+        return None
+    facts = impact.facts[rel]
+    digest = hashlib.sha256(f"{key}\0{fingerprint}\0".encode())
+    digest.update(facts.methods[key.partition("::")[2]]["hash"].encode())
+    digest.update(facts.shared_hash.encode())
+    for dep in sorted(impact.closures.get(key, ())):
+        if dep != rel:
+            digest.update(f"{dep}\0{impact.digests.get(dep, '')}\0".encode())
+    return digest.hexdigest()
+
+
+def record_key(name: str) -> str:
+    """Index key (ShortClass::method) of a record named Tests\\Api\\XTest::test_y [with data set ...]"""
+    cls, _, method = name.rpartition("::")
+    return f"{cls.rsplit(chr(92), 1)[-1]}::{DATA_SET_RE.sub('', method)}"
+
+
+class ResultCache:
+    """Latest cacheable outcome per test, valid while the test's digest is unchanged"""
+
+    def __init__(self, path: Path = RESULT_CACHE_PATH):
+        self.path = path
+        self.entries = {}
+        self.dirty = False
+        try:
+            self.entries = json.loads(path.read_text())
+        except (OSError, ValueError):
+            pass  # No cache yet, or unreadable - start empty
+
+    def lookup(self, key: str, digest: str) -> list:
+        """Cached records of every data set of the method, or None"""
+        entry = self.entries.get(key)
+        if digest is None or entry is None or entry["digest"] != digest or "records" not in entry:
+            return None
+        return [TestRecord(**record) for record in entry["records"]]
+
+    def store_run(self, records: list, digests: dict):
+        """Store one run's records; a method is cached only if every one of its data sets passed"""
+        by_key = {}
+        for record in records:
+            by_key.setdefault(record_key(record.name), []).append(record)
+        for key, method_records in by_key.items():
+            self.store(key, method_records, digests.get(key))
+
+    def store(self, key: str, records: list, digest: str):
+        if digest is None:
+            return
+        if any(record.status not in CACHEABLE for record in records):
+            # A failure drops any earlier pass for this test
+            if self.entries.pop(key, None) is not None:
+                self.dirty = True
+            return
+        self.entries[key] = {"digest": digest, "records": [record.as_dict() for record in records], "cached_at": time.time()}
+        self.dirty = True
+
+    def save(self):
+        if not self.dirty:
+            return
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            temp_file = self.path.with_suffix(".tmp")
+            temp_file.write_text(json.dumps(self.entries))
+            temp_file.replace(self.path)
+            self.dirty = False
+        except OSError as e:
+            print(f"⚠️  Test result cache write failed: {e}", file=sys.stderr)
+
+
+def tests_for_target(target: str, impact) -> set:
+    """Index keys a shard target selects: test files by path, filters by regex search on the key"""
+    if "/" in target or target.endswith(".php"):
+        path = target if target.endswith(".php") else f"{target}.php"
+        path = path if path.startswith("tests/") else f"tests/{path}"
+        return {key for key, rel in impact.tests.items() if rel == path}
+    try:
+        pattern = re.compile(target)
+    except re.error:
+        return set()
+    return {key for key in impact.tests if pattern.search(key)}
+
+
+def split_cached(targets: list, impact, cache: ResultCache, fingerprint: str) -> (list, list, dict):
+    """Targets still to run, records served from the cache, and the digest of every test that will run.
+
+    Targets the index cannot resolve run unchanged; the rest are narrowed to their uncached tests.
+    """
+    remaining, cached, digests = [], {}, {}
+    pending = set()
+    for target in targets:
+        keys = tests_for_target(target, impact)
+        if not keys:
+            remaining.append(target)
+            continue
+        for key in keys:
+            digest = result_digest(key, impact, fingerprint)
+            records = cache.lookup(key, digest)
+            if records is not None:
+                cached[key] = records
+            else:
+                pending.add(key)
+                digests[key] = digest
+    remaining.extend(test_filters(pending, impact))
+    return remaining, [record for records in cached.values() for record in records], digests
@@ -0,0 +1,131 @@
+"""
+Persistent, content-hash keyed cache of parsed route indexes and their verification results.
+An unchanged routes file is never re-parsed: its stat signature (mtime + size) maps straight to the cached entry.
+"""
+
+import sys
+import json
+import pickle
+import hashlib
+from pathlib import Path
+
+from patch_spec import CACHE_ROOT
+from route_index import build_route_index, reindex_after_edit, verify_route_index
+
+ROUTE_CACHE_DIR = CACHE_ROOT / "routes"
+
+# Bump when RouteIndex or the structural checks change so stale entries are ignored
+ROUTE_CACHE_VERSION = 2
+
+
+def content_digest(data: bytes) -> str:
+    """Cache key for one version of a routes file"""
+    return hashlib.sha256(data + f"|routes-v{ROUTE_CACHE_VERSION}".encode()).hexdigest()
+
+
+def load_route_index(path: Path, cache_dir: Path = ROUTE_CACHE_DIR) -> (object, list):
+    """Return (index, errors) for a routes file, using mtime as a fast pre-check before hashing"""
+    path = Path(path).resolve()
+    stat = path.stat()
+    signatures = _read_signatures(cache_dir)
+    known = signatures.get(str(path))
+    # Signatures point at digests; one recorded under another cache version must not bypass the version bump
+    if (known and known.get("version") == ROUTE_CACHE_VERSION and known["mtime_ns"] == stat.st_mtime_ns
+            and known["size"] == stat.st_size):
+        entry = _read_entry(cache_dir, known["digest"])
+        if entry is not None:
+            return entry
+
+    data = path.read_bytes()
+    digest = content_digest(data)
+    entry = _read_entry(cache_dir, digest)
+    if entry is None:
+        index = build_route_index(data)
+        entry = (index, verify_route_index(index))
+        _write_entry(cache_dir, digest, entry)
+    remember_signature(path, digest, cache_dir, stat)
+    return entry
+
+
+def route_index_for_content(data: bytes, cache_dir: Path = ROUTE_CACHE_DIR) -> (object, list):
+    """Return (index, errors) for in-memory content, keyed by content hash only"""
+    digest = content_digest(data)
+    entry = _read_entry(cache_dir, digest)
+    if entry is None:
+        index = build_route_index(data)
+        entry = (index, verify_route_index(index))
+        _write_entry(cache_dir, digest, entry)
+    return entry
+
+
+def remember_signature(path: Path, digest: str, cache_dir: Path = ROUTE_CACHE_DIR, stat=None):
+    """Record which cache entry the file's current stat signature corresponds to"""
+    try:
+        stat = stat or path.stat()
+        signatures = _read_signatures(cache_dir)
+        signatures[str(path)] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "digest": digest,
+                                 "version": ROUTE_CACHE_VERSION}
+        _atomic_write(cache_dir / "signatures.json", json.dumps(signatures, indent=2).encode())
+    except OSError as e:
+        print(f"⚠️  Route cache signature update failed: {e}", file=sys.stderr)
+
+
+class RouteStructureChecker:
+    """Verifies successive versions of one routes file, re-parsing only what each edit changed"""
+
+    def __init__(self, path: Path = None, cache_dir: Path = ROUTE_CACHE_DIR):
+        self.path = path
+        self.cache_dir = cache_dir
+        self.data = None
+        self.index = None
+        self.errors = []
+
+    def check(self, content) -> list:
+        """Verify a version of the file, incrementally when a previous version was checked"""
+        data = content.encode() if isinstance(content, str) else content
+        if self.data is None:
+            self.index, self.errors = route_index_for_content(data, self.cache_dir)
+        elif data != self.data:
+            self.index = reindex_after_edit(self.index, self.data, data)
+            self.errors = verify_route_index(self.index)
+        self.data = data
+        return self.errors
+
+    def save(self):
+        """Persist the last verified version so the next run skips parsing it"""
+        if self.data is None:
+            return
+        digest = content_digest(self.data)
+        if _read_entry(self.cache_dir, digest) is None:
+            _write_entry(self.cache_dir, digest, (self.index, self.errors))
+        if self.path is not None and self.path.exists() and self.path.stat().st_size == len(self.data):
+            remember_signature(Path(self.path).resolve(), digest, self.cache_dir)
+
+
+def _read_signatures(cache_dir: Path) -> dict:
+    try:
+        return json.loads((cache_dir / "signatures.json").read_text())
+    except (OSError, ValueError):
+        return {}
+
+
+def _read_entry(cache_dir: Path, digest: str):
+    try:
+        with (cache_dir / f"{digest}.pickle").open("rb") as f:
+            return pickle.load(f)
+    except Exception:
+        return None  # Corrupt or incompatible entry - caller re-parses
+
+
+def _write_entry(cache_dir: Path, digest: str, entry: tuple):
+    try:
+        _atomic_write(cache_dir / f"{digest}.pickle", pickle.dumps(entry, protocol=pickle.HIGHEST_PROTOCOL))
+    except OSError as e:
+        print(f"⚠️  Route cache write failed: {e}", file=sys.stderr)
+
+
+def _atomic_write(path: Path, data: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    temp_file = path.with_suffix(path.suffix + ".tmp")
+    temp_file.write_bytes(data)
+    temp_file.replace(path)
@@ -0,0 +1,507 @@
+"""
+Single-pass route table indexer for backend/routes/api.php.
+Tokenizes the routes file once and builds an index of routes and route groups with their byte offsets,
+so structural checks run against the index instead of rescanning the file.
+"""
+
+import re
+from dataclasses import dataclass, field
+
+ROUTE_METHODS = {
+    "get": "GET",
+    "post": "POST",
+    "put": "PUT",
+    "patch": "PATCH",
+    "delete": "DELETE",
+    "options": "OPTIONS",
+    "any": "ANY",
+    "match": "MATCH",
+    "apiResource": "RESOURCE",
+    "resource": "RESOURCE",
+}
+
+VERSION_PREFIX_RE = re.compile(rb"v\d+")
+
+# One alternation, one pass: comments and whitespace are skipped, everything else becomes a token
+TOKEN_RE = re.compile(rb"""
+    (?P<skip>\s+|//[^\n]*|\#(?!\[)[^\n]*|/\*.*?(?:\*/|\Z))
+  | (?P<string>'(?:[^'\\]|\\.)*'|"(?:[^"\\]|\\.)*")
+  | (?P<arrow>->)
+  | (?P<dcolon>::)
+  | (?P<fatarrow>=>)
+  | (?P<ident>[A-Za-z_\\][A-Za-z0-9_\\]*)
+  | (?P<punct>[()\[\]{},;])
+  | (?P<other>.)
+""", re.DOTALL | re.VERBOSE)
+
+
+@dataclass
+class RouteGroup:
+    """A Route::...->group(function () { ... }) block"""
+    id: int
+    prefix: str = None
+    middleware: tuple = ()
+    parent: int = None
+    depth: int = 0
+    start: int = 0
+    end: int = None
+    body_start: int = 0
+    body_end: int = None
+
+
+@dataclass
+class RouteEntry:
+    """A single route registration"""
+    method: str
+    uri: str
+    controller: str = None
+    action: str = None
+    middleware: tuple = ()
+    groups: tuple = ()
+    start: int = 0
+    end: int = 0
+
+
+@dataclass
+class RouteIndex:
+    """Every route and group in a routes file, in source order"""
+    size: int = 0
+    routes: list = field(default_factory=list)
+    groups: list = field(default_factory=list)
+
+    def effective_middleware(self, route: RouteEntry) -> tuple:
+        """Group middleware (outermost first) followed by the route's own middleware"""
+        chain = []
+        for group_id in route.groups:
+            chain.extend(self.groups[group_id].middleware)
+        chain.extend(route.middleware)
+        return tuple(chain)
+
+    def full_uri(self, route: RouteEntry) -> str:
+        """The route URI with every enclosing group prefix applied"""
+        parts = [self.groups[g].prefix for g in route.groups if self.groups[g].prefix]
+        parts.append(route.uri)
+        return "/".join(p.strip("/") for p in parts if p.strip("/"))
+
+
+@dataclass
+class ClassRef:
+    """A Foo::class argument"""
+    name: str
+
+
+@dataclass
+class Closure:
+    """A function () { ... } argument"""
+    start: int
+    end: int
+
+
+def tokenize(data: bytes, start: int = 0, end: int = None) -> list:
+    """Tokenize data[start:end] into (kind, text, start, end) tuples, skipping whitespace and comments"""
+    end = len(data) if end is None else end
+    return [
+        (m.lastgroup, m.group(), m.start(), m.end())
+        for m in TOKEN_RE.finditer(data, start, end)
+        if m.lastgroup != "skip"
+    ]
+
+
+def build_route_index(content) -> RouteIndex:
+    """Build the route index for a routes file in a single pass"""
+    data = content.encode() if isinstance(content, str) else content
+    index = RouteIndex(size=len(data))
+    parser = _Parser(tokenize(data), index)
+    parser.parse_statements(0, None, 0)
+    return index
+
+
+class _Parser:
+    """Recursive-descent parser over the token list; every token is visited once"""
+
+    def __init__(self, tokens: list, index: RouteIndex, group_stack: tuple = (), next_id: int = 0):
+        self.tokens = tokens
+        self.index = index
+        self.group_stack = list(group_stack)
+        self.next_id = next_id
+
+    def peek(self, i: int, kind: str, text: bytes = None) -> bool:
+        if i >= len(self.tokens):
+            return False
+        token = self.tokens[i]
+        return token[0] == kind and (text is None or token[1] == text)
+
+    def parse_statements(self, i: int, closing: bool, depth: int) -> int:
+        """Parse statements until the closing brace of the current block (or end of input)"""
+        nested = 0
+        while i < len(self.tokens):
+            kind, text, _, _ = self.tokens[i]
+            if kind == "ident" and text == b"Route" and self.peek(i + 1, "dcolon"):
+                i = self.parse_chain(i, depth)
+            elif kind == "punct" and text == b"{":
+                nested += 1
+                i += 1
+            elif kind == "punct" and text == b"}":
+                if nested == 0 and closing:
+                    return i
+                nested = max(0, nested - 1)
+                i += 1
+            else:
+                i += 1
+        return i
+
+    def parse_chain(self, i: int, depth: int) -> int:
+        """Parse Route::a(...)->b(...)->...; and record it as a route or group"""
+        start = self.tokens[i][2]
+        i += 2
+        calls = []
+        group = None
+        while self.peek(i, "ident") and self.peek(i + 1, "punct", b"("):
+            name = self.tokens[i][1].decode()
+            if name == "group":
+                group = self.open_group(start, depth)
+            args, i = self.parse_args(i + 1, group if name == "group" else None, depth)
+            calls.append((name, args))
+            if not self.peek(i, "arrow"):
+                break
+            i += 1
+        end = self.tokens[i - 1][3] if i > 0 else start
+        if self.peek(i, "punct", b";"):
+            end = self.tokens[i][3]
+            i += 1
+
+        if group is not None:
+            self.close_group(group, calls, end)
+        elif calls and calls[0][0] in ROUTE_METHODS:
+            self.add_route(calls, start, end)
+        return i
+
+    def parse_args(self, i: int, group: RouteGroup, depth: int) -> (list, int):
+        """Parse a parenthesised argument list starting at '('"""
+        i += 1
+        args = []
+        while i < len(self.tokens) and not self.peek(i, "punct", b")"):
+            if self.peek(i, "punct", b","):
+                i += 1
+                continue
+            value, i = self.parse_value(i, group, depth)
+            args.append(value)
+        return args, min(i + 1, len(self.tokens))
+
+    def parse_value(self, i: int, group: RouteGroup, depth: int):
+        """Parse a single argument value; anything not understood is skipped as opaque"""
+        kind, text, _, _ = self.tokens[i]
+        if kind == "string":
+            return _unquote(text), i + 1
+        if kind == "punct" and text == b"[":
+            return self.parse_array(i, depth)
+        if kind == "ident" and text in (b"function", b"fn"):
+            return self.parse_closure(i, group, depth)
+        if kind == "ident" and self.peek(i + 1, "dcolon") and self.peek(i + 2, "ident", b"class"):
+            return ClassRef(text.decode().rsplit("\\", 1)[-1]), i + 3
+        # Opaque expression: skip to the next top-level ',' or ')' / ']'
+        start_i = i
+        balance = 0
+        while i < len(self.tokens):
+            kind, text, _, _ = self.tokens[i]
+            if kind == "punct":
+                if text in (b"(", b"[", b"{"):
+                    balance += 1
+                elif text in (b")", b"]", b"}"):
+                    if balance == 0:
+                        break
+                    balance -= 1
+                elif text == b"," and balance == 0:
+                    break
+            i += 1
+        if i == start_i:
+            i += 1  # Stray closer in malformed input - step over it
+        return None, i
+
+    def parse_array(self, i: int, depth: int) -> (list, int):
+        """Parse [a, b, ...]; keyed entries keep only their value"""
+        i += 1
+        items = []
+        while i < len(self.tokens) and not self.peek(i, "punct", b"]"):
+            if self.peek(i, "punct", b",") or self.peek(i, "fatarrow"):
+                if self.peek(i, "fatarrow") and items:
+                    items.pop()
+                i += 1
+                continue
+            value, i = self.parse_value(i, None, depth)
+            items.append(value)
+        return items, min(i + 1, len(self.tokens))
+
+    def parse_closure(self, i: int, group: RouteGroup, depth: int) -> (Closure, int):
+        """Skip a closure header; group closures have their body parsed as nested statements"""
+        start = self.tokens[i][2]
+        while i < len(self.tokens) and not self.peek(i, "punct", b"{"):
+            i += 1
+        if i >= len(self.tokens):
+            return Closure(start, self.index.size), i
+        if group is not None:
+            group.body_start = self.tokens[i][3]
+            self.group_stack.append(group.id)
+            i = self.parse_statements(i + 1, True, depth + 1)
+            self.group_stack.pop()
+        else:
+            balance = 0
+            while i < len(self.tokens):
+                if self.peek(i, "punct", b"{"):
+                    balance += 1
+                elif self.peek(i, "punct", b"}"):
+                    balance -= 1
+                    if balance == 0:
+                        break
+                i += 1
+        if i >= len(self.tokens):
+            return Closure(start, self.index.size), i
+        if group is not None:
+            group.body_end = self.tokens[i][2]
+        return Closure(start, self.tokens[i][3]), i + 1
+
+    def open_group(self, start: int, depth: int) -> RouteGroup:
+        """Register a group as soon as its ->group( is seen so nested routes can reference it"""
+        group = RouteGroup(
+            id=self.next_id,
+            parent=self.group_stack[-1] if self.group_stack else None,
+            depth=depth,
+            start=start,
+        )
+        self.index.groups.append(group)
+        self.next_id += 1
+        return group
+
+    def close_group(self, group: RouteGroup, calls: list, end: int):
+        """Apply the prefix and middleware from the whole chain, before and after ->group()"""
+        middleware = []
+        for name, args in calls:
+            if name == "prefix" and args and isinstance(args[0], str):
+                group.prefix = args[0]
+            elif name == "middleware":
+                middleware.extend(_names(args))
+        group.middleware = tuple(middleware)
+        group.end = end if group.body_end is not None else None
+
+    def add_route(self, calls: list, start: int, end: int):
+        """Record a route registration from its call chain"""
+        name, args = calls[0]
+        method = ROUTE_METHODS[name]
+        if name == "match" and args and isinstance(args[0], list):
+            method = "|".join(str(m).upper() for m in args[0])
+            args = args[1:]
+
+        uri = args[0] if args and isinstance(args[0], str) else ""
+        controller = action = None
+        if len(args) > 1:
+            target = args[1]
+            if isinstance(target, list) and target and isinstance(target[0], ClassRef):
+                controller = target[0].name
+                action = target[1] if len(target) > 1 and isinstance(target[1], str) else None
+            elif isinstance(target, ClassRef):
+                controller = target.name
+                if len(args) > 2 and isinstance(args[2], str):
+                    action = args[2]
+            elif isinstance(target, str) and "@" in target:
+                controller, action = target.split("@", 1)
+
+        middleware = []
+        for call_name, call_args in calls[1:]:
+            if call_name == "middleware":
+                middleware.extend(_names(call_args))
+
+        self.index.routes.append(RouteEntry(
+            method=method,
+            uri=uri,
+            controller=controller,
+            action=action,
+            middleware=tuple(middleware),
+            groups=tuple(self.group_stack),
+            start=start,
+            end=end,
+        ))
+
+
+def changed_span(old: bytes, new: bytes) -> (int, int, int):
+    """Return (start, old_end, new_end) of the region that differs between two versions"""
+    limit = min(len(old), len(new))
+    lo, hi = 0, limit
+    while lo < hi:  # Longest common prefix by bisection, each probe a C-level slice compare
+        mid = (lo + hi + 1) // 2
+        if old[:mid] == new[:mid]:
+            lo = mid
+        else:
+            hi = mid - 1
+    prefix = lo
+    lo, hi = 0, limit - prefix
+    while lo < hi:
+        mid = (lo + hi + 1) // 2
+        if old[len(old) - mid:] == new[len(new) - mid:]:
+            lo = mid
+        else:
+            hi = mid - 1
+    return prefix, len(old) - lo, len(new) - lo
+
+
+def reindex_after_edit(index: RouteIndex, old: bytes, new: bytes) -> RouteIndex:
+    """Update an index after an edit, re-parsing only the innermost group whose body contains the change"""
+    start, old_end, new_end = changed_span(old, new)
+    if start == old_end == new_end:
+        return index
+    delta = new_end - old_end
+
+    # Innermost closed group whose body strictly contains the changed range
+    target = None
+    for group in index.groups:
+        if group.body_end is not None and group.body_start <= start and old_end <= group.body_end:
+            if target is None or group.depth > target.depth:
+                target = group
+    if target is None:
+        return build_route_index(new)
+
+    body_end = target.body_end + delta
+    tokens = tokenize(new, target.body_start, body_end)
+    if not _is_self_contained(new, tokens, target.body_start, body_end):
+        return build_route_index(new)
+
+    def shift(offset):
+        return offset + delta if offset is not None and offset >= old_end else offset
+
+    descendants = set()
+    for group in index.groups:  # Parents always precede their children
+        if group.parent == target.id or group.parent in descendants:
+            descendants.add(group.id)
+
+    groups = []
+    for group in index.groups:
+        if group.id in descendants:
+            continue
+        groups.append(RouteGroup(
+            id=group.id, prefix=group.prefix, middleware=group.middleware, parent=group.parent,
+            depth=group.depth, start=shift(group.start), end=shift(group.end),
+            body_start=shift(group.body_start), body_end=shift(group.body_end),
+        ))
+    routes = [
+        RouteEntry(
+            method=r.method, uri=r.uri, controller=r.controller, action=r.action, middleware=r.middleware,
+            groups=r.groups, start=shift(r.start), end=shift(r.end),
+        )
+        for r in index.routes
+        if target.id not in r.groups
+    ]
+
+    # Parse the new body with the target's ancestry as the enclosing group stack
+    ancestry = []
+    group = target
+    while group is not None:
+        ancestry.append(group.id)
+        group = index.groups[group.parent] if group.parent is not None else None
+    scratch = RouteIndex(size=len(new))
+    parser = _Parser(tokens, scratch, group_stack=reversed(ancestry), next_id=len(index.groups))
+    parser.parse_statements(0, None, target.depth + 1)
+
+    # Merge in source order and renumber so ids match what a full parse would assign
+    groups.extend(scratch.groups)
+    groups.sort(key=lambda g: g.start)
+    routes.extend(scratch.routes)
+    routes.sort(key=lambda r: r.start)
+    renumber = {g.id: i for i, g in enumerate(groups)}
+    for group in groups:
+        group.id = renumber[group.id]
+        group.parent = renumber[group.parent] if group.parent is not None else None
+    for route in routes:
+        route.groups = tuple(renumber[g] for g in route.groups)
+
+    return RouteIndex(size=len(new), routes=routes, groups=groups)
+
+
+OPENERS = {b"{": b"}", b"(": b")", b"[": b"]"}
+CLOSERS = set(OPENERS.values())
+
+
+def _is_self_contained(data: bytes, tokens: list, start: int, end: int) -> bool:
+    """Whether a region tokenizes and nests the same on its own as inside the whole file"""
+    stack = []
+    for kind, text, _, _ in tokens:
+        if kind == "punct" and text in OPENERS:
+            stack.append(OPENERS[text])
+        elif kind == "punct" and text in CLOSERS:
+            # A closer the region did not open (or closes out of order) belongs to the enclosing code
+            if not stack or stack.pop() != text:
+                return False
+        elif kind == "other" and text in (b"'", b'"'):
+            return False  # Unterminated string runs past the region
+    if stack:
+        return False
+    # A comment on the closing line, or an unterminated /* comment, would swallow the closing brace
+    last_comment = data.rfind(b"/*", start, end)
+    if last_comment != -1 and data.find(b"*/", last_comment + 2, end) == -1:
+        return False
+    closing_line = data[data.rfind(b"\n", start, end) + 1:end]
+    return b"//" not in closing_line and b"#" not in closing_line
+
+
+def _unquote(token: bytes) -> str:
+    """Strip PHP string quotes and undo single-quote escapes"""
+    body = token[1:-1].decode()
+    if token[:1] == b"'":
+        body = body.replace("\\'", "'").replace("\\\\", "\\")
+    return body
+
+
+def _names(args: list) -> list:
+    """Flatten middleware('a') / middleware(['a', 'b']) arguments into names"""
+    names = []
+    for arg in args:
+        if isinstance(arg, str):
+            names.append(arg)
+        elif isinstance(arg, list):
+            names.extend(a for a in arg if isinstance(a, str))
+    return names
+
+
+def is_version_group(group: RouteGroup) -> bool:
+    """Whether a group is an API version group such as prefix('v1')"""
+    return group.prefix is not None and VERSION_PREFIX_RE.fullmatch(group.prefix.strip("/").encode()) is not None
+
+
+def verify_route_index(index: RouteIndex) -> list:
+    """Verify route group nesting integrity against the index in O(routes + groups)"""
+    errors = []
+
+    # Check v1 prefix group closure
+    v1_groups = [g for g in index.groups if g.prefix == "v1"]
+    v1_closed = [g for g in v1_groups if g.end is not None and "throttle:api" in g.middleware]
+    if len(v1_groups) != len(v1_closed):
+        errors.append(f"v1 group imbalance: {len(v1_groups)} openings vs {len(v1_closed)} closings")
+
+    unclosed = [g for g in index.groups if g.end is None]
+    if unclosed:
+        errors.append(f"Unterminated route groups: {len(unclosed)} group(s) missing a closing '}})'")
+
+    version_groups = {g.id for g in index.groups if is_version_group(g)}
+    v1_ids = {g.id for g in v1_groups}
+    orphaned = 0
+    auth_routes = 0
+    health_in_v1 = False
+    for route in index.routes:
+        if not version_groups.intersection(route.groups):
+            orphaned += 1
+        if "auth:sanctum" in index.effective_middleware(route):
+            auth_routes += 1
+        if route.method == "GET" and route.uri == "health" and v1_ids.intersection(route.groups):
+            health_in_v1 = True
+
+    # Check for orphaned routes outside version groups
+    if orphaned:
+        errors.append(f"Orphaned routes detected: {orphaned} routes outside version groups")
+
+    # Check middleware application consistency
+    if auth_routes < 5:  # Expected minimum based on route structure
+        errors.append(f"Unexpected auth:sanctum count ({auth_routes} < 5) - possible structural damage")
+
+    # Check health check placement
+    if health_in_v1:
+        errors.append("Health check route inside v1 group (should be outside)")
+
+    return errors
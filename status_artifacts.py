@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Test and coverage aggregates for the README status section, read from real PHPUnit artifacts:
+a JUnit log, a Clover coverage report and backend/.phpunit.result.cache. XML is parsed with iterparse and
+cleared as it goes, so memory stays flat on very large coverage reports. Each aggregate is cached by the
+artifact's content hash, so regenerating the section only re-parses artifacts that changed.
+
+Produce the artifacts with, e.g.:
+
+    docker compose exec backend php artisan test --log-junit build/logs/junit.xml --coverage-clover build/logs/clover.xml
+"""
+
+import sys
+import json
+import hashlib
+import argparse
+import xml.etree.ElementTree as ET
+from pathlib import Path
+
+from patch_spec import CACHE_ROOT, PROJECT_ROOT
+from phpunit_results import ERROR, FAILED, PASSED, SKIPPED, parse_junit
+
+BACKEND_ROOT = PROJECT_ROOT / "backend"
+JUNIT_PATH = BACKEND_ROOT / "build" / "logs" / "junit.xml"
+CLOVER_PATH = BACKEND_ROOT / "build" / "logs" / "clover.xml"
+RESULT_CACHE_PATH = BACKEND_ROOT / ".phpunit.result.cache"
+STATUS_CACHE_DIR = CACHE_ROOT / "status"
+
+# Bump when an aggregate's shape changes so stale cache entries are ignored
+STATUS_CACHE_VERSION = 1
+
+HASH_CHUNK = 1024 * 1024
+LOWEST_COVERED_FILES = 5
+SLOWEST_TESTS = 5
+
+# PHPUnit\Runner\ResultCache stores TestStatus::asInt() codes in "defects"
+DEFECT_STATUSES = {0: PASSED, 1: SKIPPED, 2: SKIPPED, 3: PASSED, 4: PASSED, 5: PASSED, 6: PASSED, 7: FAILED, 8: ERROR}
+CLOVER_METRICS = ("statements", "coveredstatements", "methods", "coveredmethods", "elements", "coveredelements")
+
+
+def file_digest(path: Path) -> str:
+    """Content hash of an artifact, read in chunks"""
+    digest = hashlib.sha256()
+    with path.open("rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def cached_aggregate(kind: str, path: Path, build, cache_dir: Path = STATUS_CACHE_DIR):
+    """build(path) for an artifact, or the cached result for the same content; None if the artifact is missing"""
+    if not path.is_file():
+        return None
+    key = hashlib.sha256(f"{kind}|v{STATUS_CACHE_VERSION}|{file_digest(path)}".encode()).hexdigest()
+    cache_file = cache_dir / f"{key}.json"
+    try:
+        return json.loads(cache_file.read_text())
+    except (OSError, ValueError):
+        pass
+    aggregate = build(path)
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        temp_file = cache_file.with_suffix(".tmp")
+        temp_file.write_text(json.dumps(aggregate))
+        temp_file.replace(cache_file)
+    except OSError as e:
+        print(f"⚠️  Status cache write failed: {e}", file=sys.stderr)
+    return aggregate
+
+
+def suite_of(name: str) -> str:
+    """Suite of a test from its class: Tests\\Api\\OrderControllerTest::x -> Api"""
+    parts = name.split("::", 1)[0].split("\\")
+    return parts[1] if len(parts) > 2 and parts[0] == "Tests" else "Other"
+
+
+def junit_aggregate(path: Path) -> dict:
+    """Totals, per-suite counts and per-test outcomes from a JUnit log"""
+    totals = {"tests": 0, PASSED: 0, FAILED: 0, ERROR: 0, SKIPPED: 0, "assertions": 0, "time": 0.0}
+    suites = {}
+    tests = {}
+    for record in parse_junit(str(path)):
+        totals["tests"] += 1
+        totals[record.status] += 1
+        totals["assertions"] += record.assertions
+        totals["time"] += record.duration
+        suite = suites.setdefault(suite_of(record.name), {"tests": 0, PASSED: 0})
+        suite["tests"] += 1
+        suite[PASSED] += record.status == PASSED
+        tests[record.name] = {"status": record.status, "duration": record.duration}
+    return {"totals": totals, "suites": suites, "tests": tests}
+
+
+def clover_aggregate(path: Path) -> dict:
+    """Project totals and the least-covered files from a Clover report, in one streaming pass"""
+    totals = {}
+    files = []
+    stack = []
+    current_file = None
+    for event, element in ET.iterparse(str(path), events=("start", "end")):
+        if event == "start":
+            stack.append(element.tag)
+            if element.tag == "file":
+                current_file = display_path(element.get("name", ""))
+            continue
+        stack.pop()
+        if element.tag == "metrics" and stack:
+            metrics = {key: int(element.get(key, 0)) for key in CLOVER_METRICS}
+            if stack[-1] == "project":
+                totals = metrics
+            elif stack[-1] == "file" and metrics["statements"]:
+                files.append({"file": current_file, "statements": metrics["statements"],
+                              "covered": metrics["coveredstatements"]})
+        if element.tag in ("line", "class", "file", "package"):
+            element.clear()  # Keep memory flat however many lines the report covers
+    files.sort(key=lambda f: (f["covered"] / f["statements"], f["file"]))
+    return {"totals": totals, "files": len(files), "lowest": files[:LOWEST_COVERED_FILES]}
+
+
+def display_path(name: str) -> str:
+    """Clover file paths are absolute inside the container; show them from app/ on"""
+    marker = name.find("/app/")
+    return name[marker + 1:] if marker >= 0 else name
+
+
+def result_cache_aggregate(path: Path) -> dict:
+    """Outcomes and durations from PHPUnit's result cache (format version 2)"""
+    data = json.loads(path.read_text())
+    times = data.get("times", {})
+    defects = {name: DEFECT_STATUSES.get(code, FAILED) for name, code in data.get("defects", {}).items()}
+    tests = {name: {"status": defects.get(name, PASSED), "duration": duration} for name, duration in times.items()}
+    for name, status in defects.items():
+        tests.setdefault(name, {"status": status, "duration": 0.0})
+    slowest = sorted(times.items(), key=lambda item: item[1], reverse=True)[:SLOWEST_TESTS]
+    return {"version": data.get("version"), "tests": tests, "slowest": slowest}
+
+
+def collect_status(junit: Path = JUNIT_PATH, clover: Path = CLOVER_PATH, result_cache: Path = RESULT_CACHE_PATH) -> dict:
+    """Every aggregate that is available; missing artifacts come back as None"""
+    return {
+        "junit": cached_aggregate("junit", junit, junit_aggregate),
+        "clover": cached_aggregate("clover", clover, clover_aggregate),
+        "result_cache": cached_aggregate("result-cache", result_cache, result_cache_aggregate),
+    }
+
+
+def test_outcomes(status: dict) -> dict:
+    """Outcome per test from the best available artifact: a JUnit log describes one whole run, so it is used
+    on its own; the result cache (which also keeps tests from earlier, partial runs) is the fallback"""
+    for source in ("junit", "result_cache"):
+        if status.get(source):
+            return status[source]["tests"]
+    return {}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize PHPUnit artifacts for the README status section")
+    parser.add_argument("--junit", type=Path, default=JUNIT_PATH)
+    parser.add_argument("--clover", type=Path, default=CLOVER_PATH)
+    parser.add_argument("--result-cache", type=Path, default=RESULT_CACHE_PATH)
+    args = parser.parse_args()
+    print(json.dumps(collect_status(args.junit, args.clover, args.result_cache), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Local history of test runs in SQLite.
+Every run appends one row per test (duration, assertions, outcome) under a run row carrying the commit and
+timestamp, so results outlive the report that printed them. Queries over a recent window of runs - slowest
+tests, per-run p95 duration, flakiest tests, recent failures - are range scans of the covering run index, so
+their cost follows the window, not the length of the history; the (test, run) index serves per-test lookups.
+"""
+
+import sys
+import json
+import time
+import sqlite3
+import argparse
+import subprocess
+from pathlib import Path
+
+from patch_spec import CACHE_ROOT, PROJECT_ROOT
+from phpunit_results import parse_junit
+
+HISTORY_PATH = CACHE_ROOT / "history" / "test_history.sqlite3"
+
+# Bump when the schema changes; an older database is rebuilt
+SCHEMA_VERSION = 1
+DEFAULT_WINDOW = 20  # Runs looked at by the queries unless told otherwise
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    started REAL NOT NULL,
+    commit_sha TEXT NOT NULL,
+    source TEXT NOT NULL,
+    tests INTEGER NOT NULL,
+    failed INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS results (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    test TEXT NOT NULL,
+    status TEXT NOT NULL,
+    failed INTEGER NOT NULL,
+    duration REAL NOT NULL,
+    assertions INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS results_by_test ON results (test, run_id, failed, duration);
+CREATE INDEX IF NOT EXISTS results_by_run ON results (run_id, test, failed, duration);
+CREATE INDEX IF NOT EXISTS runs_by_started ON runs (started);
+"""
+
+
+def current_commit(root: Path = PROJECT_ROOT) -> str:
+    """HEAD of the repository the tests ran against ("" outside git)"""
+    try:
+        result = subprocess.run(["git", "rev-parse", "HEAD"], cwd=root, capture_output=True, text=True, timeout=10)
+    except (OSError, subprocess.TimeoutExpired):
+        return ""
+    return result.stdout.strip() if result.returncode == 0 else ""
+
+
+def percentile(values: list, fraction: float) -> float:
+    """Nearest-rank percentile of sorted values"""
+    if not values:
+        return 0.0
+    rank = max(int(-(-fraction * len(values) // 1)), 1)  # ceil(fraction * n)
+    return values[min(rank, len(values)) - 1]
+
+
+class TestHistory:
+    """Runs and per-test results, appended after every test run"""
+    __test__ = False  # Not a pytest test class
+
+    def __init__(self, path: Path = HISTORY_PATH):
+        self.path = path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self.db = sqlite3.connect(str(path))
+        self.db.execute("PRAGMA journal_mode=WAL")  # Readers (README updater, scheduler) never block a run
+        self.db.execute("PRAGMA foreign_keys=ON")
+        if self.db.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self.db.executescript(f"DROP TABLE IF EXISTS results; DROP TABLE IF EXISTS runs; PRAGMA user_version={SCHEMA_VERSION};")
+        self.db.executescript(SCHEMA)
+
+    def close(self):
+        self.db.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record_run(self, tests: list, source: str = "", commit: str = None, started: float = None) -> int:
+        """Append one run of TestRecords; returns its id (None when there was nothing to record)"""
+        if not tests:
+            return None
+        commit = current_commit() if commit is None else commit
+        with self.db:
+            run_id = self.db.execute(
+                "INSERT INTO runs (started, commit_sha, source, tests, failed) VALUES (?, ?, ?, ?, ?)",
+                (started or time.time(), commit, source, len(tests), sum(test.failed for test in tests)),
+            ).lastrowid
+            self.db.executemany(
+                "INSERT INTO results (run_id, test, status, failed, duration, assertions) VALUES (?, ?, ?, ?, ?, ?)",
+                [(run_id, test.name, test.status, int(test.failed), test.duration, test.assertions) for test in tests],
+            )
+        return run_id
+
+    def _first_run(self, runs: int) -> int:
+        """Id of the oldest run in the window of the last `runs` runs"""
+        row = self.db.execute("SELECT id FROM runs ORDER BY id DESC LIMIT 1 OFFSET ?", (runs - 1,)).fetchone()
+        return row[0] if row else 0
+
+    def slowest(self, limit: int = 10, runs: int = DEFAULT_WINDOW) -> list:
+        """(test, mean duration, max duration, samples) for the slowest tests on average"""
+        return self.db.execute(
+            "SELECT test, AVG(duration), MAX(duration), COUNT(*) FROM results INDEXED BY results_by_run WHERE run_id >= ? "
+            "GROUP BY test ORDER BY AVG(duration) DESC LIMIT ?",
+            (self._first_run(runs), limit),
+        ).fetchall()
+
+    def p95_trend(self, runs: int = DEFAULT_WINDOW, test_prefix: str = "") -> list:
+        """(run id, started, commit, p95 duration, tests) per run, oldest first"""
+        pattern = test_prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        rows = self.db.execute(
+            "SELECT r.run_id, r.duration FROM results r INDEXED BY results_by_run WHERE r.run_id >= ? AND r.test LIKE ? ESCAPE '\\' "
+            "ORDER BY r.run_id, r.duration",
+            (self._first_run(runs), pattern),
+        )
+        durations = {}
+        for run_id, duration in rows:
+            durations.setdefault(run_id, []).append(duration)
+        if not durations:
+            return []
+        marks = ",".join("?" * len(durations))
+        meta = {row[0]: row[1:] for row in self.db.execute(
+            f"SELECT id, started, commit_sha FROM runs WHERE id IN ({marks})", list(durations))}
+        return [(run_id, *meta[run_id], percentile(values, 0.95), len(values))
+                for run_id, values in sorted(durations.items())]
+
+    def flakiest(self, limit: int = 10, runs: int = 50) -> list:
+        """(test, outcome flips, failures, samples) for tests that changed outcome between consecutive runs"""
+        return self.db.execute(
+            "SELECT test, SUM(flip), SUM(failed), COUNT(*) FROM ("
+            "  SELECT test, failed, failed != LAG(failed) OVER (PARTITION BY test ORDER BY run_id) AS flip"
+            "  FROM results INDEXED BY results_by_run WHERE run_id >= ?"
+            ") GROUP BY test HAVING SUM(flip) > 0 ORDER BY SUM(flip) DESC, SUM(failed) DESC LIMIT ?",
+            (self._first_run(runs), limit),
+        ).fetchall()
+
+    def last_outcomes(self, runs: int = DEFAULT_WINDOW) -> dict:
+        """test -> (failed, run id) of its most recent run within the window"""
+        return {test: (bool(failed), run_id) for test, failed, run_id in self.db.execute(
+            "SELECT test, failed, MAX(run_id) FROM results INDEXED BY results_by_run WHERE run_id >= ? GROUP BY test",
+            (self._first_run(runs),),
+        )}
+
+    def mean_durations(self, runs: int = DEFAULT_WINDOW) -> dict:
+        """test -> mean duration over the window"""
+        return dict(self.db.execute(
+            "SELECT test, AVG(duration) FROM results INDEXED BY results_by_run WHERE run_id >= ? GROUP BY test", (self._first_run(runs),)))
+
+
+def record_results(tests: list, source: str, path: Path = HISTORY_PATH):
+    """Append a run to the history; a history failure never fails the run itself"""
+    if not tests:
+        return
+    try:
+        with TestHistory(path) as history:
+            history.record_run(tests, source)
+    except (sqlite3.Error, OSError) as e:
+        print(f"⚠️  Test history not recorded: {e}", file=sys.stderr)
+
+
+def open_history(path: Path = HISTORY_PATH) -> TestHistory:
+    """The history for readers, or None if nothing has been recorded yet"""
+    if not path.is_file():
+        return None
+    try:
+        return TestHistory(path)
+    except sqlite3.Error as e:
+        print(f"⚠️  Test history unreadable: {e}", file=sys.stderr)
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query or extend the local test run history")
+    parser.add_argument("query", choices=["slowest", "trend", "flaky", "record"])
+    parser.add_argument("junit", nargs="?", type=Path, help="JUnit log to record (with 'record')")
+    parser.add_argument("--runs", type=int, default=DEFAULT_WINDOW, help="Window of most recent runs")
+    parser.add_argument("--limit", type=int, default=10)
+    parser.add_argument("--prefix", default="", help="Only tests whose name starts with this (trend)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    if args.query == "record":
+        if args.junit is None:
+            parser.error("record needs a JUnit log")
+        tests = parse_junit(str(args.junit))
+        with TestHistory() as history:
+            run_id = history.record_run(tests, source=args.junit.name)
+        print(f"✅ Recorded run {run_id}: {len(tests)} tests, {sum(t.failed for t in tests)} failed")
+        return
+
+    history = open_history()
+    if history is None:
+        print("⚠️  No test history recorded yet", file=sys.stderr)
+        sys.exit(1)
+    with history:
+        if args.query == "slowest":
+            rows = history.slowest(args.limit, args.runs)
+            lines = [f"{mean:8.3f}s avg {peak:8.3f}s max  ({count} runs)  {test}" for test, mean, peak, count in rows]
+        elif args.query == "trend":
+            rows = history.p95_trend(args.runs, args.prefix)
+            lines = [f"#{run_id:<5} {time.strftime('%Y-%m-%d %H:%M', time.localtime(started))} {commit[:10]:10}  "
+                     f"p95 {p95:.3f}s over {count} tests" for run_id, started, commit, p95, count in rows]
+        else:
+            rows = history.flakiest(args.limit, args.runs)
+            lines = [f"{flips:3} flips {failures:3} failures ({count} runs)  {test}" for test, flips, failures, count in rows]
+    if args.json:
+        print(json.dumps(rows, indent=2))
+    else:
+        print("\n".join(lines) if lines else "No matching results")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Failure-first, duration-balanced test scheduling for the parallel runner.
+Targets are resolved to individual tests through the impact index, each test gets an expected duration
+(local history first, then backend/.phpunit.result.cache, then the median of the known tests) and a
+recently-failed flag (its latest outcome in the history, else PHPUnit's recorded defects). Tests are packed
+into one shard per worker with longest-processing-time first, so the slowest shard finishes as early as
+possible. Failing shards are queued first, and inside each shard PHPUnit's own --order-by runs recorded
+defects first and then the shortest tests, so a regression shows up in the first seconds of a run.
+"""
+
+import sys
+import json
+import heapq
+import argparse
+import statistics
+from dataclasses import dataclass, field, asdict
+
+from impact_index import build_impact_index, test_filters
+from phpunit_results import ERROR, FAILED
+from result_cache import record_key, tests_for_target
+from status_artifacts import RESULT_CACHE_PATH, cached_aggregate, result_cache_aggregate
+from test_history import DEFAULT_WINDOW, open_history
+
+# Passed to every scheduled shard: defects first (from the result cache), then shortest first
+ORDER_ARGS = ("--order-by=defects,duration",)
+DEFAULT_DURATION = 0.1  # Seconds assumed for a test when nothing at all has been recorded
+
+
+@dataclass
+class ShardPlan:
+    """Tests packed into one shard, with the load they are expected to take"""
+    label: str
+    tests: list = field(default_factory=list)  # Index keys (ShortClass::method)
+    estimate: float = 0.0
+    failures: int = 0
+    filter: str = ""
+
+
+@dataclass
+class TestTimings:
+    """Expected duration and recent-failure flag per index key"""
+    __test__ = False  # Not a pytest test class
+
+    durations: dict = field(default_factory=dict)
+    failed: set = field(default_factory=set)
+    default: float = DEFAULT_DURATION
+
+    def duration(self, key: str) -> float:
+        return self.durations.get(key, self.default)
+
+
+def load_timings(runs: int = DEFAULT_WINDOW, result_cache=RESULT_CACHE_PATH) -> TestTimings:
+    """Durations and failures per key: the local history wins over PHPUnit's result cache"""
+    timings = TestTimings()
+    cache = cached_aggregate("result-cache", result_cache, result_cache_aggregate)
+    if cache:
+        for key, tests in _by_key(cache["tests"].items()).items():
+            timings.durations[key] = sum(test["duration"] for test in tests)
+            if any(test["status"] in (FAILED, ERROR) for test in tests):
+                timings.failed.add(key)
+    history = open_history()
+    if history is not None:
+        with history:
+            durations = _by_key(history.mean_durations(runs).items())
+            outcomes = _by_key(history.last_outcomes(runs).items())
+        for key, means in durations.items():
+            timings.durations[key] = sum(means)
+        for key, latest in outcomes.items():
+            # The latest recorded run of the test decides, whatever PHPUnit's cache still says
+            if any(failed for failed, _ in latest):
+                timings.failed.add(key)
+            else:
+                timings.failed.discard(key)
+    if timings.durations:
+        timings.default = statistics.median(timings.durations.values())
+    return timings
+
+
+def _by_key(items) -> dict:
+    """Group per-name values by index key; data sets of one method share a key"""
+    grouped = {}
+    for name, value in items:
+        grouped.setdefault(record_key(name), []).append(value)
+    return grouped
+
+
+def pack_shards(tests: set, timings: TestTimings, bins: int) -> list:
+    """Longest-processing-time packing: each test, slowest first, goes to the least-loaded shard"""
+    shards = [ShardPlan(label=f"shard {i + 1}") for i in range(bins)]
+    loads = [(0.0, i) for i in range(bins)]
+    for key in sorted(tests, key=lambda k: (-timings.duration(k), k)):
+        load, i = heapq.heappop(loads)
+        shard = shards[i]
+        shard.tests.append(key)
+        shard.estimate += timings.duration(key)
+        shard.failures += key in timings.failed
+        heapq.heappush(loads, (shard.estimate, i))
+    return [shard for shard in shards if shard.tests]
+
+
+def plan_shards(targets: list, impact, workers: int, timings: TestTimings = None) -> (list, list):
+    """Shard plans for every target the index resolves, failing shards first, plus the unresolved targets"""
+    timings = timings or load_timings()
+    tests, unresolved = set(), []
+    for target in targets:
+        keys = tests_for_target(target, impact)
+        if keys:
+            tests |= keys
+        else:
+            unresolved.append(target)
+    plans = pack_shards(tests, timings, max(1, min(workers, len(tests))))
+    for plan in plans:
+        # One --filter per shard: alternatives are self-contained (class name or anchored method list)
+        plan.filter = "|".join(test_filters(set(plan.tests), impact))
+    plans.sort(key=lambda plan: (-plan.failures, -plan.estimate))
+    for i, plan in enumerate(plans, 1):
+        plan.label = f"shard {i}/{len(plans)}"
+    return plans, unresolved
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how test targets would be ordered and sharded")
+    parser.add_argument("targets", nargs="*", help="Filters or test files (default: every indexed test)")
+    parser.add_argument("--workers", type=int, default=4, help="Concurrent workers (one shard each)")
+    parser.add_argument("--runs", type=int, default=DEFAULT_WINDOW, help="History window for durations")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    try:
+        impact = build_impact_index()
+    except (OSError, ValueError) as e:
+        print(f"❌ ERROR: Cannot build the impact index: {e}", file=sys.stderr)
+        sys.exit(1)
+    timings = load_timings(args.runs)
+    plans, unresolved = plan_shards(args.targets or [".*"], impact, args.workers, timings)
+
+    if args.json:
+        print(json.dumps({"shards": [asdict(plan) for plan in plans], "unresolved": unresolved}, indent=2))
+        return
+    for plan in plans:
+        flag = f", {plan.failures} recently failed" if plan.failures else ""
+        print(f"{'❌' if plan.failures else '🧪'} {plan.label}: {len(plan.tests)} tests, ~{plan.estimate:.2f}s{flag}")
+    if unresolved:
+        print(f"⚠️  Not in the impact index (run as given): {', '.join(unresolved)}")
+    if plans:
+        print(f"\n⏱️  Expected wall time ~{max(plan.estimate for plan in plans):.2f}s "
+              f"for ~{sum(plan.estimate for plan in plans):.2f}s of tests")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""docker_probe.py exercised through FakeBackend; run from the project root with `python -m pytest -q tests`"""
+
+import json
+
+import pytest
+
+from docker_probe import EnvironmentProbe, FakeBackend, ProbeError, ServiceState, default_backend, require_service
+
+
+def container(service, state="running", status="Up 2 minutes"):
+    return {"Labels": {"com.docker.compose.service": service}, "State": state, "Status": status}
+
+
+def probe(tmp_path, containers=None, path=None, ttl=60):
+    return EnvironmentProbe(FakeBackend(containers, path), ttl=ttl, cache_path=tmp_path / "probe.json", root=tmp_path)
+
+
+def test_service_states(tmp_path):
+    states = probe(tmp_path, [
+        container("backend", status="Up 2 minutes (healthy)"),
+        container("postgres", status="Up 2 minutes (unhealthy)"),
+        container("redis", "exited", "Exited (1) 3 minutes ago"),
+        {"Labels": {}, "State": "running"},  # Not a compose service
+    ]).services()
+    assert states == {
+        "backend": ServiceState("backend", "running", "healthy"),
+        "postgres": ServiceState("postgres", "running", "unhealthy"),
+        "redis": ServiceState("redis", "exited", ""),
+    }
+    assert states["backend"].ready and not states["postgres"].ready and not states["redis"].running
+
+
+def test_missing_service(tmp_path):
+    state = probe(tmp_path, [container("backend")]).service("frontend")
+    assert state == ServiceState("frontend") and not state.running
+
+
+def test_scaled_service_reports_best_replica(tmp_path):
+    states = probe(tmp_path, [container("worker", "exited"), container("worker")]).services()
+    assert states["worker"].running
+
+
+def test_answer_is_shared_through_the_cache(tmp_path):
+    fixture = tmp_path / "containers.json"
+    fixture.write_text(json.dumps([container("backend")]))
+    assert probe(tmp_path, path=fixture).service("backend").running
+
+    fixture.write_text(json.dumps([container("backend", "exited")]))
+    cached = probe(tmp_path, path=fixture)
+    assert cached.service("backend").running and cached.from_cache
+    assert not cached.services(refresh=True)["backend"].running
+    assert not probe(tmp_path, path=fixture, ttl=0).service("backend").running
+
+
+@pytest.mark.parametrize("content", [None, "{not json", '{"State": "running"}'])
+def test_unreadable_fake_raises_probe_error(tmp_path, content):
+    fixture = tmp_path / "containers.json"
+    if content is not None:
+        fixture.write_text(content)
+    with pytest.raises(ProbeError):
+        probe(tmp_path, path=fixture).services()
+
+
+def test_require_service(tmp_path, capsys):
+    require_service("backend", probe(tmp_path, [container("backend")]))
+
+    with pytest.raises(SystemExit):
+        require_service("backend", probe(tmp_path / "down", [container("backend", "exited")]))
+    assert "not running" in capsys.readouterr().err
+
+    with pytest.raises(SystemExit):
+        require_service("backend", probe(tmp_path / "gone", path=tmp_path / "missing.json"))
+    assert "Docker status check failed" in capsys.readouterr().err
+
+
+def test_fake_backend_from_environment(tmp_path, monkeypatch):
+    fixture = tmp_path / "containers.json"
+    fixture.write_text(json.dumps([container("backend")]))
+    monkeypatch.setenv("DOCKER_PROBE_FAKE", str(fixture))
+    backend = default_backend()
+    assert isinstance(backend, FakeBackend)
+    assert EnvironmentProbe(backend, cache_path=tmp_path / "probe.json", root=tmp_path).service("backend").running
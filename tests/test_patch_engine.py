@@ -0,0 +1,64 @@
+"""patch_engine.py edit application; run from the project root with `python -m pytest -q tests`"""
+
+import pytest
+
+from patch_engine import apply_edit, apply_edit_group, apply_method_edits, independent_groups
+from patch_spec import Edit, EditError
+
+CONTENT = "alpha\nbeta\ngamma\n"
+
+
+def edit(name, target, replacement, **kwargs):
+    return Edit(name=name, path="x.php", target=target, replacement=replacement, **kwargs)
+
+
+def test_group_matches_sequential_edits():
+    edits = [edit("e1", "alpha", "ALPHA"), edit("e2", "beta", "BETA")]
+    assert independent_groups(edits) == [edits]
+    updated, counts, _ = apply_edit_group(CONTENT, edits)
+    assert updated == apply_edit(apply_edit(CONTENT, edits[0])[0], edits[1])[0]
+    assert counts == [1, 1]
+
+
+def test_replacement_containing_its_own_target():
+    e1 = edit("e1", "alpha", "alpha // keep\nalpha2")
+    e2 = edit("e2", "beta", "BETA")
+    alone, _, _ = apply_edit(CONTENT, e1)
+    assert independent_groups([e1, e2]) == [[e1, e2]]
+    updated, counts, _ = apply_edit_group(CONTENT, [e1, e2])
+    assert updated == apply_edit(alone, e2)[0]
+    assert counts == [1, 1]
+
+
+def test_group_still_reports_a_surviving_target():
+    # e1 keeps its own target (not checked) but brings back e2's, which must still be reported
+    e1 = edit("e1", "alpha", "alpha beta")
+    e2 = edit("e2", "beta", "BETA")
+    with pytest.raises(EditError, match="e2: original target still present"):
+        apply_edit_group(CONTENT, [e1, e2])
+
+
+PHP = """<?php
+class OrderTest
+{
+    /**
+     * Old docblock
+     */
+    #[Group('orders')]
+    public function test_status()
+    {
+        $this->assertTrue(false);
+    }
+}
+"""
+
+
+def test_method_edit_keeps_docblock_unless_replaced():
+    body = "    public function test_status()\n    {\n        $this->assertTrue(true);\n    }"
+    kept, _, _ = apply_method_edits(PHP, [edit("m", "test_status", body, method=True)])
+    assert "Old docblock" in kept and "#[Group('orders')]" in kept and "assertTrue(true)" in kept
+
+    own = "    /**\n     * New docblock\n     */\n" + body
+    replaced, _, _ = apply_method_edits(PHP, [edit("m", "test_status", own, method=True)])
+    assert "Old docblock" not in replaced and "#[Group" not in replaced
+    assert replaced.count("docblock") == 1
@@ -0,0 +1,117 @@
+"""
+In-process unified diff for the patch tooling.
+Hunks are produced lazily, so a caller that only shows the first lines stops the work there, and the
+common prefix and suffix are trimmed before matching - a section rewrite in a long document only
+diffs the section. Hunks get their context from the untrimmed lines, so the output is difflib.unified_diff's,
+except that a change inside a run of identical lines may be placed elsewhere in the run. Change counts come
+from the opcodes alone, without rendering any lines.
+"""
+
+from dataclasses import dataclass, asdict
+from difflib import SequenceMatcher
+from itertools import islice
+
+
+@dataclass
+class DiffSummary:
+    """Machine-readable size of a change"""
+    path: str
+    hunks: int = 0
+    added: int = 0
+    removed: int = 0
+
+    def as_dict(self) -> dict:
+        return asdict(self)
+
+
+def _trim(old: list, new: list) -> (int, int):
+    """Length of the common prefix and of the common suffix (not overlapping the prefix)"""
+    limit = min(len(old), len(new))
+    prefix = 0
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+    return prefix, suffix
+
+
+def grouped_opcodes(old: list, new: list, context: int = 3):
+    """difflib grouped opcodes, matching only the trimmed middle; the prefix and suffix come back as equal runs
+    so hunks get their full context from the untrimmed lines"""
+    prefix, suffix = _trim(old, new)
+    matcher = SequenceMatcher(None, old[prefix:len(old) - suffix], new[prefix:len(new) - suffix], autojunk=False)
+    codes = [("equal", 0, prefix, 0, prefix)] if prefix else []
+    codes += [(tag, i1 + prefix, i2 + prefix, j1 + prefix, j2 + prefix)
+              for tag, i1, i2, j1, j2 in matcher.get_opcodes() if i1 != i2 or j1 != j2]
+    if suffix:
+        codes.append(("equal", len(old) - suffix, len(old), len(new) - suffix, len(new)))
+    if not any(tag != "equal" for tag, *_ in codes):
+        return
+    # Same grouping as SequenceMatcher.get_grouped_opcodes, over the whole-file opcodes
+    tag, i1, i2, j1, j2 = codes[0]
+    if tag == "equal":
+        codes[0] = tag, max(i1, i2 - context), i2, max(j1, j2 - context), j2
+    tag, i1, i2, j1, j2 = codes[-1]
+    if tag == "equal":
+        codes[-1] = tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)
+    group = []
+    for tag, i1, i2, j1, j2 in codes:
+        if tag == "equal" and i2 - i1 > 2 * context:
+            group.append((tag, i1, min(i2, i1 + context), j1, min(j2, j1 + context)))
+            yield group
+            group = []
+            i1, j1 = max(i1, i2 - context), max(j1, j2 - context)
+        group.append((tag, i1, i2, j1, j2))
+    if group:
+        yield group
+
+
+def summarize(old_text: str, new_text: str, path: str = "") -> DiffSummary:
+    """Count hunks and added/removed lines without rendering the diff"""
+    summary = DiffSummary(path=str(path))
+    for group in grouped_opcodes(old_text.splitlines(), new_text.splitlines()):
+        summary.hunks += 1
+        for tag, i1, i2, j1, j2 in group:
+            if tag in ("replace", "delete"):
+                summary.removed += i2 - i1
+            if tag in ("replace", "insert"):
+                summary.added += j2 - j1
+    return summary
+
+
+def unified_diff(old_text: str, new_text: str, from_name: str = "a", to_name: str = "b", context: int = 3):
+    """Yield the lines of a unified diff, one hunk at a time"""
+    old = old_text.splitlines()
+    new = new_text.splitlines()
+    header = False
+    for group in grouped_opcodes(old, new, context):
+        if not header:
+            yield f"--- {from_name}"
+            yield f"+++ {to_name}"
+            header = True
+        first, last = group[0], group[-1]
+        yield f"@@ -{_format_range(first[1], last[2])} +{_format_range(first[3], last[4])} @@"
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in old[i1:i2]:
+                    yield " " + line
+                continue
+            for line in old[i1:i2]:
+                yield "-" + line
+            for line in new[j1:j2]:
+                yield "+" + line
+
+
+def _format_range(start: int, stop: int) -> str:
+    """Hunk range as diff -u prints it"""
+    length = stop - start
+    if length == 1:
+        return str(start + 1)
+    return f"{start + 1 if length else start},{length}"
+
+
+def diff_preview(old_text: str, new_text: str, limit: int, from_name: str = "a", to_name: str = "b") -> (list, bool):
+    """The first `limit` diff lines and whether more were left unrendered"""
+    lines = list(islice(unified_diff(old_text, new_text, from_name, to_name), limit + 1))
+    return lines[:limit], len(lines) > limit
@@ -0,0 +1,236 @@
+"""
+Text matchers shared by the patch engine and the fix scripts.
+NormalizedText collapses whitespace once per file while keeping a position map back to the original text,
+so whitespace-insensitive block matches can be replaced in place without a fallback regex. Fallbacks that
+used to be backtracking regexes are linear scans (find_cooccurrence here; PHP methods via php_index), and
+the regexes that remain run under a time and match budget (regex_budget) so a bad pattern fails fast.
+"""
+
+import os
+import re
+import signal
+import threading
+from array import array
+from bisect import bisect_right
+from contextlib import contextmanager
+
+WORD_RE = re.compile(r"\S+")
+HORIZONTAL_WS = " \t"
+
+# Per-pattern budgets: wall time for one scan, and the number of matches a scan may produce
+REGEX_TIME_BUDGET = float(os.environ.get("PATCH_REGEX_BUDGET", 2.0))
+REGEX_MATCH_BUDGET = 10000
+
+
+class RegexBudgetError(Exception):
+    """A regex scan exceeded its time or match budget"""
+
+
+def normalize_whitespace(text: str) -> str:
+    """Collapse every whitespace run to a single space and trim the ends"""
+    return " ".join(text.split())
+
+
+class NormalizedText:
+    """Whitespace-collapsed view of a text with a map from normalized offsets back to original offsets"""
+
+    def __init__(self, text: str):
+        self.text = text
+        words = []
+        self.norm_starts = array("q")
+        self.orig_starts = array("q")
+        position = 0
+        for match in WORD_RE.finditer(text):
+            word = match.group()
+            self.norm_starts.append(position)
+            self.orig_starts.append(match.start())
+            words.append(word)
+            position += len(word) + 1
+        self.normalized = " ".join(words)
+
+    def to_original(self, offset: int) -> int:
+        """Map the offset of a character in the normalized text to its offset in the original"""
+        i = bisect_right(self.norm_starts, offset) - 1
+        if i < 0:
+            return 0
+        within = offset - self.norm_starts[i]
+        word_end = self.norm_starts[i + 1] - 1 if i + 1 < len(self.norm_starts) else len(self.normalized)
+        if within < word_end - self.norm_starts[i]:
+            return self.orig_starts[i] + within
+        # Offset sits on a collapsed separator: map to the end of the preceding word
+        return self.orig_starts[i] + (word_end - self.norm_starts[i])
+
+    def span_to_original(self, start: int, end: int) -> (int, int):
+        """Map a normalized [start, end) span to the original text"""
+        return self.to_original(start), self.to_original(end - 1) + 1
+
+    def find_all(self, block: str) -> list:
+        """Original-text spans of every whitespace-insensitive occurrence of block"""
+        needle = normalize_whitespace(block)
+        if not needle:
+            return []
+        spans = []
+        start = self.normalized.find(needle)
+        while start != -1:
+            orig_start, orig_end = self.span_to_original(start, start + len(needle))
+            spans.append(self._widen(orig_start, orig_end, block))
+            start = self.normalized.find(needle, start + len(needle))
+        return spans
+
+    def _widen(self, start: int, end: int, block: str) -> (int, int):
+        """Pull leading/trailing indentation into the span when the block itself carries it"""
+        if block[:1] in HORIZONTAL_WS:
+            while start > 0 and self.text[start - 1] in HORIZONTAL_WS:
+                start -= 1
+        if block[-1:] in HORIZONTAL_WS:
+            while end < len(self.text) and self.text[end] in HORIZONTAL_WS:
+                end += 1
+        return start, end
+
+
+def replace_spans(text: str, spans: list, replacement: str) -> str:
+    """Replace non-overlapping, sorted spans in one join"""
+    return substitute(text, [(start, end, replacement) for start, end in spans])[0]
+
+
+def substitute(text: str, changes: list) -> (str, list):
+    """Apply sorted, non-overlapping (start, end, replacement) changes in one join.
+
+    Also returns the reverse deltas as (start, end, original_text) in the new text's coordinates,
+    which is all that is needed to undo the change later.
+    """
+    parts = []
+    reverse = []
+    cursor = 0
+    position = 0
+    for start, end, replacement in changes:
+        parts.append(text[cursor:start])
+        position += start - cursor
+        parts.append(replacement)
+        reverse.append((position, position + len(replacement), text[start:end]))
+        position += len(replacement)
+        cursor = end
+    parts.append(text[cursor:])
+    return "".join(parts), reverse
+
+
+INLINE_FLAGS = ((re.IGNORECASE, "i"), (re.MULTILINE, "m"), (re.DOTALL, "s"), (re.VERBOSE, "x"))
+
+_COMBINED = {}
+
+
+def can_combine(pattern: re.Pattern) -> bool:
+    """Whether a regex can sit inside a combined alternation without changing meaning"""
+    unsupported = pattern.flags & ~(re.UNICODE | sum(flag for flag, _ in INLINE_FLAGS))
+    return pattern.groups == 0 and not unsupported
+
+
+class MultiPatternMatcher:
+    """Matches several literal and regex targets in a single scan of the text (Aho-Corasick style)"""
+
+    def __init__(self, targets: list):
+        """targets: list of (source, is_regex, flags) tuples"""
+        key = tuple(targets)
+        if key not in _COMBINED:
+            alternatives = []
+            for i, (source, is_regex, flags) in enumerate(targets):
+                body = source if is_regex else re.escape(source)
+                inline = "".join(letter for flag, letter in INLINE_FLAGS if flags & flag)
+                if inline:
+                    body = f"(?{inline}:{body})"
+                alternatives.append((i, is_regex, len(source), f"(?P<p{i}>{body})"))
+            # Longest literal first so a shorter target never shadows a longer one at the same position
+            alternatives.sort(key=lambda a: (a[1], -a[2] if not a[1] else a[0]))
+            _COMBINED[key] = re.compile("|".join(a[3] for a in alternatives))
+        self.pattern = _COMBINED[key]
+        self.size = len(targets)
+
+    def replace_all(self, text: str, replacements: list) -> (str, list):
+        """Replace every match in one pass; returns the new text and per-target match counts"""
+        changes, counts = self.substitutions(text, replacements)
+        return substitute(text, changes)[0], counts
+
+    def substitutions(self, text: str, replacements: list) -> (list, list):
+        """Scan once and return the (start, end, replacement) changes plus per-target match counts"""
+        counts = [0] * self.size
+        changes = []
+        for match in bounded_finditer(self.pattern, text):
+            if match.end() == match.start():
+                continue
+            i = int(match.lastgroup[1:])
+            counts[i] += 1
+            changes.append((match.start(), match.end(), replacements[i]))
+        return changes, counts
+
+
+@contextmanager
+def regex_budget(pattern, seconds: float = REGEX_TIME_BUDGET):
+    """Abort the regex work inside the block once it runs longer than `seconds`.
+
+    The regex engine checks for signals while it matches, so a SIGALRM interrupts even a catastrophic
+    backtrack. Timers only exist on the main thread; elsewhere the block runs unbounded.
+    """
+    if (seconds <= 0 or not hasattr(signal, "setitimer") or threading.current_thread() is not threading.main_thread()
+            or signal.getitimer(signal.ITIMER_REAL)[0] > 0):
+        yield  # No timer available, or an outer budget is already running
+        return
+    description = getattr(pattern, "pattern", pattern)
+
+    def expired(signum, frame):
+        raise RegexBudgetError(f"Regex exceeded its {seconds:g}s budget: {str(description)[:60]!r}")
+
+    previous = signal.signal(signal.SIGALRM, expired)
+    signal.setitimer(signal.ITIMER_REAL, seconds)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def bounded_finditer(pattern: re.Pattern, text: str, max_matches: int = REGEX_MATCH_BUDGET) -> list:
+    """All matches of a compiled pattern, within the time and match budgets"""
+    matches = []
+    with regex_budget(pattern):
+        for match in pattern.finditer(text):
+            matches.append(match)
+            if len(matches) > max_matches:
+                raise RegexBudgetError(f"Regex produced more than {max_matches} matches: {pattern.pattern[:60]!r}")
+    return matches
+
+
+def bounded_search(pattern, text: str, flags: int = 0):
+    """re.search within the time budget"""
+    with regex_budget(pattern):
+        return re.search(pattern, text, flags)
+
+
+def bounded_subn(pattern, replacement, text: str, count: int = 0, flags: int = 0) -> (str, int):
+    """re.subn within the time budget"""
+    with regex_budget(pattern):
+        return re.subn(pattern, replacement, text, count=count, flags=flags)
+
+
+def find_cooccurrence(text: str, words: list) -> (int, int):
+    """Span of the first line containing every word (case-insensitive substrings), or None.
+
+    Linear: the line holding the furthest next occurrence of any word is the first line that can hold all
+    of them, so the scan jumps straight there and never looks at a line twice - instead of a lookahead per
+    word re-scanning every line.
+    """
+    patterns = [re.compile(re.escape(word), re.IGNORECASE) for word in words]
+    position = 0
+    while True:
+        furthest = position
+        for pattern in patterns:
+            match = pattern.search(text, position)
+            if match is None:
+                return None
+            furthest = max(furthest, match.start())
+        line_start = text.rfind("\n", 0, furthest) + 1
+        line_end = text.find("\n", furthest)
+        line_end = len(text) if line_end == -1 else line_end
+        if all(pattern.search(text, line_start, line_end) for pattern in patterns):
+            return line_start, line_end
+        position = line_end + 1
+
@@ -0,0 +1,185 @@
+"""
+Multi-file write transactions backed by a write-ahead log.
+Every file is staged to a sibling temp file, the temp files are fsynced as a group, one commit record is
+appended (and fsynced) to the WAL, and only then are the temps renamed over their targets. A transaction
+interrupted before its commit record is rolled back on the next start; one interrupted after it is finished.
+"""
+
+import os
+import sys
+import json
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from backup_store import BACKUP_ROOT
+
+WAL_PATH = BACKUP_ROOT / "wal.jsonl"
+
+WRITE_CHUNK = 1 << 20
+
+
+class TransactionError(Exception):
+    """Raised when a transaction cannot be staged or committed"""
+
+
+class VerificationError(TransactionError):
+    """Raised when the bytes written to disk do not match the in-memory buffer"""
+
+
+def write_verified(path: Path, data: bytes, paranoid: bool = False) -> str:
+    """Write data, checking every byte was accepted, and return its digest (for the WAL and callers).
+
+    No read-back unless paranoid, which re-reads the file and compares its digest with the buffer's.
+    """
+    view = memoryview(data)
+    with open(path, "wb", buffering=0) as f:
+        offset = 0
+        while offset < len(view):
+            count = f.write(view[offset:offset + WRITE_CHUNK])
+            if not count:
+                raise VerificationError(f"Short write to {path}")
+            offset += count
+    expected = hashlib.sha256(data).hexdigest()
+    if paranoid and hashlib.sha256(Path(path).read_bytes()).hexdigest() != expected:
+        raise VerificationError(f"Read-back digest mismatch for {path}")
+    return expected
+
+
+class FileTransaction:
+    """Stages whole-file writes and commits them together"""
+
+    def __init__(self, txn: str, wal_path: Path = WAL_PATH, paranoid: bool = False):
+        self.txn = txn
+        self.wal_path = Path(wal_path)
+        self.paranoid = paranoid
+        self.staged = []
+        self.renamed = []
+        self.committed = False
+        self._logged_begin = False
+
+    def temp_path(self, path: Path) -> Path:
+        return path.with_name(f"{path.name}.{self.txn}.tmp")
+
+    def stage(self, path: Path, data: bytes) -> str:
+        """Write data to the path's temp sibling and return its digest; nothing is visible until commit()"""
+        path = Path(path)
+        if any(staged == path for staged, _ in self.staged):
+            raise TransactionError(f"{path} is already staged in transaction {self.txn}")
+        if not self._logged_begin:
+            # Not fsynced: if this record is lost, so are any temps written after it
+            self._log({"state": "begin"})
+            self._logged_begin = True
+        temp_file = self.temp_path(path)
+        self._log({"state": "stage", "path": str(path), "temp": str(temp_file)})
+        self.staged.append((path, temp_file))
+        digest = write_verified(temp_file, data, self.paranoid)
+        if path.exists():
+            os.chmod(temp_file, path.stat().st_mode & 0o7777)
+        return digest
+
+    def commit(self):
+        """Group fsync of every temp, one durable commit record, then the renames"""
+        if not self.staged:
+            return
+        fsync_all([temp_file for _, temp_file in self.staged])
+        self._log({"state": "commit", "files": [[str(p), str(t)] for p, t in self.staged]}, sync=True)
+        self.committed = True
+        for path, temp_file in self.staged:
+            temp_file.replace(path)
+            self.renamed.append(path)
+        fsync_all({path.parent for path, _ in self.staged})
+        self._log({"state": "done"})
+
+    def abort(self):
+        """Discard staged temps that were not renamed; renamed files are the caller's to restore"""
+        for path, temp_file in self.staged:
+            if path not in self.renamed:
+                temp_file.unlink(missing_ok=True)
+        self._log({"state": "aborted"})
+
+    def _log(self, record: dict, sync: bool = False):
+        record = {"txn": self.txn, "time": datetime.now().isoformat(timespec="seconds"), **record}
+        append_record(self.wal_path, record, sync)
+
+
+def append_record(wal_path: Path, record: dict, sync: bool = False):
+    wal_path.parent.mkdir(parents=True, exist_ok=True)
+    with wal_path.open("a") as wal:
+        wal.write(json.dumps(record) + "\n")
+        if sync:
+            wal.flush()
+            os.fsync(wal.fileno())
+
+
+def fsync_path(path: Path):
+    """fsync a file or directory by path"""
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def fsync_all(paths):
+    """Issue the fsyncs of a group concurrently so the device can flush them together"""
+    paths = list(paths)
+    if len(paths) == 1:
+        fsync_path(paths[0])
+        return
+    with ThreadPoolExecutor(max_workers=min(8, len(paths) or 1)) as pool:
+        list(pool.map(fsync_path, paths))
+
+
+def recover(wal_path: Path = WAL_PATH) -> list:
+    """Finish committed-but-interrupted transactions and roll back uncommitted ones; returns messages"""
+    try:
+        lines = wal_path.read_text().splitlines()
+    except FileNotFoundError:
+        return []
+
+    transactions = {}
+    for line in lines:
+        try:
+            record = json.loads(line)
+        except ValueError:
+            continue  # Torn final line from a crash mid-append
+        state = transactions.setdefault(record["txn"], {"stage": [], "commit": None, "closed": False})
+        if record["state"] == "stage":
+            state["stage"].append((Path(record["path"]), Path(record["temp"])))
+        elif record["state"] == "commit":
+            state["commit"] = [(Path(p), Path(t)) for p, t in record["files"]]
+        elif record["state"] in ("done", "aborted", "recovered"):
+            state["closed"] = True
+
+    messages = []
+    for txn, state in transactions.items():
+        if state["closed"]:
+            continue
+        if state["commit"] is not None:
+            for path, temp_file in state["commit"]:
+                if temp_file.exists():
+                    temp_file.replace(path)
+            fsync_all({path.parent for path, _ in state["commit"]})
+            messages.append(f"Finished interrupted transaction {txn} ({len(state['commit'])} file(s))")
+        else:
+            for _, temp_file in state["stage"]:
+                temp_file.unlink(missing_ok=True)
+            messages.append(f"Rolled back uncommitted transaction {txn}")
+        append_record(wal_path, {"txn": txn, "time": datetime.now().isoformat(timespec="seconds"), "state": "recovered"})
+
+    if not messages and len(lines) > 1000:
+        # Every transaction is closed: the log can start over
+        wal_path.unlink(missing_ok=True)
+    return messages
+
+
+def recover_or_exit(wal_path: Path = WAL_PATH):
+    """Run recovery at startup, reporting what was done"""
+    try:
+        for message in recover(wal_path):
+            print(f"⚠️  WAL recovery: {message}", file=sys.stderr)
+    except OSError as e:
+        print(f"❌ CRITICAL: WAL recovery failed - {e}", file=sys.stderr)
+        sys.exit(1)
@@ -0,0 +1,177 @@
+#!/usr/bin/env python3
+"""
+Append-only undo journal for the patch engine.
+Every committed batch records, per file, the reverse deltas of its edits (the spans the edit produced and
+the text they replaced), so undoing recent batches costs time proportional to the edits, not to the
+backups. `rollback --to <txn>` replays the journal backwards to the state right after that transaction.
+"""
+
+import os
+import sys
+import json
+import hashlib
+import argparse
+from datetime import datetime
+from pathlib import Path
+
+from backup_store import BACKUP_ROOT
+from text_match import substitute
+
+JOURNAL_PATH = BACKUP_ROOT / "journal.jsonl"
+
+
+class JournalError(Exception):
+    """Raised when the journal cannot be read or a rollback cannot be applied safely"""
+
+
+def new_txn_id() -> str:
+    """Sortable, unique transaction id"""
+    return datetime.now().strftime("%Y%m%dT%H%M%S") + "-" + os.urandom(3).hex()
+
+
+def text_digest(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class UndoJournal:
+    """Reverse-delta records grouped into transactions; only committed transactions can be undone"""
+
+    def __init__(self, path: Path = JOURNAL_PATH):
+        self.path = Path(path)
+
+    def commit(self, txn: str, changes: list):
+        """Append one transaction: changes is a list of (path, steps), steps as recorded by the engine"""
+        lines = []
+        for path, steps in changes:
+            for seq, step in enumerate(steps):
+                lines.append({
+                    "type": "edit",
+                    "txn": txn,
+                    "seq": seq,
+                    "path": str(path),
+                    "names": step["names"],
+                    "deltas": step["deltas"],
+                    "before": step["before"],
+                    "after": step["after"],
+                })
+        lines.append({
+            "type": "commit",
+            "txn": txn,
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "files": [str(path) for path, _ in changes],
+        })
+        self.append(lines)
+
+    def append(self, records: list):
+        """One write per transaction keeps the journal append-only and the records contiguous"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self.path.open("a") as journal:
+            journal.write("".join(json.dumps(record) + "\n" for record in records))
+
+    def records(self) -> list:
+        try:
+            with self.path.open() as journal:
+                return [json.loads(line) for line in journal if line.strip()]
+        except FileNotFoundError:
+            return []
+        except ValueError as e:
+            raise JournalError(f"Journal is corrupted: {e}")
+
+    def transactions(self) -> list:
+        """Committed transactions oldest first, each with its edit records and whether it was undone"""
+        edits = {}
+        undone = set()
+        committed = []
+        for record in self.records():
+            if record["type"] == "edit":
+                edits.setdefault(record["txn"], []).append(record)
+            elif record["type"] == "commit":
+                committed.append(record)
+            elif record["type"] == "undo":
+                undone.update(record["undoes"])
+        for record in committed:
+            record["edits"] = edits.get(record["txn"], [])
+            record["undone"] = record["txn"] in undone
+        return committed
+
+    def rollback(self, txns: list) -> list:
+        """Undo the given committed transactions, newest first; returns the files rewritten"""
+        per_file = {}
+        for txn in reversed(txns):
+            for edit in reversed(txn["edits"]):
+                per_file.setdefault(edit["path"], []).append(edit)
+
+        # Verify every file before touching any of them
+        plans = []
+        for path, edits in per_file.items():
+            data = Path(path).read_bytes()
+            if hashlib.sha256(data).hexdigest() != edits[0]["after"]:
+                raise JournalError(f"{path} changed since transaction {edits[0]['txn']} - refusing to roll back")
+            text = data.decode("utf-8")
+            for edit in edits:
+                text, _ = substitute(text, [tuple(delta) for delta in edit["deltas"]])
+            if text_digest(text) != edits[-1]["before"]:
+                raise JournalError(f"Reverse deltas for {path} do not reproduce the recorded content")
+            plans.append((Path(path), text))
+
+        for path, text in plans:
+            write_atomically(path, text.encode())
+        self.append([{
+            "type": "undo",
+            "txn": new_txn_id(),
+            "time": datetime.now().isoformat(timespec="seconds"),
+            "undoes": [txn["txn"] for txn in txns],
+        }])
+        return [path for path, _ in plans]
+
+
+def write_atomically(path: Path, data: bytes):
+    temp_file = path.with_name(path.name + ".undo.tmp")
+    temp_file.write_bytes(data)
+    os.chmod(temp_file, path.stat().st_mode & 0o7777)
+    temp_file.replace(path)
+
+
+def select_transactions(journal: UndoJournal, to: str = None, last: int = None) -> list:
+    """Live transactions after `to`, or the `last` N live transactions"""
+    live = [txn for txn in journal.transactions() if not txn["undone"]]
+    if last is not None:
+        return live[-last:] if last > 0 else []
+    ids = [txn["txn"] for txn in live]
+    if to not in ids:
+        raise JournalError(f"Transaction '{to}' is not in the journal (or was already undone)")
+    return live[ids.index(to) + 1:]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Undo patch engine transactions from the reverse-delta journal")
+    sub = parser.add_subparsers(dest="command", required=True)
+    sub.add_parser("list", help="List committed transactions")
+    rollback = sub.add_parser("rollback", help="Replay the journal backwards")
+    target = rollback.add_mutually_exclusive_group(required=True)
+    target.add_argument("--to", metavar="TXN", help="Undo every transaction committed after TXN")
+    target.add_argument("--last", type=int, metavar="N", help="Undo the last N transactions")
+    args = parser.parse_args()
+
+    journal = UndoJournal()
+    try:
+        if args.command == "list":
+            for txn in journal.transactions():
+                status = "undone" if txn["undone"] else "live"
+                names = ", ".join(name for edit in txn["edits"] for name in edit["names"])
+                print(f"{txn['txn']}  {txn['time']}  {status:<6}  {len(txn['files'])} file(s)  {names}")
+        elif args.command == "rollback":
+            txns = select_transactions(journal, args.to, args.last)
+            if not txns:
+                print("💡 Nothing to roll back")
+                return
+            for path in journal.rollback(txns):
+                print(f"✅ Rolled back {path}")
+            print(f"✅ Undid {len(txns)} transaction(s): {', '.join(txn['txn'] for txn in txns)}")
+    except (JournalError, OSError, UnicodeDecodeError) as e:
+        print(f"❌ ERROR: {e}", file=sys.stderr)
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()